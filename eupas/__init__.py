@@ -5,8 +5,11 @@
 # contracts.py      NOTE: Unused. Scrapys way of unit-testing.
 # dupefilters.py    Custom Dupefilter for the eupas spider. Generates extra stats used in the monitors.
 # exporters.py      Custom XLSX and SQLITE exporters
-# extensions.py     Custom Extensions like the item History Comparer for the eupas item
+# extensions.py     Custom Extensions like the item History Comparer for the eupas item and the adaptive concurrency controller
+# httpcache.py      Shared http cache storage and a policy revalidating cached pages
 # items.py          Contains all complex item types (Currently only for the eupas spider)
 # monitors.py       Contains all spidermon (extension) monitors (Currently only for the eupas spider)
 # pipelines.py      Custom duplicare items pipeline for the eupas spider
+# selectors.py      Selectors with a shared registry of compiled XPath expressions
 # settings.py       Scrapy, Spidermon and custom extension settings
+# stores.py         Persistent stores keeping the state of spiders and extensions between runs
@@ -0,0 +1,360 @@
+# NOT DEFAULT
+# Define your clustering helpers here
+#
+# These helpers are used by the cluster command to group similar names.
+
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+from functools import lru_cache
+from pathlib import Path
+import re
+from tempfile import TemporaryDirectory
+import unicodedata
+
+# NOTE: Every worker process scores more than one block, so slow blocks are balanced out
+BLOCKS_PER_JOB = 4
+# NOTE: The candidate structure and the scores are shared with the worker processes through these memory mapped files
+_worker_state = {}
+
+
+class NameNormaliser:
+    '''
+    Normalises names (e.g. of sponsors or centres) for the clustering and the matching.
+    The names are transliterated to ASCII and cleaned from punctuation, junk words, English stop words and legal terms like Ltd or GmbH.
+    The stop words and patterns are built once and the normalised names are cached.
+    '''
+
+    junk_words = frozenset({
+        'pharma', 'pharmaceuticals', 'therapeutics', 'international', 'group',
+        'cro', 'kk', 'pvt', 'nhs foundation trust'
+    })
+    junk_chars_regex = re.compile(r'[^\w ]')
+    word_regex = re.compile(r'\w+')
+    spaces_regex = re.compile(r'\s+')
+
+    def __init__(self, junk_words=None, casefold=True, cache_size=1 << 16):
+        import cleanco
+        from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+        self.casefold = casefold
+        self.stop_words = frozenset(
+            self.junk_words if junk_words is None else junk_words).union(ENGLISH_STOP_WORDS)
+        self.basename = cleanco.basename
+        self.normalise = lru_cache(maxsize=cache_size)(self._normalise)
+
+    def __call__(self, name):
+        return self.normalise(str(name))
+
+    def _sub_junk_word(self, match):
+        return '' if match.group() in self.stop_words else match.group()
+
+    def _normalise(self, name):
+        name = unicodedata.normalize('NFKD', name.casefold() if self.casefold else name).encode(
+            'ASCII', 'ignore').decode('UTF-8', 'ignore')
+        name = self.junk_chars_regex.sub('', name)
+        name = self.basename(self.word_regex.sub(
+            self._sub_junk_word, name), suffix=True, prefix=True, middle=True)
+        return self.spaces_regex.sub(' ', name).strip()
+
+
+def sequence_ratio(a, b):
+    '''
+    Returns the SequenceMatcher ratio of two names. The names are sorted, so the ratio doesn't depend on their order.
+    '''
+    short, long = sorted([a, b])
+    return SequenceMatcher(None, long, short).ratio()
+
+
+def candidate_pairs(values, cutoff, ngram_range=(2, 3), chunk_size=1024):
+    '''
+    Returns the candidate pairs of the values as the lower triangle of a sparse boolean matrix.
+    The pairs are blocked by the cosine similarity of the character n-gram TF-IDF vectors of the values,
+    so only pairs with a cosine similarity of at least cutoff are candidates. A cutoff of 0 returns all pairs.
+    '''
+    import numpy as np
+    from scipy import sparse
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    n = len(values)
+    if cutoff <= 0:
+        rows, cols = np.tril_indices(n, -1)
+        return sparse.csr_matrix((np.ones(len(rows), dtype=bool), (rows, cols)), shape=(n, n))
+
+    try:
+        vectors = TfidfVectorizer(
+            analyzer='char_wb', ngram_range=ngram_range).fit_transform(values)
+    except ValueError:
+        # NOTE: None of the values has a single n-gram
+        return sparse.csr_matrix((n, n), dtype=bool)
+
+    rows, cols = [], []
+    for start in range(0, n, chunk_size):
+        # NOTE: Every chunk is only compared with the values before its last row
+        cosine = vectors[start:start + chunk_size] @ vectors[:start + chunk_size].T
+        cosine = sparse.tril(cosine, k=start - 1).tocoo()
+        mask = cosine.data >= cutoff
+        rows.append(cosine.row[mask] + start)
+        cols.append(cosine.col[mask])
+
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    return sparse.csr_matrix((np.ones(len(rows), dtype=bool), (rows, cols)), shape=(n, n))
+
+
+def score_rows(values, indptr, indices, start, end, scores):
+    '''
+    Writes the exact ratios of the candidate pairs in the rows start to end of a CSR structure into scores.
+    '''
+    for i in range(start, end):
+        value = values[i]
+        for k in range(indptr[i], indptr[i + 1]):
+            scores[k] = sequence_ratio(value, values[indices[k]])
+
+
+def balanced_row_blocks(indptr, blocks):
+    '''
+    Splits the rows of a CSR structure into up to blocks consecutive row ranges with about the same number of pairs.
+    '''
+    import numpy as np
+
+    rows = len(indptr) - 1
+    bounds = np.searchsorted(indptr, np.linspace(
+        0, indptr[-1], blocks + 1)[1:-1], side='left')
+    bounds = sorted(set([0, *bounds.tolist(), rows]))
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if indptr[end] > indptr[start]]
+
+
+def _init_worker(values, directory):
+    import numpy as np
+
+    _worker_state.update(
+        values=values,
+        indptr=np.load(Path(directory, 'indptr.npy'), mmap_mode='r'),
+        indices=np.load(Path(directory, 'indices.npy'), mmap_mode='r'),
+        scores=np.load(Path(directory, 'scores.npy'), mmap_mode='r+')
+    )
+
+
+def _score_block(block):
+    start, end = block
+    score_rows(_worker_state['values'], _worker_state['indptr'],
+               _worker_state['indices'], start, end, _worker_state['scores'])
+    _worker_state['scores'].flush()
+
+
+def score_pairs_parallel(values, indptr, indices, jobs):
+    '''
+    Returns the exact ratios of the candidate pairs scored by a pool of jobs processes.
+    The workers write the scores of their row blocks into a shared memory mapped file, so no arrays are pickled.
+    '''
+    import numpy as np
+
+    with TemporaryDirectory() as directory:
+        np.save(Path(directory, 'indptr.npy'), indptr)
+        np.save(Path(directory, 'indices.npy'), indices)
+        scores = np.lib.format.open_memmap(
+            Path(directory, 'scores.npy'), mode='w+', dtype=np.float64, shape=(len(indices),))
+        scores.flush()
+
+        blocks = balanced_row_blocks(indptr, jobs * BLOCKS_PER_JOB)
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(values, directory)) as executor:
+            list(executor.map(_score_block, blocks))
+
+        result = np.array(scores)
+        del scores
+    return result
+
+
+def score_pairs(values, candidates, jobs=1):
+    '''
+    Returns the exact ratios of the candidate pairs as a sparse matrix with the structure of the candidates.
+    With more than one job the rows are scored in parallel, which gives the same scores as the serial scoring.
+    '''
+    import numpy as np
+    from scipy import sparse
+
+    candidates = sparse.csr_matrix(candidates)
+    candidates.sort_indices()
+    if jobs > 1 and candidates.nnz:
+        scores = score_pairs_parallel(
+            list(values), candidates.indptr, candidates.indices, jobs)
+    else:
+        scores = np.zeros(candidates.nnz)
+        score_rows(values, candidates.indptr, candidates.indices,
+                   0, candidates.shape[0], scores)
+    return sparse.csr_matrix((scores, candidates.indices, candidates.indptr), shape=candidates.shape)
+
+
+def similarity_matrix(values, blocking_cutoff=0.2, jobs=1):
+    '''
+    Returns the symmetric sparse similarity matrix of the values with ones on the diagonal.
+    Pairs, which were not candidates of the blocking, are missing and have a similarity of 0.
+    '''
+    from scipy import sparse
+
+    lower = score_pairs(values, candidate_pairs(
+        values, blocking_cutoff), jobs=jobs)
+    return (lower + lower.T + sparse.identity(len(values), format='csr')).tocsr()
+
+
+def affinity_propagation(similarity, cutoff):
+    '''
+    Clusters the dense similarity matrix with affinity propagation. Similarities below 0.8 are rescaled, so similarities below the cutoff are negative.
+    This needs O(n²) memory and is only suited for small numbers of names.
+    '''
+    import numpy as np
+    from sklearn.cluster import AffinityPropagation
+
+    def norm_range(x):
+        return (x - cutoff) / (1 - cutoff)
+
+    similarity = similarity.toarray()
+    similarity = np.where(similarity < .8, norm_range(similarity), similarity)
+    return AffinityPropagation(affinity='precomputed', max_iter=1000, convergence_iter=4).fit_predict(similarity)
+
+
+def connected_components(similarity, cutoff):
+    '''
+    Clusters the names by the connected components of the sparse graph of all pairs with a similarity of at least cutoff.
+    '''
+    from scipy import sparse
+    from scipy.sparse.csgraph import connected_components as components
+
+    graph = sparse.csr_matrix(similarity >= cutoff)
+    return components(graph, directed=False)[1]
+
+
+def average_linkage(similarity, cutoff):
+    '''
+    Clusters the names with agglomerative clustering (average linkage) on the sparse similarity matrix.
+    The two clusters with the highest average similarity are merged until no average similarity is at least cutoff.
+    Missing pairs have a similarity of 0, so only clusters connected by scored pairs are ever compared.
+    '''
+    import heapq
+    import numpy as np
+    from scipy import sparse
+
+    n = similarity.shape[0]
+    lower = sparse.tril(similarity, k=-1).tocoo()
+    # NOTE: The summed similarities between the clusters, which are named after one of their names
+    sums = [{} for _ in range(n)]
+    for i, j, value in zip(lower.row.tolist(), lower.col.tolist(), lower.data.tolist()):
+        sums[i][j] = sums[j][i] = value
+    sizes = [1] * n
+    parents = list(range(n))
+
+    heap = [(-value, j, i) for i, j, value in zip(
+        lower.row.tolist(), lower.col.tolist(), lower.data.tolist()) if value >= cutoff]
+    heapq.heapify(heap)
+    while heap:
+        negative_average, a, b = heapq.heappop(heap)
+        if parents[a] != a or parents[b] != b or b not in sums[a]:
+            continue
+        # NOTE: Outdated entries of clusters, which have grown since, are skipped
+        if -negative_average != sums[a][b] / (sizes[a] * sizes[b]):
+            continue
+
+        parents[b] = a
+        sizes[a] += sizes[b]
+        del sums[a][b]
+        for x, value in sums[b].items():
+            if x != a:
+                sums[a][x] = sums[x][a] = sums[a].get(x, 0) + value
+                del sums[x][b]
+        sums[b] = {}
+        for x, value in sums[a].items():
+            if (average := value / (sizes[a] * sizes[x])) >= cutoff:
+                heapq.heappush(heap, (-average, *sorted([a, x])))
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    return np.unique([find(i) for i in range(n)], return_inverse=True)[1]
+
+
+# NOTE: Every backend returns a cluster label for every name
+CLUSTERING_BACKENDS = {
+    'affinity': affinity_propagation,
+    'agglomerative': average_linkage,
+    'components': connected_components,
+}
+
+
+def cluster_labels(similarity, cutoff, backend='auto', max_affinity_size=2000):
+    '''
+    Returns the cluster labels of the names of the sparse similarity matrix.
+    The auto backend uses affinity propagation for up to max_affinity_size names and the sparse agglomerative clustering for more names.
+    '''
+    if backend == 'auto':
+        backend = 'affinity' if similarity.shape[0] <= max_affinity_size else 'agglomerative'
+    return CLUSTERING_BACKENDS[backend](similarity, cutoff)
+
+
+class AssignmentIndex:
+    '''
+    A nearest neighbour index over the normalised names of existing cluster assignments (e.g. the manual and original columns of a matching spreadsheet).
+    New names are only scored against the known names, which share enough character n-grams with them.
+    '''
+
+    def __init__(self, clean_names, labels, ngram_range=(2, 3)):
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        self.clean_names = list(clean_names)
+        self.labels = list(labels)
+        self.vectorizer = TfidfVectorizer(
+            analyzer='char_wb', ngram_range=ngram_range)
+        try:
+            self.vectors = self.vectorizer.fit_transform(self.clean_names)
+        except ValueError:
+            # NOTE: None of the known names has a single n-gram
+            self.vectors = None
+
+    def candidates(self, clean_names, cutoff, chunk_size=1024):
+        '''
+        Returns the candidate pairs of the new and the known names as a sparse boolean matrix.
+        The columns of the known names follow the columns of the new names, so the pairs can be scored with score_pairs.
+        '''
+        import numpy as np
+        from scipy import sparse
+
+        n = len(clean_names)
+        shape = (n, n + len(self.clean_names))
+        if self.vectors is None or not n:
+            return sparse.csr_matrix(shape, dtype=bool)
+
+        vectors = self.vectorizer.transform(clean_names)
+        rows, cols = [], []
+        for start in range(0, n, chunk_size):
+            cosine = (vectors[start:start + chunk_size] @ self.vectors.T).tocoo()
+            mask = cosine.data >= cutoff
+            rows.append(cosine.row[mask] + start)
+            cols.append(cosine.col[mask] + n)
+
+        rows, cols = np.concatenate(rows), np.concatenate(cols)
+        return sparse.csr_matrix((np.ones(len(rows), dtype=bool), (rows, cols)), shape=shape)
+
+    def assign(self, clean_names, cutoff, blocking_cutoff=0.2, jobs=1):
+        '''
+        Returns the label, the similarity and the position of the most similar known name for every new name.
+        New names without a known name with a similarity of at least cutoff get None as label and position.
+        '''
+        clean_names = list(clean_names)
+        scores = score_pairs(clean_names + self.clean_names,
+                             self.candidates(clean_names, blocking_cutoff), jobs=jobs)
+
+        assignments = []
+        for i in range(len(clean_names)):
+            start, end = scores.indptr[i], scores.indptr[i + 1]
+            if start == end:
+                assignments.append((None, 0.0, None))
+                continue
+            best = start + int(scores.data[start:end].argmax())
+            position = int(scores.indices[best]) - len(clean_names)
+            if scores.data[best] >= cutoff:
+                assignments.append(
+                    (self.labels[position], float(scores.data[best]), position))
+            else:
+                assignments.append((None, float(scores.data[best]), None))
+        return assignments
@@ -1,12 +1,28 @@
 from pathlib import Path
+import sqlite3
 
 from scrapy.commands import ScrapyCommand
 from scrapy.exceptions import UsageError
 
+from eupas.items import EU_PAS_Study, EMA_RWD_Study
+
 
 class PandasCommand(ScrapyCommand):
 
     requires_project = True
+    input_suffixes = ['.csv', '.db', '.feather', '.json', '.parquet', '.xlsx', '.xml']
+    # NOTE: These formats keep the dtypes (lists, dates and nullable booleans) and can be read column by column
+    columnar_suffixes = ['.feather', '.parquet']
+    # NOTE: The name of the table of the SQLiteItemExporter
+    sqlite_table_name = 'study'
+    # NOTE: The list columns of columnar inputs are joined with this separator (None keeps the lists)
+    multivalue_separator = None
+    # NOTE: The multivalued fields are always joined for the other output formats
+    output_multivalue_separator = '; '
+    multivalued_fields = sorted({
+        name for item_type in (EU_PAS_Study, EMA_RWD_Study)
+        for name, meta in item_type.fields.items() if meta.get('multivalued', False)
+    })
     # NOTE: Some of the default na_values listed below, have to be disabled in order to get correct data
     na_values = [
         "",
@@ -55,7 +71,7 @@ class PandasCommand(ScrapyCommand):
         if not self.input_path.is_file():
             raise UsageError(
                 "Invalid -i value, use a valid path to a file", print_help=False)
-        if self.input_path.suffix not in ['.csv', '.json', '.xlsx', '.xml']:
+        if self.input_path.suffix not in self.input_suffixes:
             raise UsageError(
                 "Invalid -i value, file format not supported", print_help=False)
 
@@ -68,20 +84,67 @@ class PandasCommand(ScrapyCommand):
     def python_name_converter(self, x):
         return '_'.join([word.lower() for word in x.split(' ')]) if x[0] != '$' else x
 
-    def read_input(self):
+    def read_columnar(self, input_path, columns=None):
+        '''
+        Reads a Parquet or Feather file with pyarrow. Only the existing columns of the projection are read.
+        '''
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        import pyarrow.parquet as pq
+
+        if input_path.suffix == '.parquet':
+            schema = pq.read_schema(input_path)
+        else:
+            with pa.ipc.open_file(input_path) as reader:
+                schema = reader.schema
+        if columns is not None:
+            columns = [name for name in columns if name in schema.names]
+
+        if input_path.suffix == '.parquet':
+            table = pq.read_table(input_path, columns=columns)
+        else:
+            table = feather.read_table(input_path, columns=columns)
+
+        def convert_values(x):
+            if self.multivalue_separator is None:
+                return list(x)
+            return self.multivalue_separator.join(map(str, x))
+
+        # NOTE: Dates are read as datetime64 just like the dates of the Excel files
+        input_data = table.to_pandas(date_as_object=False)
+        for field in table.schema:
+            if pa.types.is_list(field.type) or pa.types.is_large_list(field.type):
+                input_data[field.name] = input_data[field.name].map(
+                    convert_values, na_action='ignore')
+        return input_data
+
+    def read_input(self, input_path=None, columns=None):
+        '''
+        Reads the input file into a data frame. If columns are given, only these columns are returned.
+        '''
+        import pandas as pd
+
+        input_path = input_path or self.input_path
+        if input_path.suffix in self.columnar_suffixes:
+            return self.read_columnar(input_path, columns)
+
         input_data = None
-        if self.input_path.suffix == '.csv':
-            input_data = self.pd.read_csv(
-                self.input_path,
+        if input_path.suffix == '.csv':
+            input_data = pd.read_csv(
+                input_path,
                 keep_default_na=False,
                 na_values=self.na_values,
                 na_filter=True
             )
-        elif self.input_path.suffix == '.json':
-            input_data = self.pd.read_json(self.input_path)
-        elif self.input_path.suffix == '.xlsx':
-            input_data = self.pd.read_excel(
-                self.input_path,
+        elif input_path.suffix == '.db':
+            with sqlite3.connect(input_path) as connection:
+                input_data = pd.read_sql_query(
+                    f'SELECT * FROM {self.sqlite_table_name}', connection)
+        elif input_path.suffix == '.json':
+            input_data = pd.read_json(input_path)
+        elif input_path.suffix == '.xlsx':
+            input_data = pd.read_excel(
+                input_path,
                 keep_default_na=False,
                 na_values=self.na_values,
                 na_filter=True
@@ -90,17 +153,70 @@ class PandasCommand(ScrapyCommand):
                 columns=self.python_name_converter,
                 inplace=True
             )
-        elif self.input_path.suffix == '.xml':
-            input_data = self.pd.read_xml(self.input_path)
+        elif input_path.suffix == '.xml':
+            input_data = pd.read_xml(input_path)
 
+        if input_data is not None and columns is not None:
+            input_data = input_data.loc[:, [
+                name for name in columns if name in input_data.columns]]
         return input_data
 
     def excel_name_converter(self, x):
         return ' '.join([word.capitalize() for word in x.split('_')]) if x[0] != '$' else x
 
+    def to_arrow(self, data):
+        '''
+        Converts the data frame into an arrow table without its index.
+        Object columns with values of mixed types are stored as strings.
+        '''
+        import pyarrow as pa
+
+        def to_string(x):
+            if isinstance(x, (list, tuple)):
+                return self.output_multivalue_separator.join(map(str, x))
+            return str(x)
+
+        data = data.copy(deep=False)
+        for name in data.columns[data.dtypes == object]:
+            try:
+                pa.array(data[name], from_pandas=True)
+            except (pa.ArrowInvalid, pa.ArrowTypeError):
+                data[name] = data[name].map(to_string, na_action='ignore')
+        return pa.Table.from_pandas(data, preserve_index=False)
+
+    def join_multivalued(self, data):
+        '''
+        Joins the values of the multivalued fields, because the text based formats can't store lists.
+        '''
+        def join_values(x):
+            if isinstance(x, (list, tuple)):
+                return self.output_multivalue_separator.join(map(str, x))
+            return x
+
+        list_columns = [
+            name for name in self.multivalued_fields
+            if name in data.columns and data[name].dtype == object
+        ]
+        if not list_columns:
+            return data
+        return data.assign(**{name: data[name].map(join_values) for name in list_columns})
+
     def write_output(self, data, output_suffix='_pandas', file_extension=None):
         output_path = self.output_folder / \
             f'{self.input_path.stem}{output_suffix}{file_extension or self.input_path.suffix}'
+        if output_path.suffix in self.columnar_suffixes:
+            import pyarrow.feather as feather
+            import pyarrow.parquet as pq
+
+            table = self.to_arrow(data)
+            if output_path.suffix == '.parquet':
+                pq.write_table(table, output_path)
+            else:
+                feather.write_feather(table, output_path)
+            return
+        elif output_path.suffix != '.json':
+            data = self.join_multivalued(data)
+
         if output_path.suffix == '.csv':
             data.to_csv(output_path)
         elif output_path.suffix == '.json':
@@ -1,19 +1,17 @@
-from difflib import SequenceMatcher
+from functools import cached_property
 import logging
-import re
-import unicodedata
+from pathlib import Path
 
 from scrapy.exceptions import UsageError
+from eupas.clustering import CLUSTERING_BACKENDS, AssignmentIndex, NameNormaliser, cluster_labels, similarity_matrix
 from eupas.commands import PandasCommand
 
 
 # NOTE: Was only used for initial company name matching. Most values were reassigned manually.
 class Command(PandasCommand):
 
-    junk_words = frozenset({
-        'pharma', 'pharmaceuticals', 'therapeutics', 'international', 'group',
-        'cro', 'kk', 'pvt', 'nhs foundation trust'
-    })
+    junk_words = NameNormaliser.junk_words
+    multivalue_separator = '; '
 
     def add_options(self, parser):
         '''
@@ -28,6 +26,33 @@ class Command(PandasCommand):
             default=0.6,
             help="cutoff value for grouping"
         )
+        group.add_argument(
+            "-b",
+            "--blocking-cutoff",
+            metavar="CUTOFF",
+            default=0.2,
+            help="only pairs with a character n-gram cosine similarity of at least this value are scored (0 scores all pairs)"
+        )
+        group.add_argument(
+            "-j",
+            "--jobs",
+            metavar="N",
+            default=1,
+            help="number of processes scoring the pairs"
+        )
+        group.add_argument(
+            "--backend",
+            choices=['auto', *CLUSTERING_BACKENDS],
+            default='auto',
+            help="clustering backend: affinity propagation (affinity), sparse average linkage (agglomerative) or connected components of all pairs above the cutoff (components). auto uses affinity propagation for small columns"
+        )
+        group.add_argument(
+            "-a",
+            "--assignments",
+            metavar="FILE",
+            default=None,
+            help="path to existing assignments (a clusters.xlsx or matching file with manual and original columns in a sheet per field). Only new names are clustered"
+        )
 
     def process_options(self, args, opts):
         PandasCommand.process_options(self, args, opts)
@@ -37,6 +62,25 @@ class Command(PandasCommand):
         except (ValueError, AssertionError) as e:
             raise UsageError(
                 "Invalid -c value, use a valid float between 0 and 1", print_help=False) from e
+        try:
+            self.blocking_cutoff = float(opts.blocking_cutoff)
+            assert self.blocking_cutoff >= 0 and self.blocking_cutoff <= 1
+        except (ValueError, AssertionError) as e:
+            raise UsageError(
+                "Invalid -b value, use a valid float between 0 and 1", print_help=False) from e
+        try:
+            self.jobs = int(opts.jobs)
+            assert self.jobs >= 1
+        except (ValueError, AssertionError) as e:
+            raise UsageError(
+                "Invalid -j value, use a valid integer greater than 0", print_help=False) from e
+        self.backend = opts.backend
+
+        self.assignments_path = Path(
+            opts.assignments) if opts.assignments else None
+        if self.assignments_path and (not self.assignments_path.is_file() or self.assignments_path.suffix != '.xlsx'):
+            raise UsageError(
+                "Invalid -a value, use a valid path to a xlsx file", print_help=False)
 
     def syntax(self):
         return "field_names [options]"
@@ -44,40 +88,78 @@ class Command(PandasCommand):
     def short_desc(self):
         return "Cluster specified columns"
 
-    def serialize(self, s, casefold=True):
+    @cached_property
+    def normaliser(self):
+        return NameNormaliser(self.junk_words)
+
+    def serialize(self, s):
         '''
         Serializes and cleans up string for clustering.
         '''
-        def filter_multiple_spaces(s):
-            return re.sub(r'\s+', ' ', s)
+        return self.normaliser(s)
 
-        def filter_junk_chars(s):
-            return re.sub(r'[^\w ]', '', s)
+    def cluster(self, df):
+        '''
+        Returns the names with the labels of their clusters.
+        '''
+        # NOTE: Only the candidate pairs of the blocking are scored, all other pairs have a similarity of 0
+        similarity = similarity_matrix(
+            df['clean'].to_list(), self.blocking_cutoff, jobs=self.jobs)
+        self.logger.info(
+            f'Scored {(similarity.nnz - df.shape[0]) // 2} candidate pairs')
+        return df.assign(clusters=cluster_labels(similarity, self.cutoff, self.backend))
+
+    def cluster_incremental(self, df, assignments):
+        '''
+        Only clusters the names, which aren't part of the existing assignments.
+        New names are assigned to the cluster of their most similar known name, if the similarity reaches the cutoff.
+        All other new names are clustered among themselves and get new cluster labels.
+        '''
+        import pandas as pd
 
-        def sub_junk_words(m):
-            from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
-            return '' if m.group() in self.junk_words.union(ENGLISH_STOP_WORDS) else m.group()
+        known = assignments.loc[:, ['manual', 'original']] \
+            .dropna() \
+            .drop_duplicates(subset=['original']) \
+            .sort_values(by=['manual', 'original'])
+        df = df.loc[~df['original'].isin(known['original'])]
+        self.logger.info(
+            f'{len(df)} new names and {len(known)} known names')
+
+        index = AssignmentIndex(
+            known['original'].map(self.serialize), known['manual'])
+        assigned = pd.DataFrame(
+            index.assign(df['clean'], self.cutoff,
+                         self.blocking_cutoff, jobs=self.jobs),
+            columns=['label', 'similarity', 'position'],
+            index=df.index
+        )
+        is_assigned = assigned['position'].notna()
+        self.logger.info(f'Assigned {is_assigned.sum()} new names')
+
+        labels = {manual: i for i, manual in enumerate(known['manual'].unique())}
+        positions = assigned.loc[is_assigned, 'position'].astype(int)
+        matched = df.loc[is_assigned].assign(
+            manual=assigned.loc[is_assigned, 'label'],
+            clusters=assigned.loc[is_assigned, 'label'].map(labels),
+            matched_original=known['original'].iloc[positions].to_numpy()
+        )
 
-        def filter_junk_words(s):
-            import cleanco
-            return cleanco.basename(re.sub(r'\w+', sub_junk_words, s), suffix=True, prefix=True, middle=True)
+        unmatched = df.loc[~is_assigned]
+        if len(unmatched) > 1:
+            unmatched = self.cluster(unmatched)
+        else:
+            unmatched = unmatched.assign(clusters=range(len(unmatched)))
+        unmatched = unmatched.assign(clusters=unmatched['clusters'] + len(labels))
 
-        return filter_multiple_spaces(
-            filter_junk_words(
-                filter_junk_chars(
-                    unicodedata.normalize('NFKD', str(s).casefold() if casefold else str(s)).encode(
-                        'ASCII', 'ignore').decode('UTF-8', 'ignore')
-                ))).strip()
+        return pd.concat([matched, unmatched]) \
+            .assign(similarity=assigned['similarity']) \
+            .loc[:, ['manual', 'original', 'clean', 'clusters', 'similarity', 'matched_original']]
 
     def run(self, args, opts):
         '''
         Clusters the unique values of the columns specified in the arguments.
         '''
-        super().run(args, opts)
-
-        import numpy as np
         import pandas as pd
-        from sklearn.cluster import AffinityPropagation
 
         if len(args) == 0:
             raise UsageError(
@@ -89,7 +171,7 @@ class Command(PandasCommand):
         self.logger.info(f'Pandas {pd.__version__}')
         self.logger.info('Reading and cleaning input data...')
 
-        input = self.read_input()
+        input = self.read_input(columns=args)
         if not set(args).issubset(set(input.columns.values)):
             raise UsageError(
                 "At least one cluster value isn't a valid field name", print_help=False)
@@ -106,31 +188,26 @@ class Command(PandasCommand):
             for field_name in args
         }
 
-        # TODO: Improve clustering performance
-        self.logger.info('Starting affinity propagation...')
-        matcher = SequenceMatcher()
-        AP = AffinityPropagation(
-            affinity='precomputed', max_iter=1000, convergence_iter=4)
+        assignments = None
+        if self.assignments_path:
+            self.logger.info('Reading existing assignments...')
+            assignments = pd.read_excel(
+                self.assignments_path,
+                sheet_name=None,
+                keep_default_na=False,
+                na_values=self.na_values,
+                na_filter=True
+            )
+
+        self.logger.info(f'Starting clustering with the {self.backend} backend...')
         for field_name, df in dfs.items():
             self.logger.info(f'Clustering {field_name}...')
-            clean_values = df['clean'].to_list()
-            similarity = np.identity(df.shape[0])
-
-            for i in range(df.shape[0]):
-                for j in range(i):
-                    short, long = sorted([clean_values[i], clean_values[j]])
-                    matcher.set_seqs(long, short)
-                    similarity[i, j] = similarity[j, i] = matcher.ratio()
-
-            def norm_range(x):
-                return (x - self.cutoff) / (1 - self.cutoff)
-
-            similarity = np.where(
-                similarity < .8, norm_range(similarity), similarity)
-
-            clusters = AP.fit_predict(similarity)
-            dfs[field_name] = df.assign(
-                clusters=clusters).sort_values(by=['clusters'])
+            if assignments is not None:
+                df = self.cluster_incremental(df, assignments.get(
+                    field_name, pd.DataFrame(columns=['manual', 'original'])))
+            else:
+                df = self.cluster(df)
+            dfs[field_name] = df.sort_values(by=['clusters'])
 
         self.logger.info('Writing output data...')
 
@@ -140,6 +217,8 @@ class Command(PandasCommand):
         #     with open(self.output_folder / f'values_{field_name}.txt', 'w') as f:
         #         f.write('\n'.join(values))
 
-        with pd.ExcelWriter(self.output_folder / 'clusters.xlsx', engine='openpyxl') as writer:
+        # NOTE: The new assignments don't replace the existing clusters
+        output_name = 'clusters_new.xlsx' if assignments is not None else 'clusters.xlsx'
+        with pd.ExcelWriter(self.output_folder / output_name, engine='openpyxl') as writer:
             for field_name, df in dfs.items():
                 df.to_excel(writer, sheet_name=field_name, index=False)
@@ -0,0 +1,198 @@
+from datetime import date
+import logging
+from pathlib import Path
+
+from scrapy.exceptions import UsageError
+
+from eupas.commands import PandasCommand
+from eupas.extensions import ItemHistoryComparer
+from eupas.items import EU_PAS_Study, EMA_RWD_Study
+from eupas.stores import UpdateJournal
+
+
+class Command(PandasCommand):
+
+    key_field_name = 'eu_pas_register_number'
+    multivalue_separator = '; '
+
+    def add_options(self, parser):
+        '''
+        Adds custom options to the base pandas command.
+        '''
+        PandasCommand.add_options(self, parser)
+        diff = parser.add_argument_group(title="Custom Diff Options")
+        diff.add_argument(
+            "-n",
+            "--new-input",
+            metavar="FILE",
+            default=None,
+            help="path to the newer snapshot, which is compared with the input file"
+        )
+        diff.add_argument(
+            "--diff-eupas",
+            action="store_true",
+            default=False,
+            help="uses the excepted fields of the EU PAS Register instead of the EMA RWD Catalogue"
+        )
+
+    def process_options(self, args, opts):
+        PandasCommand.process_options(self, args, opts)
+
+        self.new_input_path = Path(opts.new_input or "")
+        if not self.new_input_path.is_file():
+            raise UsageError(
+                "Invalid -n value, use a valid path to a file", print_help=False)
+        if self.new_input_path.suffix not in self.input_suffixes:
+            raise UsageError(
+                "Invalid -n value, file format not supported", print_help=False)
+
+        self.item_type = EU_PAS_Study if opts.diff_eupas else EMA_RWD_Study
+
+    def syntax(self):
+        return "[options]"
+
+    def short_desc(self):
+        return "Compares two exported snapshots of the studies"
+
+    def help(self):
+        return """Compares the input file (older snapshot) with the file of the -n option (newer snapshot):
+            The changed studies are stored in the same format as the updates.json of the ItemHistoryComparer
+            The added and removed studies are stored in separate files
+        """
+
+    @staticmethod
+    def typed_value(x):
+        '''
+        Returns a value of a snapshot with the type, which the ItemHistoryComparer writes for it.
+        '''
+        import numpy as np
+
+        # NOTE: The list columns of Parquet files are read as arrays
+        if isinstance(x, (list, tuple, np.ndarray)):
+            return [Command.typed_value(value) for value in x]
+        if isinstance(x, np.generic):
+            x = x.item()
+        # NOTE: Integer columns with missing values are read as floats
+        if isinstance(x, float) and x.is_integer():
+            return int(x)
+        # NOTE: The dates of Excel files are read as timestamps, but exported as dates
+        if isinstance(x, date):
+            return x.strftime('%Y-%m-%d')
+        return x
+
+    def without_metadata(self, data):
+        '''
+        Returns the snapshot without the metadata columns and with missing values as NA.
+        '''
+        import pandas as pd
+
+        data = data.loc[:, [
+            column for column in data.columns if not column.startswith('$')]]
+        return data.astype(object).where(data.notna(), pd.NA)
+
+    def normalize(self, data):
+        '''
+        Returns the snapshot indexed by register number with all values as strings and missing values as NA, so snapshots of different formats can be compared.
+        '''
+        import pandas as pd
+
+        def normalize_value(x):
+            x = self.typed_value(x)
+            if isinstance(x, list):
+                x = self.multivalue_separator.join(map(str, x))
+            return str(x) if str(x) != '' else pd.NA
+
+        data = self.without_metadata(data).map(normalize_value, na_action='ignore')
+
+        if data[self.key_field_name].duplicated().any():
+            raise UsageError(
+                "Snapshots with duplicate register numbers are not supported", print_help=False)
+        return data.set_index(self.key_field_name)
+
+    def diff(self, old_data, new_data):
+        '''
+        Returns the update records of the changed studies and the added and removed studies.
+        '''
+        import numpy as np
+
+        # NOTE: The normalized values are only compared, the records contain the values of the new snapshot
+        typed_data = self.without_metadata(new_data).map(
+            self.typed_value, na_action='ignore')
+        old_data = self.normalize(old_data)
+        new_data = self.normalize(new_data)
+        typed_data.index = new_data.index
+
+        added = new_data.loc[new_data.index.difference(old_data.index)]
+        removed = old_data.loc[old_data.index.difference(new_data.index)]
+
+        common = old_data.index.intersection(new_data.index)
+        columns = old_data.columns.union(new_data.columns)
+        old_values = old_data.reindex(index=common, columns=columns)
+        new_values = new_data.reindex(index=common, columns=columns)
+
+        old_present = old_values.notna()
+        new_present = new_values.notna()
+        # NOTE: Fields are updated, if they are present in the new snapshot and differ from the old snapshot
+        updated = new_present & ~(old_present & (
+            old_values == new_values).fillna(False).astype(bool))
+        deleted = old_present & ~new_present
+        changed_rows = (updated | deleted).any(axis='columns')
+
+        updated = updated.loc[changed_rows]
+        deleted = deleted.loc[changed_rows]
+        new_values = new_values.loc[changed_rows]
+
+        excepted_fields = self.settings.getdict(
+            'ITEMHISTORYCOMPARER_EXCEPTED_FIELDS').get(self.item_type, set())
+        not_excepted = [
+            column for column in columns if column not in excepted_fields]
+        changed_date = np.where(
+            updated.reindex(columns=['update_date'], fill_value=False)[
+                'update_date'],
+            True,
+            np.where(deleted.reindex(columns=['update_date'], fill_value=False)[
+                     'update_date'], None, False)
+        )
+        only_excepted_fields = ~(updated[not_excepted] | deleted[not_excepted]).any(axis='columns') & \
+            (changed_date == False)  # noqa: E712
+
+        updates = []
+        for i, register_number in enumerate(new_values.index):
+            row = new_values.loc[register_number]
+            typed_row = typed_data.loc[register_number]
+            changes_dict = {
+                name: typed_row[name] for name in columns[updated.iloc[i].to_numpy()]
+            }
+            changes_dict.update({
+                ItemHistoryComparer.changed_date_key: changed_date[i],
+                ItemHistoryComparer.only_excepted_fields_key: bool(only_excepted_fields.iloc[i]),
+                ItemHistoryComparer.duplicate_fields_key: False,
+                ItemHistoryComparer.changed_eupas_key: register_number,
+                ItemHistoryComparer.changed_url_key: row['url'] if 'url' in row and isinstance(row['url'], str) else None,
+                ItemHistoryComparer.deleted_fields_key: list(
+                    columns[deleted.iloc[i].to_numpy()]) or None
+            })
+            updates.append(changes_dict)
+
+        return updates, added.reset_index(), removed.reset_index()
+
+    def run(self, args, opts):
+        self.logger = logging.getLogger()
+        self.logger.info('Starting diff script')
+        self.logger.info('Reading input data...')
+        old_data = self.read_input()
+        new_data = self.read_input(self.new_input_path)
+
+        self.logger.info('Comparing snapshots...')
+        updates, added, removed = self.diff(old_data, new_data)
+        self.logger.info(
+            f'{len(updates)} changed, {len(added)} added and {len(removed)} removed studies')
+
+        self.logger.info('Writing output data...')
+        journal = UpdateJournal(
+            self.output_folder / f'{self.input_path.stem}_updates.json', sort_key=ItemHistoryComparer.sort_key)
+        for update in updates:
+            journal.append(update)
+        journal.compact()
+        self.write_output(added, '_added', '.json')
+        self.write_output(removed, '_removed', '.json')
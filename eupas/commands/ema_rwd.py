@@ -31,6 +31,21 @@ class Command(CrawlCommand):
         group.add_argument(
             "-PR", "--download-protocols-results", action="store_true", help="downloads the latest protocols and results (documents and tables) of every study"
         )
+        group.add_argument(
+            "--parallel-details", action="store_true", help="requests all detail pages of a study at once instead of one after another"
+        )
+        group.add_argument(
+            "--http-cache", action="store_true", help="enables the shared http cache, which revalidates cached pages after HTTPCACHE_EXPIRATION_SECS"
+        )
+        group.add_argument(
+            "--adaptive-concurrency", action="store_true", help="adjusts the concurrency of every domain up to ADAPTIVECONCURRENCY_MAX_CONCURRENCY based on the errors and latencies of the responses"
+        )
+        group.add_argument(
+            "-R", "--resumable", action="store_true", help="checkpoints every parsed page and resumes the studies of an interrupted run"
+        )
+        group.add_argument(
+            "-I", "--incremental", action="store_true", help="only extracts new or changed studies of the sitemap and reuses the stored items of the last run for all other studies"
+        )
 
     def process_options(self, args, opts):
         CrawlCommand.process_options(self, args, opts)
@@ -39,11 +54,27 @@ class Command(CrawlCommand):
                               priority=self.settings.maxpriority() + 10)
             self.settings.set("LOG_LEVEL", "DEBUG",
                               priority=self.settings.maxpriority() + 10)
+        if opts.http_cache:
+            self.settings.set("HTTPCACHE_ENABLED", True, priority="cmdline")
+        if opts.adaptive_concurrency:
+            self.settings.set("ADAPTIVECONCURRENCY_ENABLED",
+                              True, priority="cmdline")
+            self.settings.set("CONCURRENT_REQUESTS", self.settings.getint(
+                "ADAPTIVECONCURRENCY_MAX_CONCURRENCY"), priority="cmdline")
         opts.spargs.setdefault('progress_logging', not opts.debug)
         opts.spargs.setdefault('filter_studies', bool(opts.filter))
         opts.spargs.setdefault('save_pdf', opts.download_pdf)
         opts.spargs.setdefault('save_protocols_and_results',
                                opts.download_protocols_results)
+        if opts.incremental and opts.filter:
+            raise UsageError(
+                "The incremental mode requires the sitemap and can't be used with a filter")
+        if opts.resumable and opts.filter:
+            raise UsageError(
+                "The resumable mode requires the sitemap and can't be used with a filter")
+        opts.spargs.setdefault('incremental', opts.incremental)
+        opts.spargs.setdefault('resumable', opts.resumable)
+        opts.spargs.setdefault('parallel_details', opts.parallel_details)
         if opts.filter:
             opts.spargs.setdefault(
                 'filter_rmp_category', self.get_rmp(opts.filter))
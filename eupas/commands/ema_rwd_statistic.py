@@ -15,6 +15,8 @@ class Command(PandasCommand):
 
     # NOTE: This fields are generated by the patch command
     cancel_field = '$CANCELLED_MANUAL'
+    # NOTE: The multivalued fields are split by the preprocessing
+    multivalue_separator = '; '
     funding_field_name = '$MATCHED'
 
     ################################
@@ -40,6 +42,23 @@ class Command(PandasCommand):
         'multiple_funding_sources_override'
     ]
 
+    # NOTE: Only these columns (and the override fields) are read from the input file
+    # NOTE: has_protocol and has_result are derived from the document urls, if they are missing
+    input_fields = [
+        'eu_pas_register_number', '$CANCELLED_MANUAL', '$MATCHED', '$UPDATED_state',
+        'additional_institutions_encepp', 'additional_medical_conditions', 'age_population',
+        'check_completeness', 'check_conformance', 'check_logical_consistency', 'check_stability',
+        'countries', 'data_collection_date_actual', 'data_collection_date_planed',
+        'data_sources_not_registered_with_encepp', 'data_sources_registered_with_encepp',
+        'final_report_date_actual', 'final_report_date_planed', 'funding_sources', 'has_protocol',
+        'has_result', 'medical_conditions', 'networks_encepp', 'networks_not_encepp',
+        'non_interventional_scopes', 'non_interventional_study_design', 'number_of_subjects',
+        'outcomes', 'protocol_document_url', 'references', 'registration_date',
+        'requested_by_regulator', 'result_document_url', 'result_tables_url',
+        'risk_management_plan', 'special_population', 'state', 'study_topic', 'study_type',
+        'substance_atc', 'substance_brand_name', 'substance_inn', 'title', 'url'
+    ]
+
     required_rmp = ['EU RMP category 1 (imposed as condition of marketing authorisation)',
                     'EU RMP category 2 (specific obligation of marketing authorisation)']
 
@@ -792,7 +811,8 @@ class Command(PandasCommand):
         self.logger.info('Starting statistic script')
         self.logger.info(f'Pandas {pd.__version__}')
         self.logger.info('Reading and preprocessing input data...')
-        data = self.preprocess(self.read_input())
+        data = self.preprocess(self.read_input(
+            columns=self.input_fields + self.override_fields))
 
         self.logger.info('Adding extra columns if unspecified...')
         if 'has_protocol' not in data.columns:
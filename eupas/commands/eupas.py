@@ -27,9 +27,6 @@ class Command(CrawlCommand):
         group.add_argument(
             "--debug", action="store_true", help="enable debugging; disables the tqdm bar and logs in verbose mode"
         )
-        group.add_argument(
-            "-PDF", "--download-pdf", action="store_true", help="downloads a pdf file for each study detail page"
-        )
         group.add_argument(
             "-PR", "--download-protocols-results", action="store_true", help="downloads the latest protocols and results of every study"
         )
@@ -43,7 +40,6 @@ class Command(CrawlCommand):
                               priority=self.settings.maxpriority() + 10)
         opts.spargs.setdefault('progress_logging', not opts.debug)
         opts.spargs.setdefault('filter_studies', bool(opts.filter))
-        opts.spargs.setdefault('save_pdf', opts.download_pdf)
         opts.spargs.setdefault('save_protocols_and_results',
                                opts.download_protocols_results)
         if opts.filter:
@@ -17,6 +17,8 @@ class Command(PandasCommand):
 
     # NOTE: This fields are generated by the patch command
     cancel_field = '$CANCELLED_MANUAL'
+    # NOTE: The multivalued fields are split by the preprocessing
+    multivalue_separator = '; '
     group_by_field_name = '$MATCHED'
 
     ################################
@@ -36,6 +38,21 @@ class Command(PandasCommand):
                          'funding_government_body_percentage', 'funding_research_councils_percentage',
                          'funding_eu_scheme_percentage']
 
+    # NOTE: Only these columns (and the percentage fields) are read from the input file
+    input_fields = [
+        'eu_pas_register_number', '$CANCELLED_MANUAL', '$MATCHED', '$UPDATED_state',
+        'age_population', 'collaboration_with_research_network', 'countries', 'country_type',
+        'data_collection_date_actual', 'data_collection_date_planed', 'data_source_types',
+        'data_sources_not_registered_with_encepp', 'data_sources_registered_with_encepp',
+        'final_report_date_actual', 'final_report_date_planed', 'follow_up', 'funding_other_names',
+        'funding_other_percentage', 'latest_protocol_document_url', 'latest_result_document_url',
+        'medical_conditions', 'number_of_subjects', 'other_documents_url', 'other_population',
+        'primary_outcomes', 'protocol_document_url', 'references', 'registration_date',
+        'requested_by_regulator', 'result_document_url', 'risk_management_plan', 'scopes',
+        'secondary_outcomes', 'sex_population', 'state', 'study_design', 'study_type',
+        'substance_atc', 'substance_inn', 'uses_established_data_source'
+    ]
+
     # NOTE: These fields are a subset of the analysed variables containing multiple values delimited by '; '
     category_array_fields = ['age_population', 'data_source_types', 'funded_by',
                              'other_population', 'scopes', 'sex_population', 'study_design']
@@ -636,7 +653,8 @@ class Command(PandasCommand):
         self.logger.info('Starting statistic script')
         self.logger.info(f'Pandas {pd.__version__}')
         self.logger.info('Reading input data...')
-        data = self.preprocess(self.read_input())
+        data = self.preprocess(self.read_input(
+            columns=self.input_fields + self.percentage_fields))
 
         # Adding outcomes
         data = data.assign(
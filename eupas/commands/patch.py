@@ -1,3 +1,4 @@
+from functools import cached_property
 import json
 import logging
 from pathlib import Path
@@ -5,6 +6,7 @@ import re
 
 from scrapy.exceptions import UsageError
 
+from eupas.clustering import NameNormaliser
 from eupas.commands import PandasCommand
 from eupas.items import EU_PAS_Study, EMA_RWD_Study
 
@@ -102,6 +104,12 @@ class Command(PandasCommand):
             action="store_true",
             help="checks if all match_checking fields matched and sets the correct exitcode based on the result"
         )
+        patch.add_argument(
+            "--match-normalised",
+            action="store_true",
+            default=False,
+            help="matches the names without an exact match by their normalised names (see the cluster command)"
+        )
         patch.add_argument(
             "--match-eupas",
             action="store_true",
@@ -137,6 +145,7 @@ class Command(PandasCommand):
         self.matching_enabled = 'match' in args
         self.match_type = EU_PAS_Study if opts.match_eupas else EMA_RWD_Study
         self.match_checking_enabled = self.matching_enabled and opts.match_check
+        self.match_normalised_enabled = self.matching_enabled and opts.match_normalised
         self.match_input_path = Path(opts.match_input or "")
         if self.matching_enabled:
             validate_path(self.match_input_path, '-mi')
@@ -162,6 +171,38 @@ class Command(PandasCommand):
             cancel       This will find cancelled studies with a list of regex patterns
         """
 
+    @cached_property
+    def normaliser(self):
+        return NameNormaliser()
+
+    def match_normalised(self, data, merge_data, field_name):
+        '''
+        Matches the names without an exact match by their normalised names.
+        Normalised names are only used, if all of their original names are assigned to the same manual value.
+        Names which consist only of legal forms and junk words are normalised to empty names and never matched.
+        '''
+        matched_field_name = f'{self.matched_meta_field_name}_{field_name}'
+        merge_data = merge_data.assign(original=merge_data['original'].map(self.normaliser, na_action='ignore')) \
+            .loc[lambda x: x['original'] != ''] \
+            .groupby('original') \
+            .filter(lambda x: x['manual'].nunique() == 1) \
+            .drop_duplicates(subset='original') \
+            .rename(columns={'manual': matched_field_name})
+
+        unmatched = data[matched_field_name].isna() & data[field_name].notna()
+        normalised = data.loc[unmatched, field_name].map(self.normaliser)
+        normalised = normalised.loc[normalised != '']
+        matches = normalised.to_frame('original') \
+            .merge(merge_data, how='left', on='original', validate='m:1') \
+            .set_axis(normalised.index)
+        matches = matches.loc[matches[matched_field_name].notna()]
+
+        columns = [name for name in merge_data.columns if name != 'original']
+        data.loc[matches.index, columns] = matches[columns]
+        self.logger.info(
+            f'\tMatched {len(matches)} {field_name} values by their normalised names')
+        return data
+
     def run(self, args, opts):
         import numpy as np
         import pandas as pd
@@ -230,6 +271,9 @@ class Command(PandasCommand):
                     validate='m:1'
                 )
 
+                if self.match_normalised_enabled:
+                    data = self.match_normalised(data, merge_data, field_name)
+
             data[self.matched_meta_field_name] = data.filter(like=self.matched_meta_field_name) \
                 .apply(lambda x: ''.join([str(y) for y in x.values if isinstance(y, str)]), axis='columns')
 
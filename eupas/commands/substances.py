@@ -16,6 +16,7 @@ class Command(PandasCommand):
 
     classifications = ['BAN', 'DCF', 'INN', 'JAN',
                        'JP18', 'NF', 'Non-JPS', 'prop.INN', 'TM', 'TN', 'USAN', 'USP']
+    multivalue_separator = '; '
 
     def add_options(self, parser):
         '''
@@ -74,7 +75,7 @@ class Command(PandasCommand):
         self.logger.info('Starting substances script')
         self.logger.info(f'Pandas {pd.__version__}')
         self.logger.info('Reading input data...')
-        data = self.read_input()
+        data = self.read_input(columns=['substance_inn', 'substance_atc'])
 
         substance_inn = data.loc[data['substance_inn'].notna(), [
             'substance_inn']]
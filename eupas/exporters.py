@@ -14,12 +14,17 @@ from scrapy.spiders import Spider
 
 from collections.abc import Iterable, Mapping
 from datetime import date, datetime
+import logging
 import re
 import sqlite3
 from typing import List
 
 from itemadapter.adapter import ItemAdapter
 
+from eupas.items import serialize_date
+
+logger = logging.getLogger(__name__)
+
 
 def uri_params(params, spider: Spider):
     is_filtered = spider.custom_settings.get('FILTER_STUDIES', False)
@@ -153,12 +158,23 @@ class XlsxItemExporter(BaseItemExporter):
 
 
 class SQLiteItemExporter(BaseItemExporter):
+    '''
+    Exports the items into a table of a SQLite database.
+    The items are inserted in batches of batch_size rows and every batch is committed in one transaction.
+    If a batch violates a constraint, its rows are inserted one by one and only the invalid rows are dropped.
+    The journal_mode and synchronous pragmas of the database can be set with the feed options.
+    With normalize_multivalued every multivalued field gets an indexed child table (study_id, value) instead of a joined column
+    and the items are upserted by their primary key.
+    '''
 
     type_map = {
         str: 'TEXT',
         int: 'INTEGER',
         float: 'NUMERIC',
     }
+    journal_modes = frozenset(
+        ['DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'])
+    synchronous_modes = frozenset(['OFF', 'NORMAL', 'FULL', 'EXTRA'])
 
     def __init__(
         self,
@@ -168,6 +184,10 @@ class SQLiteItemExporter(BaseItemExporter):
         db_name='study',
         date_format='%Y-%m-%d',
         datetime_format='%Y-%m-%d %H:%M:%S',
+        batch_size=500,
+        journal_mode=None,
+        synchronous=None,
+        normalize_multivalued=False,
         **kwargs
     ):
         self._configure(kwargs, dont_fail=True)
@@ -177,13 +197,30 @@ class SQLiteItemExporter(BaseItemExporter):
         self.date_format = date_format
         self.datetime_format = datetime_format
         self.db_name = db_name
+        self.batch_size = max(int(batch_size), 1)
+        self.normalize_multivalued = normalize_multivalued
 
         self.connection = sqlite3.connect(file.name)
         self.cursor = self.connection.cursor()
+        self._set_pragma('journal_mode', journal_mode, self.journal_modes)
+        self._set_pragma('synchronous', synchronous, self.synchronous_modes)
 
         self.regex = re.compile(r"[^a-z,A-Z,0-9,_]")
         self.table_created = False
         self.type_not_determined = True
+        self.columns = []
+        self.child_columns = []
+        self.primary_index = None
+        self.batch = []
+        self.batch_keys = set()
+        self.child_batch = {}
+
+    def _set_pragma(self, name, value, allowed_values):
+        if value is None:
+            return
+        if str(value).upper() not in allowed_values:
+            raise ValueError(f'Invalid {name} value: {value}')
+        self.cursor.execute(f'PRAGMA {name} = {str(value).upper()};')
 
     def serialize_field(self, field, column_name, value):
         serializer = field.get('serializer', lambda x: x)
@@ -210,25 +247,110 @@ class SQLiteItemExporter(BaseItemExporter):
         else:
             return value
 
+    def _get_columns(self, item):
+        '''
+        Returns the field names, output names and field metadata of all columns sorted by output name.
+        '''
+        if self.fields_to_export is None:
+            field_iter = [(name, name)
+                          for name in ItemAdapter(item).field_names()]
+        elif isinstance(self.fields_to_export, Mapping):
+            field_iter = self.fields_to_export.items()
+        else:
+            field_iter = [(name, name) for name in self.fields_to_export]
+
+        return [
+            (field_name, output_name, self._get_field_meta(field_name))
+            for field_name, output_name in sorted(field_iter, key=lambda x: x[1])
+        ]
+
     def export_item(self, item):
         if self.type_not_determined:
             self.item_type = type(item)
-
-        fields = sorted(list(self._get_serialized_fields(
-            item, default_value=self.default_value, include_empty=True
-        )), key=lambda x: x[0])
-
-        names = [self._get_sql_name(name) for name, _ in fields]
-        values = [value for _, value in fields]
+            self.type_not_determined = False
 
         if not self.table_created:
-            self._create_table(names)
+            # NOTE: The column order and names are only computed once
+            columns = self._get_columns(item)
+            self.columns = [
+                column for column in columns if not self._is_child_column(column[2])]
+            self.child_columns = [
+                column for column in columns if self._is_child_column(column[2])]
+            self._create_table([output_name for _, output_name, _ in self.columns])
+            self._create_child_tables()
             self.table_created = True
 
-        self.cursor.execute(self.insert_sql, [
-            *values
-        ])
-        self.connection.commit()
+        adapter = ItemAdapter(item)
+        row = [
+            self.serialize_field(meta, output_name, adapter[field_name])
+            if field_name in adapter else self.default_value
+            for field_name, output_name, meta in self.columns
+        ]
+        if self.primary_index is not None:
+            # NOTE: A repeated primary key within one batch would fail the batch or keep the child rows of both items
+            if row[self.primary_index] in self.batch_keys:
+                self._flush()
+            self.batch_keys.add(row[self.primary_index])
+        self.batch.append(row)
+        for field_name, output_name, meta in self.child_columns:
+            if field_name in adapter:
+                self.child_batch[output_name].extend(
+                    (row[self.primary_index], value) for value in self._serialize_values(meta, adapter[field_name]))
+        if len(self.batch) >= self.batch_size:
+            self._flush()
+
+    def _is_child_column(self, meta):
+        return self.normalize_multivalued and meta.get('multivalued', False)
+
+    def _serialize_values(self, field, value):
+        '''
+        Returns the serialized values of a multivalued field for its child table.
+        '''
+        value = field.get('serializer', lambda x: x)(value)
+        values = value if isinstance(
+            value, Iterable) and not isinstance(value, str) else [value]
+        return [self._default_serializer(x) for x in values]
+
+    def _get_child_table(self, name):
+        return f'{self.db_name}_{self._get_sql_name(name)}'
+
+    def _flush(self):
+        # NOTE: The buffers are cleared first, so a failing batch is never written again
+        batch, child_batch = self.batch, self.child_batch
+        self.batch = []
+        self.batch_keys.clear()
+        self.child_batch = {name: [] for name in child_batch}
+        if not batch:
+            return
+
+        try:
+            self._write(batch, child_batch)
+        except sqlite3.IntegrityError:
+            for row in batch:
+                key = row[self.primary_index] if self.primary_index is not None else None
+                try:
+                    self._write([row], {
+                        name: [value for value in values if value[0] == key] for name, values in child_batch.items()
+                    })
+                except sqlite3.IntegrityError as error:
+                    logger.error('Dropped the row of %s: %s', key, error)
+
+    def _write(self, batch, child_batch):
+        '''
+        Writes the rows and child rows of a batch in one transaction, which is rolled back on errors.
+        '''
+        with self.connection:
+            self.cursor.execute('BEGIN;')
+            self.cursor.executemany(self.insert_sql, batch)
+            if self.child_columns:
+                # NOTE: The values of upserted items replace their old values
+                study_ids = [(row[self.primary_index],) for row in batch]
+                for _, output_name, _ in self.child_columns:
+                    table = self._get_child_table(output_name)
+                    self.cursor.executemany(
+                        f'DELETE FROM {table} WHERE study_id = ?;', study_ids)
+                    self.cursor.executemany(
+                        f'INSERT INTO {table} (study_id, value) VALUES (?, ?);', child_batch[output_name])
 
     def _get_field_meta(self, field_name):
         try:
@@ -253,8 +375,188 @@ class SQLiteItemExporter(BaseItemExporter):
                 f'{sql_name} {self.type_map.get(sql_type, "BLOB")}{" PRIMARY KEY" if primary else ""}{" NOT NULL" if required else ""}')
         self.cursor.execute(
             f"CREATE TABLE IF NOT EXISTS {self.db_name} ({', '.join(sql_cols)});")
-        self.insert_sql = f"INSERT INTO {self.db_name} ({','.join(names)}) VALUES ({','.join(['?'] * len(names))});"
+        self.insert_sql = f"INSERT INTO {self.db_name} ({','.join(self._get_sql_name(name) for name in names)}) VALUES ({','.join(['?'] * len(names))})"
+
+        primary_names = [
+            name for name in names if self._get_field_meta(name).get('primary_key', False)]
+        if primary_names:
+            self.primary_index = names.index(primary_names[0])
+        if self.normalize_multivalued and primary_names:
+            primary_sql_name = self._get_sql_name(primary_names[0])
+            updates = ', '.join(
+                f'{self._get_sql_name(name)} = excluded.{self._get_sql_name(name)}' for name in names if name != primary_names[0])
+            self.insert_sql += f" ON CONFLICT ({primary_sql_name}) DO UPDATE SET {updates}"
+        self.insert_sql += ';'
+
+    def _create_child_tables(self):
+        if not self.child_columns:
+            return
+        if self.primary_index is None:
+            raise ValueError(
+                'The normalized multivalued fields require a primary key field')
+
+        primary_meta = self.columns[self.primary_index][2]
+        for _, output_name, _ in self.child_columns:
+            table = self._get_child_table(output_name)
+            self.cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (study_id {self.type_map.get(primary_meta.get('sql_type', str), 'BLOB')} NOT NULL "
+                f"REFERENCES {self.db_name} ({self._get_sql_name(self.columns[self.primary_index][1])}), value TEXT);")
+            self.cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_study_id ON {table} (study_id);")
+            self.cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_value ON {table} (value);")
+            self.child_batch[output_name] = []
+
+    def finish_exporting(self):
+        try:
+            self._flush()
+        finally:
+            self.connection.close()
+
+
+class ParquetItemExporter(BaseItemExporter):
+    '''
+    Exports the items into a columnar Parquet file with a typed schema, which is derived from the field metadata of the item class:
+    Fields with the serialize_date serializer become date32, fields with sql_type=int become int64, multivalued fields become list<string>
+    and all other fields become strings.
+    The items are buffered and written as a row group of row_group_size rows.
+    '''
+
+    def __init__(
+        self,
+        file,
+        join_multivalued='; ',
+        date_format='%Y-%m-%d',
+        datetime_format='%Y-%m-%d %H:%M:%S',
+        row_group_size=1000,
+        compression='snappy',
+        **kwargs
+    ):
+        self._configure(kwargs, dont_fail=True)
+
+        self.file = file
+        self.seperator = join_multivalued
+        self.date_format = date_format
+        self.datetime_format = datetime_format
+        self.row_group_size = max(int(row_group_size), 1)
+        self.compression = compression
+
+        self.item_type = None
+        self.columns = []
+        self.schema = None
+        self.writer = None
+        self.buffer = {}
+        self.buffered_rows = 0
+
+    def _get_columns(self, item):
+        '''
+        Returns the field names, output names and field metadata of all columns in the order of the item fields.
+        '''
+        if self.fields_to_export is None:
+            field_iter = [(name, name)
+                          for name in ItemAdapter(item).field_names()]
+        elif isinstance(self.fields_to_export, Mapping):
+            field_iter = self.fields_to_export.items()
+        else:
+            field_iter = [(name, name) for name in self.fields_to_export]
+
+        return [
+            (field_name, output_name, self._get_field_meta(field_name))
+            for field_name, output_name in field_iter
+        ]
+
+    def _get_field_meta(self, field_name):
+        try:
+            meta = ItemAdapter.get_field_meta_from_class(
+                self.item_type, field_name)
+        except KeyError:
+            meta = {}
+        return meta
+
+    def _get_arrow_type(self, meta):
+        import pyarrow as pa
+
+        if meta.get('multivalued', False):
+            return pa.list_(pa.string())
+        elif meta.get('serializer') is serialize_date:
+            return pa.date32()
+        elif meta.get('sql_type') is int:
+            return pa.int64()
+        return pa.string()
+
+    def _open_writer(self, schema):
+        import pyarrow.parquet as pq
+
+        self.schema = schema
+        self.writer = pq.ParquetWriter(
+            self.file, self.schema, compression=self.compression)
+
+    def serialize_field(self, field, column_name, value):
+        serializer = field.get('serializer', lambda x: x)
+        value = serializer(value)
+        if value is None:
+            return None
+        elif field.get('multivalued', False):
+            values = value if isinstance(
+                value, Iterable) and not isinstance(value, str) else [value]
+            return [self._default_serializer(x) for x in values]
+        elif field.get('serializer') is serialize_date:
+            return value.date() if isinstance(value, datetime) else value
+        elif field.get('sql_type') is int:
+            return int(value)
+        return self._default_serializer(value)
+
+    def _default_serializer(self, value):
+        '''
+        Provide a valid string serialization for value, which is used for all string columns and the values of list columns.
+        '''
+        if isinstance(value, str):
+            return value
+        elif isinstance(value, Iterable):
+            return self.seperator.join(map(str, value))
+        elif isinstance(value, datetime):
+            return value.strftime(self.datetime_format)
+        elif isinstance(value, date):
+            return value.strftime(self.date_format)
+        return str(value)
+
+    def export_item(self, item):
+        import pyarrow as pa
+
+        if self.writer is None:
+            # NOTE: The schema is derived once from the class of the first item
+            self.item_type = type(item)
+            self.columns = self._get_columns(item)
+            self._open_writer(pa.schema([
+                (output_name, self._get_arrow_type(meta))
+                for _, output_name, meta in self.columns
+            ]))
+            self.buffer = {output_name: [] for _, output_name, _ in self.columns}
+
+        adapter = ItemAdapter(item)
+        for field_name, output_name, meta in self.columns:
+            self.buffer[output_name].append(
+                self.serialize_field(meta, output_name, adapter[field_name])
+                if field_name in adapter else None
+            )
+        self.buffered_rows += 1
+        if self.buffered_rows >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        import pyarrow as pa
+
+        if self.buffered_rows:
+            self.writer.write_table(pa.Table.from_pydict(
+                self.buffer, schema=self.schema))
+            self.buffer = {name: [] for name in self.buffer}
+            self.buffered_rows = 0
 
     def finish_exporting(self):
-        self.connection.commit()
-        self.connection.close()
+        import pyarrow as pa
+
+        if self.writer is None:
+            # NOTE: An empty feed is still a valid Parquet file without any columns
+            self._open_writer(pa.schema([]))
+        self._flush()
+        self.writer.close()
@@ -3,8 +3,15 @@ from scrapy.exceptions import NotConfigured, NotSupported
 from scrapy.exporters import BaseItemExporter
 from scrapy.utils.serialize import ScrapyJSONEncoder
 
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 import json
-from pathlib import Path
+import logging
+from time import time
+
+from eupas.stores import HistoryStore, SnapshotIndex, UpdateJournal, canonical_json, field_digests, record_digest
+
+logger = logging.getLogger(__name__)
 
 
 class SingleJsonItemStringExporter(BaseItemExporter):
@@ -13,9 +20,11 @@ class SingleJsonItemStringExporter(BaseItemExporter):
         self._kwargs.setdefault("indent", 0)
         self.encoder = ScrapyJSONEncoder(**self._kwargs)
 
+    def serialize_item(self, item):
+        return dict(self._get_serialized_fields(item))
+
     def export_item(self, item):
-        itemdict = dict(self._get_serialized_fields(item))
-        return self.encoder.encode(itemdict)
+        return self.encoder.encode(self.serialize_item(item))
 
 
 class ItemHistoryComparer:
@@ -28,10 +37,13 @@ class ItemHistoryComparer:
     only_excepted_fields_key = '$ONLY_EXCEPTED_FIELDS_CHANGED'
 
     # NOTE: If the meta field pipeline is used: all meta field names get ignored
-    def __init__(self, file_path_dict, output_path, excepted_fields_dict, duplicate_excepted_fields_dict, crawler):
+    def __init__(self, file_path_dict, output_path, excepted_fields_dict, duplicate_excepted_fields_dict, crawler, history_path_dict=None):
         self.exporter = SingleJsonItemStringExporter()
-        self.updates = []
-        self.studies = {}
+        self.updates = UpdateJournal(output_path, sort_key=self.sort_key)
+        self.studies = SnapshotIndex(None)
+        self.history = None
+        self.history_path_dict = history_path_dict or {}
+        self.timestamp = None
         self.excepted_fields = set()
         self.duplicate_excepted_fields = set()
         self.file_path_dict = file_path_dict
@@ -55,24 +67,37 @@ class ItemHistoryComparer:
             'ITEMHISTORYCOMPARER_EXCEPTED_FIELDS')
         duplicate_excepted_fields_dict = crawler.settings.get(
             'ITEMHISTORYCOMPARER_DUPLICATE_EXCEPTED_FIELDS')
+        history_path_dict = crawler.settings.getdict(
+            'ITEMHISTORYCOMPARER_HISTORY_PATH')
 
         # instantiate the extension object
         ext = cls(file_path_dict, output_path, excepted_fields_dict,
-                  duplicate_excepted_fields_dict, crawler)
+                  duplicate_excepted_fields_dict, crawler, history_path_dict)
 
         # connect the extension object to signals
         crawler.signals.connect(
             ext.spider_opened, signal=signals.spider_opened)
-        crawler.signals.connect(ext.spider_idle, signal=signals.spider_idle)
+        crawler.signals.connect(
+            ext.spider_closed, signal=signals.spider_closed)
         crawler.signals.connect(ext.item_scraped, signal=signals.item_scraped)
 
         return ext
 
+    @classmethod
+    def sort_key(cls, update):
+        # NOTE: False < True and studies with deleted dates (None) come first
+        return (update[cls.changed_date_key] is not None, update[cls.changed_date_key])
+
     def spider_opened(self, spider):
         item_class = getattr(spider, 'item_class', None)
-        if file_path := self.file_path_dict.get(item_class):
-            with open(file_path, 'rt') as f:
-                self.studies = json.load(f)
+        if history_path := self.history_path_dict.get(item_class):
+            # NOTE: The latest versions of the history store replace the JSON snapshot
+            self.history = HistoryStore(history_path).open()
+            self.studies = self.history
+            self.timestamp = datetime.now(
+                timezone.utc).isoformat(timespec='seconds')
+        elif file_path := self.file_path_dict.get(item_class):
+            self.studies = SnapshotIndex(file_path).load()
 
         if excepted := self.excepted_fields_dict.get(item_class):
             self.excepted_fields = excepted
@@ -80,22 +105,22 @@ class ItemHistoryComparer:
         if duplicate_excepted := self.duplicate_excepted_fields_dict.get(item_class):
             self.duplicate_excepted_fields = duplicate_excepted
 
-    def spider_idle(self, spider):
-        if self.updates:
-            path = Path(self.output_path)
-            path.parent.mkdir(parents=True, exist_ok=True)
-            with path.open('w', encoding='UTF-8') as f:
-                json.dump(sorted(
-                    self.updates, key=lambda x: x[self.changed_date_key]), f, indent='\t', sort_keys=True)
-
-    def tuplify(self, item):
-        return map(lambda x: (x[0], tuple(x[1]) if isinstance(x[1], list) else x[1]), item.items())
+    def spider_closed(self, spider, reason='finished'):
+        self.updates.compact()
+        if self.history:
+            # NOTE: Only a finished crawl of all studies knows which studies were removed from the register
+            if reason == 'finished' and not spider.custom_settings.get('FILTER_STUDIES'):
+                self.history.retire(self.timestamp)
+            self.history.close()
 
     def item_scraped(self, item, spider):
-        new_entry = json.loads(self.exporter.export_item(item))
+        new_entry = self.exporter.serialize_item(item)
+        self.compare(new_entry)
+        if self.history:
+            self.history.add(new_entry, self.timestamp)
 
-        old_entries = list(filter(
-            lambda x: x['eu_pas_register_number'] == new_entry['eu_pas_register_number'], self.studies))
+    def compare(self, new_entry):
+        old_entries = self.studies.get(new_entry['eu_pas_register_number'])
 
         if not old_entries:
             self.crawler.stats.inc_value(
@@ -107,17 +132,24 @@ class ItemHistoryComparer:
             raise NotSupported
 
         old_entry = old_entries[0]
+        new_digests = field_digests(new_entry)
+        # NOTE: Unchanged studies are the common case and only need one comparison
+        if record_digest(new_digests) == old_entry.digest:
+            return
 
         duplicate = self.crawler.stats.get_value(
             f'dupefilter/filtered/search_entries/eupas_{new_entry["eu_pas_register_number"]}', 0) > 0
 
-        difference = frozenset(self.tuplify(new_entry)) - \
-            frozenset(self.tuplify(old_entry))
-        updated_fields = {d[0] for d in difference}
-        deleted_fields = list(frozenset(old_entry.keys()) -
-                              frozenset(new_entry.keys()))
+        updated_fields = {
+            name for name, digest in new_digests.items()
+            if old_entry.field_digests.get(name) != digest
+        }
+        deleted_fields = sorted(
+            old_entry.field_digests.keys() - new_digests.keys())
 
-        changes_dict = dict(difference)
+        changes_dict = {
+            name: json.loads(canonical_json(new_entry[name])) for name in updated_fields
+        }
         only_excepted_fields = False
 
         if updated_fields or deleted_fields:
@@ -150,3 +182,159 @@ class ItemHistoryComparer:
             changes_dict.setdefault(
                 self.deleted_fields_key, deleted_fields or None)
             self.updates.append(changes_dict)
+
+
+class AdaptiveConcurrency:
+    '''
+    Adjusts the concurrency and delay of every downloader slot with an AIMD controller.
+    The concurrency is increased by one after every window of responses without errors and with a flat latency.
+    It's multiplied by the backoff factor after a response with a backoff status code and the delay honours Retry-After headers.
+    Responses to requests sent before the last decrease are ignored, so a burst of errors only decreases the concurrency once.
+    '''
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.min_concurrency = settings.getint(
+            'ADAPTIVECONCURRENCY_MIN_CONCURRENCY')
+        self.max_concurrency = settings.getint(
+            'ADAPTIVECONCURRENCY_MAX_CONCURRENCY')
+        self.window = settings.getint('ADAPTIVECONCURRENCY_WINDOW')
+        self.latency_tolerance = settings.getfloat(
+            'ADAPTIVECONCURRENCY_LATENCY_TOLERANCE')
+        self.backoff_factor = settings.getfloat(
+            'ADAPTIVECONCURRENCY_BACKOFF_FACTOR')
+        self.backoff_http_codes = {
+            int(code) for code in settings.getlist('ADAPTIVECONCURRENCY_BACKOFF_HTTP_CODES')
+        }
+        self.max_delay = settings.getfloat('ADAPTIVECONCURRENCY_MAX_DELAY')
+        self.min_delay = settings.getfloat('DOWNLOAD_DELAY')
+        self.debug = settings.getbool('ADAPTIVECONCURRENCY_DEBUG')
+        self.slots = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('ADAPTIVECONCURRENCY_ENABLED'):
+            raise NotConfigured
+
+        ext = cls(crawler)
+        crawler.signals.connect(
+            ext.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(
+            ext.response_downloaded, signal=signals.response_downloaded)
+        return ext
+
+    def spider_opened(self, spider):
+        self.min_delay = getattr(spider, 'download_delay', self.min_delay)
+
+    def response_downloaded(self, response, request, spider):
+        key = request.meta.get('download_slot')
+        slot = self.crawler.engine.downloader.slots.get(key)
+        if slot is None:
+            return
+
+        state = self.slots.get(key)
+        if state is None:
+            state = self.slots[key] = {
+                'responses': 0,
+                'latencies': 0.0,
+                'best_latency': None,
+                'decreased_at': 0.0
+            }
+            slot.concurrency = min(max(slot.concurrency, self.min_concurrency), self.max_concurrency)
+            self.report(slot)
+
+        # NOTE: The download latency is the time between sending the request and receiving the response
+        if time() - request.meta.get('download_latency', 0.0) < state['decreased_at']:
+            self.crawler.stats.inc_value('adaptive_concurrency/outdated_count')
+            if response.status in self.backoff_http_codes:
+                self.retry_after(slot, response)
+                self.report(slot)
+            return
+
+        if response.status in self.backoff_http_codes:
+            self.back_off(key, slot, state, response)
+            return
+
+        state['responses'] += 1
+        state['latencies'] += request.meta.get('download_latency', 0.0)
+        if state['responses'] < self.window:
+            return
+
+        latency = state['latencies'] / state['responses']
+        state['responses'] = 0
+        state['latencies'] = 0.0
+        if state['best_latency'] is None or latency < state['best_latency']:
+            state['best_latency'] = latency
+
+        # NOTE: A growing latency is the first sign of an overloaded server, so the concurrency is kept
+        if latency > state['best_latency'] * self.latency_tolerance:
+            self.crawler.stats.inc_value('adaptive_concurrency/hold_count')
+            return
+
+        # NOTE: The delay of a Retry-After header is reduced before the concurrency is increased
+        if slot.delay > self.min_delay:
+            slot.delay = max(self.min_delay, slot.delay / 2)
+            self.crawler.stats.inc_value('adaptive_concurrency/delay_reduction_count')
+            decision = 'reduce delay'
+        elif slot.concurrency < self.max_concurrency:
+            slot.concurrency += 1
+            self.crawler.stats.inc_value('adaptive_concurrency/increase_count')
+            decision = 'increase'
+        else:
+            decision = 'keep'
+        self.report(slot)
+        self.log(key, slot, decision, latency)
+
+    def back_off(self, key, slot, state, response):
+        state['responses'] = 0
+        state['latencies'] = 0.0
+        state['decreased_at'] = time()
+        slot.concurrency = max(self.min_concurrency, int(
+            slot.concurrency * self.backoff_factor))
+        self.crawler.stats.inc_value('adaptive_concurrency/decrease_count')
+        self.crawler.stats.inc_value(
+            f'adaptive_concurrency/decrease_count/{response.status}')
+
+        self.retry_after(slot, response)
+        self.report(slot)
+        self.log(key, slot, 'decrease')
+
+    def retry_after(self, slot, response):
+        if (retry_after := self.get_retry_after(response)) is not None:
+            self.crawler.stats.inc_value('adaptive_concurrency/retry_after_count')
+            slot.delay = min(max(slot.delay, retry_after), self.max_delay)
+
+    def get_retry_after(self, response):
+        '''
+        Returns the seconds of a Retry-After header, which can contain seconds or a http date.
+        '''
+        if not (value := response.headers.get(b'Retry-After')):
+            return None
+        value = value.decode('latin-1').strip()
+        if value.isdigit():
+            return float(value)
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time())
+        except (TypeError, ValueError):
+            return None
+
+    def report(self, slot):
+        stats = self.crawler.stats
+        stats.set_value('adaptive_concurrency/concurrency', slot.concurrency)
+        stats.max_value('adaptive_concurrency/max_concurrency', slot.concurrency)
+        stats.min_value('adaptive_concurrency/min_concurrency', slot.concurrency)
+        stats.max_value('adaptive_concurrency/max_delay', slot.delay)
+
+    def log(self, key, slot, decision, latency=None):
+        if self.debug:
+            logger.info(
+                'slot: %(slot)s | %(decision)s | concurrency: %(concurrency)d | delay: %(delay)d ms | latency: %(latency)s',
+                {
+                    'slot': key,
+                    'decision': decision,
+                    'concurrency': slot.concurrency,
+                    'delay': slot.delay * 1000,
+                    'latency': f'{latency * 1000:.0f} ms' if latency is not None else '-'
+                }
+            )
@@ -0,0 +1,100 @@
+# NOT DEFAULT
+# Define your http cache storages and policies here
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#module-scrapy.downloadermiddlewares.httpcache
+
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+import pickle
+from time import time
+
+from scrapy import Spider, http
+from scrapy.downloadermiddlewares.httpcache import HttpCacheMiddleware
+from scrapy.extensions.httpcache import FilesystemCacheStorage, RFC2616Policy
+
+
+class SharedFilesystemCacheStorage(FilesystemCacheStorage):
+    '''
+    A filesystem cache storage sharing its entries between all spiders.
+    Entries never expire in the storage, because the RevalidatingCachePolicy decides if they need to be revalidated.
+    '''
+
+    def _get_request_path(self, spider: Spider, request: http.Request) -> str:
+        key = self._fingerprinter.fingerprint(request).hex()
+        return str(Path(self.cachedir, 'shared', key[0:2], key))
+
+    def _read_meta(self, spider: Spider, request: http.Request):
+        metapath = Path(self._get_request_path(spider, request)) / 'pickled_meta'
+        if not metapath.exists():
+            return None
+        with self._open(metapath, 'rb') as f:
+            return pickle.load(f)
+
+
+class RevalidatingCachePolicy(RFC2616Policy):
+    '''
+    A cache policy treating cached responses as fresh for HTTPCACHE_EXPIRATION_SECS.
+    Afterwards the cached responses are revalidated with If-Modified-Since and If-None-Match and a 304 response counts as hit.
+    The Cache-Control headers of the catalogue pages and the max-age=0 of the default request headers are ignored for the freshness.
+    '''
+
+    refreshed_headers = [b'Date', b'ETag', b'Last-Modified', b'Expires']
+
+    def __init__(self, settings):
+        super().__init__(settings)
+        self.expiration_secs = settings.getint('HTTPCACHE_EXPIRATION_SECS')
+        self.ignore_http_codes = [
+            int(code) for code in settings.getlist('HTTPCACHE_IGNORE_HTTP_CODES')
+        ]
+
+    def should_cache_response(self, response: http.Response, request: http.Request) -> bool:
+        # NOTE: Pages without validators are stored as well, because they are still fresh until the expiration
+        if response.status == 304 or b'no-store' in self._parse_cachecontrol(response):
+            return False
+        return response.status not in self.ignore_http_codes
+
+    def is_cached_response_fresh(self, cachedresponse: http.Response, request: http.Request) -> bool:
+        if b'no-cache' not in self._parse_cachecontrol(request) and \
+                self.get_age(cachedresponse) < self.expiration_secs:
+            return True
+
+        self._set_conditional_validators(request, cachedresponse)
+        return False
+
+    def is_cached_response_valid(self, cachedresponse: http.Response, response: http.Response, request: http.Request) -> bool:
+        if not super().is_cached_response_valid(cachedresponse, response, request):
+            return False
+
+        # NOTE: The Date and validators of a 304 replace the stored ones, so the cached response is fresh again
+        if response.status == 304:
+            for header in self.refreshed_headers:
+                if header in response.headers:
+                    cachedresponse.headers[header] = response.headers[header]
+        return True
+
+    def get_age(self, cachedresponse: http.Response) -> float:
+        '''
+        Returns the age of the cached response based on its Date header, which is set by the cache middleware if missing.
+        '''
+        try:
+            date = parsedate_to_datetime(
+                cachedresponse.headers.get(b'Date', b'').decode('latin-1'))
+        except (TypeError, ValueError):
+            return float('inf')
+        return time() - date.timestamp()
+
+
+class RevalidatingHttpCacheMiddleware(HttpCacheMiddleware):
+    '''
+    A cache middleware storing a cached response again after it was revalidated with a 304 response.
+    Otherwise the stored Date is never refreshed and the response is revalidated on every later run.
+    '''
+
+    def process_response(self, request: http.Request, response: http.Response, spider: Spider) -> http.Response:
+        cachedresponse = request.meta.get('cached_response')
+        result = super().process_response(request, response, spider)
+        if cachedresponse is not None and result is cachedresponse and response.status == 304:
+            self.stats.inc_value('httpcache/refresh', spider=spider)
+            self.storage.store_response(spider, request, cachedresponse)
+        return result
@@ -43,14 +43,14 @@ class EMA_RWD_Study(item.Item):
     eu_pas_register_number = item.Field(
         primary_key=True, required=True, serializer=serialize_id, sql_type=int)
     title = item.Field(required=True)
-    countries = item.Field(required=True)
+    countries = item.Field(multivalued=True, required=True)
     description = item.Field()
     state = item.Field()
     lead_institution_encepp = item.Field()
     lead_institution_not_encepp = item.Field()
-    additional_institutions_encepp = item.Field()
+    additional_institutions_encepp = item.Field(multivalued=True)
     additional_institutions_not_encepp = item.Field()
-    networks_encepp = item.Field()
+    networks_encepp = item.Field(multivalued=True)
     networks_not_encepp = item.Field()
     funding_contract_date_planed = item.Field(serializer=serialize_date)
     funding_contract_date_actual = item.Field(serializer=serialize_date)
@@ -62,38 +62,38 @@ class EMA_RWD_Study(item.Item):
     iterim_report_date_actual = item.Field(serializer=serialize_date)
     final_report_date_planed = item.Field(serializer=serialize_date)
     final_report_date_actual = item.Field(serializer=serialize_date)
-    funding_sources = item.Field()
+    funding_sources = item.Field(multivalued=True)
     funding_details = item.Field()
     protocol_document_url = item.Field()
     requested_by_regulator = item.Field(required=True)
     risk_management_plan = item.Field()
     regulatory_procedure_number = item.Field()
-    study_topic = item.Field()
+    study_topic = item.Field(multivalued=True)
     study_topic_other = item.Field()
     study_type = item.Field(required=True)
     study_type_other = item.Field()
-    non_interventional_scopes = item.Field()
+    non_interventional_scopes = item.Field(multivalued=True)
     non_interventional_scopes_other = item.Field()
-    non_interventional_study_design = item.Field()
+    non_interventional_study_design = item.Field(multivalued=True)
     non_interventional_study_design_other = item.Field()
-    substance_brand_name = item.Field()
+    substance_brand_name = item.Field(multivalued=True)
     substance_brand_name_other = item.Field()
-    substance_atc = item.Field()
-    substance_inn = item.Field()
-    medical_conditions = item.Field()  # NOTE: Not required anymore
+    substance_atc = item.Field(multivalued=True)
+    substance_inn = item.Field(multivalued=True)
+    medical_conditions = item.Field(multivalued=True)  # NOTE: Not required anymore
     additional_medical_conditions = item.Field()
-    age_population = item.Field()  # NOTE: Not required anymore
-    special_population = item.Field()
+    age_population = item.Field(multivalued=True)  # NOTE: Not required anymore
+    special_population = item.Field(multivalued=True)
     special_population_other = item.Field()
     number_of_subjects = item.Field(sql_type=int)  # NOTE: Not required anymore
     outcomes = item.Field()  # NOTE: Not required anymore
     result_tables_url = item.Field()
     result_document_url = item.Field()
-    other_documents_url = item.Field()
-    references = item.Field(sql_name='document_references')
-    data_sources_registered_with_encepp = item.Field()
+    other_documents_url = item.Field(multivalued=True)
+    references = item.Field(multivalued=True, sql_name='document_references')
+    data_sources_registered_with_encepp = item.Field(multivalued=True)
     data_sources_not_registered_with_encepp = item.Field()
-    data_source_types = item.Field()  # NOTE: Not required anymore
+    data_source_types = item.Field(multivalued=True)  # NOTE: Not required anymore
     data_source_types_other = item.Field()
     check_conformance = item.Field(required=True)
     check_completeness = item.Field(required=True)
@@ -122,7 +122,7 @@ class EU_PAS_Study(item.Item):
     centre_organisation = item.Field()
     collaboration_with_research_network = item.Field(required=True)
     country_type = item.Field(required=True)
-    countries = item.Field(required=True)
+    countries = item.Field(multivalued=True, required=True)
     funding_contract_date_planed = item.Field(serializer=serialize_date)
     funding_contract_date_actual = item.Field(serializer=serialize_date)
     data_collection_date_planed = item.Field(serializer=serialize_date)
@@ -143,26 +143,26 @@ class EU_PAS_Study(item.Item):
     funding_research_councils_percentage = item.Field(sql_type=int)
     funding_eu_scheme_names = item.Field()
     funding_eu_scheme_percentage = item.Field(sql_type=int)
-    funding_other_names = item.Field()
-    funding_other_percentage = item.Field()  # List of ints
-    substance_atc = item.Field()
-    substance_inn = item.Field()
-    medical_conditions = item.Field(required=True)
+    funding_other_names = item.Field(multivalued=True)
+    funding_other_percentage = item.Field(multivalued=True)  # List of ints
+    substance_atc = item.Field(multivalued=True)
+    substance_inn = item.Field(multivalued=True)
+    medical_conditions = item.Field(multivalued=True, required=True)
     additional_medical_conditions = item.Field()
-    age_population = item.Field(required=True)
-    sex_population = item.Field(required=True)
-    other_population = item.Field()
+    age_population = item.Field(multivalued=True, required=True)
+    sex_population = item.Field(multivalued=True, required=True)
+    other_population = item.Field(multivalued=True)
     number_of_subjects = item.Field(required=True, sql_type=int)
     uses_established_data_source = item.Field(required=True)
-    data_source_types = item.Field(required=True)
-    data_sources_registered_with_encepp = item.Field()
-    data_sources_not_registered_with_encepp = item.Field()
-    scopes = item.Field(required=True)
+    data_source_types = item.Field(multivalued=True, required=True)
+    data_sources_registered_with_encepp = item.Field(multivalued=True)
+    data_sources_not_registered_with_encepp = item.Field(multivalued=True)
+    scopes = item.Field(multivalued=True, required=True)
     primary_scope = item.Field(
         required=True, serializer=serialize_primary_scope)
-    primary_outcomes = item.Field(required=True)
-    secondary_outcomes = item.Field(required=True)
-    study_design = item.Field(required=True)
+    primary_outcomes = item.Field(multivalued=True, required=True)
+    secondary_outcomes = item.Field(multivalued=True, required=True)
+    study_design = item.Field(multivalued=True, required=True)
     follow_up = item.Field(required=True)
     protocol_document_url = item.Field(
         serializer=serialize_eupas_document_url)
@@ -171,6 +171,6 @@ class EU_PAS_Study(item.Item):
     result_document_url = item.Field(serializer=serialize_eupas_document_url)
     latest_result_document_url = item.Field(
         serializer=serialize_eupas_document_url)
-    references = item.Field(sql_name='document_references')
+    references = item.Field(multivalued=True, sql_name='document_references')
     other_documents_url = item.Field(
-        serializer=lambda x: list(map(serialize_eupas_document_url, x)))
+        multivalued=True, serializer=lambda x: list(map(serialize_eupas_document_url, x)))
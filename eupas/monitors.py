@@ -52,6 +52,20 @@ class UpdatedItemsMonitor(Monitor):
                         item_updates_expected, msg=msg)
 
 
+@monitors.name('Adaptive Concurrency')
+class AdaptiveConcurrencyMonitor(Monitor):
+
+    @monitors.name("Decreases of the adaptive concurrency don't exceed treshold")
+    def test_adaptive_concurrency_decreases(self):
+        decreases = getattr(
+            self.data.stats, 'adaptive_concurrency/decrease_count', 0)
+        decreases_expected = self.data.crawler.settings.getint(
+            'SPIDERMON_MAX_ADAPTIVE_CONCURRENCY_DECREASES')
+
+        msg = f'The adaptive concurrency was decreased {decreases} time(s) (concurrency between {getattr(self.data.stats, "adaptive_concurrency/min_concurrency", None)} and {getattr(self.data.stats, "adaptive_concurrency/max_concurrency", None)}), but only {decreases_expected} decrease(s) are tolerated'
+        self.assertTrue(decreases <= decreases_expected, msg=msg)
+
+
 # @monitors.name('Expected Response count')
 # class ExpectedResponsesMonitor(Monitor):
 
@@ -120,6 +134,7 @@ class SpiderCloseMonitorSuite(MonitorSuite):
         UnwantedHTTPCodesMonitor,
         RetryCountMonitor,
         DownloaderExceptionMonitor,
+        AdaptiveConcurrencyMonitor,
     ]
 
     other_monitors = [
@@ -5,6 +5,26 @@
 
 from scrapy import spiders, item, exceptions
 from itemadapter.adapter import ItemAdapter
+from twisted.internet import defer, error, protocol, task, threads
+from twisted.python.threadpool import ThreadPool
+from twisted.web import error as web_error
+from twisted.web.client import Agent, BrowserLikeRedirectAgent, PotentialDataLoss, ResponseDone, ResponseFailed, ResponseNeverReceived
+from twisted.web.http_headers import Headers
+
+import hashlib
+import logging
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urljoin, urlparse
+
+from eupas.stores import DocumentStore
+
+logger = logging.getLogger(__name__)
+
+# NOTE: Timeouts of the whole download are not retried, as they already took DOCUMENTS_TIMEOUT
+RETRY_EXCEPTIONS = (error.TimeoutError, error.DNSLookupError, error.ConnectionRefusedError, error.ConnectionDone,
+                    error.ConnectError, error.ConnectionLost, error.TCPTimedOutError,
+                    ResponseFailed, ResponseNeverReceived)
 
 # NOTE: pipelines only work with one type of spider (EU_PAS_Spider/EMA_RWD_Spider)
 # and item (Study) and it is assumed that there is only one type of each!
@@ -25,3 +45,289 @@ class DuplicatesPipeline:
 
         self.ids_seen.add(eupas_id)
         return item
+
+
+class DocumentFile:
+    '''
+    A document, which is written and hashed chunk by chunk in the writer thread.
+    The chunks are written to a temporary file, which is moved into the document store after the download finished.
+    '''
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.part_path = path.with_name(f'{path.name}.part')
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        self.file = None
+
+    def write(self, chunk: bytes) -> None:
+        if self.file is None:
+            self.file = self.part_path.open('wb')
+        self.file.write(chunk)
+        self.hasher.update(chunk)
+        self.size += len(chunk)
+
+    def finish(self) -> str:
+        if self.file is None:
+            self.file = self.part_path.open('wb')
+        self.file.close()
+        return self.hasher.hexdigest()
+
+    def discard(self) -> None:
+        if self.file is not None:
+            self.file.close()
+        self.part_path.unlink(missing_ok=True)
+
+
+class DocumentBodyProtocol(protocol.Protocol):
+    '''
+    Streams the body of a response into a DocumentFile without keeping it in memory.
+    Cancelling the finished deferred (e.g. by the timeout of the download) stops receiving the body.
+    '''
+
+    def __init__(self, document: DocumentFile, writer: ThreadPool, max_size: int = 0):
+        self.document = document
+        self.writer = writer
+        self.finished = defer.Deferred(self.cancel)
+        self.max_size = max_size
+        self.received = 0
+        self.cancelled = False
+
+    def cancel(self, _: defer.Deferred) -> None:
+        self.cancelled = True
+        self.transport.stopProducing()
+
+    def dataReceived(self, data: bytes) -> None:
+        self.received += len(data)
+        if self.max_size and self.received > self.max_size:
+            self.transport.stopProducing()
+            return
+        # NOTE: The writer has a single thread, so the chunks are written in order
+        self.writer.callInThread(self.document.write, data)
+
+    def connectionLost(self, reason) -> None:
+        if self.cancelled:
+            # NOTE: The finished deferred already failed with a CancelledError
+            self.writer.callInThread(self.document.discard)
+        elif self.max_size and self.received > self.max_size:
+            self.writer.callInThread(self.document.discard)
+            self.finished.errback(exceptions.IgnoreRequest(
+                f'Document exceeds the maximal size of {self.max_size} bytes'))
+        elif reason.check(ResponseDone, PotentialDataLoss):
+            from twisted.internet import reactor
+            threads.deferToThreadPool(
+                reactor, self.writer, self.document.finish).chainDeferred(self.finished)
+        else:
+            self.writer.callInThread(self.document.discard)
+            self.finished.errback(reason)
+
+
+class DiscardBodyProtocol(protocol.Protocol):
+    '''
+    Closes the connection of a response without reading its body.
+    '''
+
+    def connectionMade(self) -> None:
+        self.transport.stopProducing()
+
+
+class DocumentDownloadPipeline:
+    '''
+    A Pipeline which streams the documents of every item to disk, bypassing the scrapy downloader and its in-memory response bodies.
+    The documents have their own concurrency limit and are kept in a DocumentStore shared between runs.
+    Stored documents are requested conditionally and unchanged documents are only hardlinked into the folder of the run.
+    '''
+
+    def __init__(self, settings):
+        self.fields_dict = settings.getdict('DOCUMENTS_FIELDS')
+        self.folder = Path(settings.get('DOCUMENTS_DIRECTORY'))
+        self.store = DocumentStore(settings.get('DOCUMENTS_STORE_PATH'))
+        self.timeout = settings.getfloat('DOCUMENTS_TIMEOUT')
+        self.max_size = settings.getint('DOCUMENTS_MAXSIZE')
+        self.semaphore = defer.DeferredSemaphore(
+            settings.getint('DOCUMENTS_CONCURRENT_REQUESTS'))
+        self.headers = Headers({'User-Agent': [settings.get('USER_AGENT')]})
+        self.retry_times = settings.getint(
+            'RETRY_TIMES') if settings.getbool('RETRY_ENABLED') else 0
+        self.retry_http_codes = {int(code) for code in settings.getlist('RETRY_HTTP_CODES')}
+        self.retry_delay = settings.getfloat('DOWNLOAD_DELAY')
+        self.agent = None
+        self.writer = ThreadPool(minthreads=1, maxthreads=1,
+                                 name='DocumentDownloadPipeline')
+        self.pending = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        pipeline = cls(crawler.settings)
+        pipeline.crawler = crawler
+        return pipeline
+
+    def open_spider(self, _: spiders.Spider):
+        # NOTE: The reactor is imported after scrapy installed the configured reactor
+        from twisted.internet import reactor
+        self.agent = BrowserLikeRedirectAgent(
+            Agent(reactor, connectTimeout=self.timeout))
+        self.store.load()
+        self.writer.start()
+
+    def close_spider(self, _: spiders.Spider):
+        # NOTE: The spider is closed after all documents are downloaded
+        finished = defer.DeferredList(list(self.pending))
+        finished.addBoth(lambda _: self.store.save())
+        finished.addBoth(lambda _: self.writer.stop())
+        return finished
+
+    def get_documents(self, item: item.Item, spider: spiders.Spider):
+        '''
+        Returns the study key, url and file name of all documents of an item, which are enabled by the flags of the spider.
+        If several fields share a file name, only the first field with a url is used.
+        '''
+        adapter = ItemAdapter(item)
+        key = adapter.get('eu_pas_register_number')
+        file_names = set()
+        for flag, fields in self.fields_dict.get(type(item), {}).items():
+            if not spider.custom_settings.get(flag):
+                continue
+            for field_name, suffix in fields.items():
+                file_name = f'{key}{suffix}.pdf'
+                if file_name not in file_names and (url := self.get_url(adapter, field_name)):
+                    file_names.add(file_name)
+                    yield key, url, file_name
+
+    @staticmethod
+    def get_url(adapter: ItemAdapter, field_name: str) -> Optional[str]:
+        '''
+        Returns the absolute url of a document field or None, if the field contains no url (e.g. "Not public until study ends").
+        The relative urls of the EU PAS Register are resolved against the url of the study without their session id.
+        '''
+        if not (value := adapter.get(field_name)):
+            return None
+        value = value.split(';')[0]
+        if value.startswith('/'):
+            # NOTE: Relative urls ending with / don't lead to a document
+            return urljoin(adapter.get('url'), value) if not value.endswith('/') else None
+        return value if urlparse(value).scheme in ('http', 'https') else None
+
+    def process_item(self, item: item.Item, spider: spiders.Spider):
+        for key, url, file_name in self.get_documents(item, spider):
+            d = self.semaphore.run(self.download, key,
+                                   url, self.folder / file_name)
+            self.pending.add(d)
+            d.addErrback(self.download_failed, url)
+            d.addBoth(lambda _, d=d: self.pending.discard(d))
+        return item
+
+    def get_request_headers(self, entry: Optional[dict]) -> Headers:
+        '''
+        Returns the request headers with the validators of a stored document.
+        '''
+        headers = self.headers.copy()
+        if entry and entry.get('etag'):
+            headers.setRawHeaders(b'If-None-Match', [entry['etag']])
+        if entry and entry.get('last_modified'):
+            headers.setRawHeaders(b'If-Modified-Since',
+                                  [entry['last_modified']])
+        return headers
+
+    @staticmethod
+    def get_validators(response) -> dict:
+        return {
+            name: (values[0].decode('latin-1') if (values := response.headers.getRawHeaders(header)) else None)
+            for name, header in [
+                ('etag', b'ETag'),
+                ('last_modified', b'Last-Modified'),
+                ('content_length', b'Content-Length')
+            ]
+        }
+
+    @staticmethod
+    def is_unchanged(entry: dict, validators: dict) -> bool:
+        '''
+        Checks the ETag or otherwise the Last-Modified and size of a document, in case the server ignored the conditional request.
+        '''
+        if validators['etag']:
+            return validators['etag'] == entry.get('etag')
+        return bool(validators['last_modified'] and validators['content_length']) and \
+            validators['last_modified'] == entry.get('last_modified') and \
+            validators['content_length'] == str(entry.get('size'))
+
+    def download(self, key: str, url: str, path: Path, attempt: int = 0) -> defer.Deferred:
+        from twisted.internet import reactor
+        entry = self.store.get(key, path.name, url)
+        d = self.agent.request(b'GET', url.encode('utf-8'),
+                               self.get_request_headers(entry))
+        d.addCallback(self.stream, key, url, path, entry)
+        # NOTE: The timeout covers the body as well, because the spider is only closed after all downloads finished
+        d.addTimeout(self.timeout, reactor)
+        d.addErrback(self.retry, key, url, path, attempt)
+        return d
+
+    def retry(self, failure, key: str, url: str, path: Path, attempt: int):
+        '''
+        Downloads a document again after a connection error or a status in RETRY_HTTP_CODES, at most RETRY_TIMES times.
+        '''
+        from twisted.internet import reactor
+        status = int(failure.value.status) if failure.check(web_error.Error) else None
+        if attempt >= self.retry_times or not (failure.check(*RETRY_EXCEPTIONS) or status in self.retry_http_codes):
+            return failure
+        self.crawler.stats.inc_value('documents/retry_count')
+        logger.debug('Retrying document %s (failed %d times): %s',
+                     url, attempt + 1, failure.getErrorMessage())
+        return task.deferLater(reactor, self.retry_delay, self.download, key, url, path, attempt + 1)
+
+    def stream(self, response, key: str, url: str, path: Path, entry: Optional[dict]) -> defer.Deferred:
+        from twisted.internet import reactor
+        validators = self.get_validators(response)
+        if entry and (response.code == 304 or (response.code == 200 and self.is_unchanged(entry, validators))):
+            response.deliverBody(DiscardBodyProtocol())
+            self.crawler.stats.inc_value('documents/unchanged_count')
+            return threads.deferToThreadPool(reactor, self.writer, self.store.link, entry['sha256'], path)
+
+        if response.code != 200:
+            response.deliverBody(DiscardBodyProtocol())
+            raise web_error.Error(str(response.code).encode())
+
+        document = DocumentFile(self.store.temp_path / path.name)
+        body = DocumentBodyProtocol(document, self.writer, self.max_size)
+        response.deliverBody(body)
+        body.finished.addCallback(self.save_document, document,
+                                  key, url, path, validators)
+        return body.finished
+
+    def save_document(self, digest: str, document: DocumentFile, key: str, url: str, path: Path, validators: dict) -> defer.Deferred:
+        from twisted.internet import reactor
+        # NOTE: Moving and linking touch the file system and the link falls back to copying the whole file, so both run in the writer thread
+        d = threads.deferToThreadPool(
+            reactor, self.writer, self.add_document, digest, document, path)
+        d.addCallback(self.store_document, digest, document,
+                      key, url, path, validators)
+        return d
+
+    def add_document(self, digest: str, document: DocumentFile, path: Path) -> bool:
+        '''
+        Moves a downloaded document into the store and links it to the given path. Returns False, if the store already contained it.
+        '''
+        added = self.store.add(document.part_path, digest)
+        self.store.link(digest, path)
+        return added
+
+    def store_document(self, added: bool, digest: str, document: DocumentFile, key: str, url: str, path: Path, validators: dict) -> None:
+        stats = self.crawler.stats
+        stats.inc_value('documents/downloaded_count')
+        stats.inc_value('documents/bytes', document.size)
+
+        if not added:
+            # NOTE: Identical documents are only stored once
+            stats.inc_value('documents/deduplicated_count')
+        self.store.update(key, path.name, {
+            'url': url,
+            'sha256': digest,
+            'size': document.size,
+            'etag': validators['etag'],
+            'last_modified': validators['last_modified']
+        })
+
+    def download_failed(self, failure, url: str) -> None:
+        self.crawler.stats.inc_value('documents/failed_count')
+        logger.warning('Failed to download document %s: %s',
+                       url, failure.getErrorMessage())
@@ -0,0 +1,69 @@
+# NOT DEFAULT
+# Define your selectors here
+#
+# Selectors evaluate the XPath and CSS expressions of the spiders with a shared registry of compiled lxml XPath objects.
+
+from functools import lru_cache
+import re
+from typing import Optional
+
+from lxml import etree
+from scrapy import http
+from scrapy.selector import Selector, SelectorList
+
+# NOTE: Matches namespace prefixes like re: but not axes like following-sibling::
+NAMESPACE_PREFIX_REGEX = re.compile(r'(?<![:\w-])[\w-]+:(?!:)')
+
+
+@lru_cache(maxsize=1024)
+def compile_xpath(query: str) -> Optional[etree.XPath]:
+    '''
+    Returns the compiled XPath object of an expression. Every expression is only compiled once per process.
+    Use XPath variables like $index instead of formatting values into the expression to reuse the compiled object.
+    Expressions using namespace prefixes return None, because they depend on the namespaces of the selector.
+    '''
+    if NAMESPACE_PREFIX_REGEX.search(query):
+        return None
+    return etree.XPath(query, smart_strings=False)
+
+
+class CompiledSelectorList(SelectorList):
+    '''
+    A SelectorList of CompiledSelectors
+    '''
+
+
+class CompiledSelector(Selector):
+    '''
+    A Selector evaluating its XPath expressions with the registry of compiled XPath objects.
+    Additional keyword arguments of xpath() are passed as values of XPath variables.
+    '''
+    selectorlist_cls = CompiledSelectorList
+
+    @classmethod
+    def from_response(cls, response: http.TextResponse) -> 'CompiledSelector':
+        '''
+        Returns a CompiledSelector reusing the already parsed document of the response.
+        '''
+        return cls(root=response.selector.root, type=response.selector.type)
+
+    def xpath(self, query: str, namespaces=None, **kwargs) -> CompiledSelectorList:
+        # NOTE: Namespaces and text selectors are rare, so the default implementation handles them
+        if namespaces or self.type not in ('html', 'xml') or not hasattr(self.root, 'xpath'):
+            return super().xpath(query, namespaces=namespaces, **kwargs)
+
+        try:
+            if (compiled := compile_xpath(query)) is None:
+                return super().xpath(query, **kwargs)
+            result = compiled(self.root, **kwargs)
+        except etree.XPathError as exc:
+            raise ValueError(f'XPath error: {exc} in {query}')
+
+        if not isinstance(result, list):
+            result = [result]
+
+        return self.selectorlist_cls([
+            self.__class__(root=x, _expr=query,
+                           namespaces=self.namespaces, type=self.type)
+            for x in result
+        ])
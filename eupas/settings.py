@@ -72,6 +72,7 @@ USER_AGENT = random_ua()
 # Also check AUTOTHROTTLE further below
 
 # Configure maximum concurrent requests performed by Scrapy (default: 16)
+# NOTE: The --adaptive-concurrency option raises it to ADAPTIVECONCURRENCY_MAX_CONCURRENCY
 CONCURRENT_REQUESTS = 16
 
 # Configure a delay for requests for the same website (default: 0)
@@ -83,6 +84,7 @@ DOWNLOAD_DELAY = 0.2
 # while fetching requests from the same website (enabled by default)
 RANDOMIZE_DOWNLOAD_DELAY = True
 # The download delay setting will honor only one of:
+# NOTE: This is the start concurrency of the AdaptiveConcurrency extension
 CONCURRENT_REQUESTS_PER_DOMAIN = 16
 # CONCURRENT_REQUESTS_PER_IP = 16
 ##################################
@@ -104,6 +106,8 @@ DOWNLOADER_MIDDLEWARES = {
     'scrapy.downloadermiddlewares.useragent.UserAgentMiddleware': None,
     'scrapy.downloadermiddlewares.ajaxcrawl.AjaxCrawlMiddleware': None,
     'scrapy.downloadermiddlewares.httpproxy.HttpProxyMiddleware': None,
+    'scrapy.downloadermiddlewares.httpcache.HttpCacheMiddleware': None,
+    'eupas.httpcache.RevalidatingHttpCacheMiddleware': 900,
 }
 
 # Enable or disable extensions
@@ -115,6 +119,7 @@ EXTENSIONS = {
     'scrapy.extensions.memdebug.MemoryDebugger': None,
     'scrapy.extensions.statsmailer.Statsmailer': None,
     'eupas.extensions.ItemHistoryComparer': 300,
+    'eupas.extensions.AdaptiveConcurrency': 400,
     'spidermon.contrib.scrapy.extensions.Spidermon': 500,
 }
 
@@ -123,9 +128,47 @@ EXTENSIONS = {
 ITEM_PIPELINES = {
     'eupas.pipelines.DuplicatesPipeline': 0,
     'spidermon.contrib.scrapy.pipelines.ItemValidationPipeline': 800,
+    'eupas.pipelines.DocumentDownloadPipeline': 900,
 }
 ##################################
 
+##################################
+#       DOCUMENT DOWNLOADS       #
+##################################
+# The DocumentDownloadPipeline streams the documents of the items to disk without the scrapy downloader
+# The documents are enabled by the flags of the spider and saved as <eu_pas_register_number><suffix>.pdf
+DOCUMENTS_FIELDS = {
+    EMA_RWD_Study: {
+        'SAVE_PDF': {
+            'pdf_url': ''
+        },
+        'SAVE_PROTOCOLS_AND_RESULTS': {
+            'protocol_document_url': '_latest_protocols',
+            'result_tables_url': '_latest_result_tables',
+            'result_document_url': '_latest_results'
+        }
+    },
+    # NOTE: Only the first url of every file name is downloaded, so the latest documents are preferred
+    EU_PAS_Study: {
+        'SAVE_PROTOCOLS_AND_RESULTS': {
+            'latest_protocol_document_url': '_latest_protocols',
+            'protocol_document_url': '_latest_protocols',
+            'latest_result_document_url': '_latest_results',
+            'result_document_url': '_latest_results'
+        }
+    }
+}
+DOCUMENTS_DIRECTORY = f'{OUTPUT_DIRECTORY}/PDFs'
+# The documents are stored once by their sha256 in the document store and hardlinked into the DOCUMENTS_DIRECTORY
+# Stored documents are requested with their ETag and Last-Modified and aren't downloaded again, if they didn't change
+# NOTE: This path has to stay the same between runs (don't use the OUTPUT_DIRECTORY)
+DOCUMENTS_STORE_PATH = 'state/documents'
+DOCUMENTS_CONCURRENT_REQUESTS = 4
+DOCUMENTS_TIMEOUT = 180
+# NOTE: 0 disables the limit
+DOCUMENTS_MAXSIZE = 0
+##################################
+
 ##################################
 #       SPIDER MIDDLEWARE        #
 ##################################
@@ -158,10 +201,14 @@ DEFAULT_REQUEST_HEADERS = {
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
 HTTPCACHE_ENABLED = False
+# NOTE: Cached responses are fresh for this time and revalidated afterwards
 HTTPCACHE_EXPIRATION_SECS = 12 * 60 * 60
 HTTPCACHE_DIR = 'HttpCache'
-# HTTPCACHE_IGNORE_HTTP_CODES = []
-# HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
+HTTPCACHE_IGNORE_HTTP_CODES = [400, 401, 403, 404, 407, 408, 429, 500, 502, 503, 504, 522, 524]
+HTTPCACHE_GZIP = True
+# NOTE: The entries are shared between the ema_rwd, atc and kegg spiders
+HTTPCACHE_STORAGE = 'eupas.httpcache.SharedFilesystemCacheStorage'
+HTTPCACHE_POLICY = 'eupas.httpcache.RevalidatingCachePolicy'
 
 REDIRECT_ENABLED = True
 REDIRECT_MAX_TIMES = 5
@@ -198,6 +245,24 @@ AUTOTHROTTLE_MAX_DELAY = 2.5
 # Enable showing throttling stats for every response received:
 # AUTOTHROTTLE_DEBUG = True
 
+# Enable and configure the AdaptiveConcurrency extension
+# The concurrency of every domain is increased by one after every window of responses without errors,
+# as long as their mean latency stays below LATENCY_TOLERANCE times the best mean latency.
+# The concurrency is multiplied by the BACKOFF_FACTOR after every response with a BACKOFF_HTTP_CODE
+# and the delay is increased up to MAX_DELAY, if the response contains a Retry-After header.
+# NOTE: Don't enable it together with AutoThrottle; both adjust the download delay
+# NOTE: It's enabled by the --adaptive-concurrency option of the ema_rwd command
+ADAPTIVECONCURRENCY_ENABLED = False
+ADAPTIVECONCURRENCY_MIN_CONCURRENCY = 1
+ADAPTIVECONCURRENCY_MAX_CONCURRENCY = 32
+ADAPTIVECONCURRENCY_WINDOW = 20
+ADAPTIVECONCURRENCY_LATENCY_TOLERANCE = 1.5
+ADAPTIVECONCURRENCY_BACKOFF_FACTOR = 0.5
+ADAPTIVECONCURRENCY_BACKOFF_HTTP_CODES = [429, 500, 502, 503, 504, 522, 524]
+ADAPTIVECONCURRENCY_MAX_DELAY = 60.0
+# Enable logging every decision of the controller
+# ADAPTIVECONCURRENCY_DEBUG = True
+
 # CloseSpider Extension
 CLOSESPIDER_TIMEOUT = 2 * 60 * 60
 CLOSESPIDER_TIMEOUT_NO_ITEM = 30 * 60
@@ -245,6 +310,8 @@ SPIDERMON_UNWANTED_HTTP_CODES = {
     523: 0
 }
 SPIDERMON_MAX_RETRIES = 10
+# Settings for AdaptiveConcurrencyMonitor
+SPIDERMON_MAX_ADAPTIVE_CONCURRENCY_DECREASES = 10
 SPIDERMON_MAX_DOWNLOADER_EXCEPTIONS = 0
 
 # Settings for other_monitors
@@ -266,6 +333,7 @@ SPIDERMON_REPORT_FILENAME = f'{OUTPUT_DIRECTORY}/report.html'
 
 # Custom ITEMCOMPARER Extension
 ITEMHISTORYCOMPARER_ENABLED = True
+# The old studies can be a JSON array or JSON lines file, which is streamed into an index of field digests
 ITEMHISTORYCOMPARER_JSON_INPUT_PATH = {
     EU_PAS_Study: 'compare/eu_pas.json',
     EMA_RWD_Study: 'compare/ema_rwd.json'
@@ -291,7 +359,41 @@ ITEMHISTORYCOMPARER_DUPLICATE_EXCEPTED_FIELDS = {
         # 'update_date'
     }
 }
+# NOTE: The changes are appended to updates.jsonl during the crawl and sorted into updates.json at the end
 ITEMHISTORYCOMPARER_JSON_OUTPUT_PATH = f'{OUTPUT_DIRECTORY}/updates.json'
+# Every crawl can append its changed studies as new versions to a SQLite history store
+# The latest versions of the history store are compared instead of the JSON snapshot, if a path is set for the item
+# NOTE: This path has to stay the same between runs (don't use the OUTPUT_DIRECTORY)
+ITEMHISTORYCOMPARER_HISTORY_PATH = {
+    # EMA_RWD_Study: 'state/ema_rwd_history.db'
+}
+##################################
+
+##################################
+#       INCREMENTAL CRAWLS       #
+##################################
+# The incremental mode of the ema_rwd spider stores the sitemap lastmod and the item of every study.
+# Only new or changed studies will be requested in the next incremental run.
+# NOTE: This path has to stay the same between runs (don't use the OUTPUT_DIRECTORY)
+INCREMENTAL_STATE_PATH = 'state/ema_rwd.json'
+##################################
+
+##################################
+#        PARALLEL DETAILS        #
+##################################
+# The ema_rwd spider can request all detail pages of a study at once (--parallel-details).
+# A study is dropped, if one of its detail pages times out or fails after all retries.
+PARALLEL_DETAILS_DOWNLOAD_TIMEOUT = 60
+##################################
+
+##################################
+#        RESUMABLE CRAWLS        #
+##################################
+# The resumable mode of the ema_rwd spider appends every parsed page and every finished study to a checkpoint file.
+# A restarted crawl skips the finished studies and only requests the missing pages of partial studies.
+# The checkpoint file is removed after a finished crawl.
+# NOTE: This path has to stay the same between runs (don't use the OUTPUT_DIRECTORY)
+RESUMABLE_CHECKPOINT_PATH = 'state/ema_rwd_checkpoint.jsonl'
 ##################################
 
 ##################################
@@ -372,6 +474,19 @@ FEEDS = {
             'db_name': 'study',
             'date_format': '%Y-%m-%d',
             'datetime_format': '%Y-%m-%d %H:%M:%S',
+            'batch_size': 500,
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            # NOTE: Stores the multivalued fields in indexed child tables (study_<field>) instead of joined columns
+            'normalize_multivalued': False,
+        },
+    },
+    f'{OUTPUT_DIRECTORY}/{get_item_name()}.parquet': {
+        'format': 'parquet',
+        'overwrite': True,
+        'item_export_kwargs': {
+            'row_group_size': 1000,
+            'compression': 'snappy',
         },
     }
 }
@@ -379,7 +494,8 @@ FEEDS = {
 # This custom exporter is needed for xlsx export with the -o (output) command
 FEED_EXPORTERS = {
     'xlsx': 'eupas.exporters.XlsxItemExporter',
-    'sqlite3': 'eupas.exporters.SQLiteItemExporter'
+    'sqlite3': 'eupas.exporters.SQLiteItemExporter',
+    'parquet': 'eupas.exporters.ParquetItemExporter'
 }
 
 # This setting tells the exporters if they should export empty feeds without any items
@@ -5,15 +5,18 @@
 # https://docs.scrapy.org/en/latest/topics/spiders.html
 
 from scrapy import spiders, http, signals
+from scrapy.selector import SelectorList
 from scrapy.utils.sitemap import Sitemap
 from tqdm import tqdm
+from twisted.python.failure import Failure
 
 from enum import Enum
-from pathlib import Path
 import re
-from typing import List, Generator, Union
+from typing import Any, Callable, Dict, Iterable, List, Generator, NamedTuple, Optional, Tuple, Union
 
 from eupas.items import EMA_RWD_Study
+from eupas.selectors import CompiledSelector
+from eupas.stores import CheckpointStore, StudyStateStore
 
 
 class RMP(Enum):
@@ -27,6 +30,119 @@ class RMP(Enum):
     not_applicable = 54335
 
 
+class StudyAssembler:
+    '''
+    Merges the partial items of the detail pages of each study, which are requested in parallel.
+    '''
+
+    def __init__(self):
+        self.studies = {}
+
+    def start(self, key: str, study: EMA_RWD_Study, pages: Iterable[str]) -> None:
+        self.studies[key] = {
+            'study': study,
+            'pending': set(pages),
+            'failed': set()
+        }
+
+    def resolve(self, key: str, page: str, partial: Optional[EMA_RWD_Study] = None) -> Optional[Tuple[EMA_RWD_Study, List[str]]]:
+        '''
+        Merges the partial item of a page or marks the page as failed, if no partial item is given.
+        Returns the study and the failed pages after the last page of the study was resolved.
+        '''
+        entry = self.studies[key]
+        if partial is None:
+            entry['failed'].add(page)
+        else:
+            entry['study'].update(partial)
+        entry['pending'].discard(page)
+
+        if entry['pending']:
+            return None
+
+        del self.studies[key]
+        return entry['study'], sorted(entry['failed'])
+
+    def flush(self) -> List[Tuple[EMA_RWD_Study, List[str]]]:
+        '''
+        Removes and returns all unfinished studies with their pending pages.
+        '''
+        unfinished = [
+            (entry['study'], sorted(entry['pending'])) for entry in self.studies.values()
+        ]
+        self.studies.clear()
+        return unfinished
+
+
+def first_value(values: List[str]) -> str:
+    return values[0]
+
+
+def sorted_values(values: List[str]) -> List[str]:
+    return sorted(values)
+
+
+def sorted_labeled_values(values: List[str]) -> List[str]:
+    # NOTE: Every value is preceded by its label
+    return sorted(values[1::2])
+
+
+def int_value(values: List[str]) -> int:
+    return int(values[0])
+
+
+class FieldRule(NamedTuple):
+    '''
+    Maps the label of a dt element to a field, which gets the converted texts of the following dd element.
+    '''
+    label: str
+    field: str
+    converter: Optional[Callable[[List[str]], Any]] = first_value
+    exact: bool = True
+
+
+class FieldsetExtractor:
+    '''
+    Extracts the dt/dd pairs of a fieldset in a single pass with a table of rules.
+    The first matching rule wins. Labels are compared in lower case without surrounding whitespace.
+    '''
+
+    def __init__(self, rules: Iterable[FieldRule]):
+        self.rules = list(rules)
+        self.labels = {}
+
+    def lookup(self, label: str) -> Optional[FieldRule]:
+        '''
+        Returns the first rule matching the label. The results are memoised, because the labels repeat on every page.
+        '''
+        try:
+            return self.labels[label]
+        except KeyError:
+            normalised = label.strip().lower()
+            rule = next((
+                rule for rule in self.rules
+                if (normalised == rule.label if rule.exact else rule.label in normalised)
+            ), None)
+            self.labels[label] = rule
+            return rule
+
+    def extract(self, fieldset: SelectorList, study: EMA_RWD_Study, start: int = 0) -> None:
+        '''
+        Sets the fields of all matching dt/dd pairs of the fieldset, skipping the first start pairs.
+        '''
+        pairs = -1
+        label = None
+        for element in fieldset.xpath('.//dt | .//dd'):
+            node = element.root
+            if node.tag == 'dt':
+                pairs += 1
+                label = ''.join(node.itertext())
+            elif label is not None and pairs >= start and (rule := self.lookup(label)):
+                if values := list(node.itertext()):
+                    study[rule.field] = rule.converter(values)
+                label = None
+
+
 # NOTE: This spider worked the last time at: 2024-02-21T23-20-00 (UTC+1)
 # TODO: Update / Fix this to work with the current website
 # NOTE: This Spider is unnecessary because of the native export capability of the new website.
@@ -45,7 +161,10 @@ class EMA_RWD_Spider(spiders.Spider):
         'PROGRESS_LOGGING': False,
         'FILTER_STUDIES': False,
         'SAVE_PDF': False,
-        'SAVE_PROTOCOLS_AND_RESULTS': False
+        'SAVE_PROTOCOLS_AND_RESULTS': False,
+        'INCREMENTAL': False,
+        'PARALLEL_DETAILS': False,
+        'RESUMABLE': False
     }
     # These are the allowed domains. This spider should only follow urls in these domains
     allowed_domains = ['catalogues.ema.europa.eu']
@@ -65,23 +184,98 @@ class EMA_RWD_Spider(spiders.Spider):
     n_studies = 0
     item_class = EMA_RWD_Study
 
+    # These tabs follow the first tab "Administrative Details" of every study
+    detail_pages = ['methodological-aspects', 'data-management']
+
+    # These extractors map the labels of the fieldsets to the fields of the study
+    fieldset_extractors = {
+        'darwin-study-identification': FieldsetExtractor([
+            FieldRule('description', 'description', exact=False),
+            FieldRule('status', 'state', exact=False)
+        ]),
+        'darwin-regulatory': FieldsetExtractor([
+            FieldRule('risk management plan', 'risk_management_plan', exact=False),
+            FieldRule('regulatory procedure number', 'regulatory_procedure_number')
+        ]),
+        'darwin-study-type': FieldsetExtractor([
+            FieldRule('study topic', 'study_topic', sorted_values),
+            FieldRule('study topic, other', 'study_topic_other'),
+            FieldRule('study type', 'study_type'),
+            FieldRule('further details on the study type', 'study_type_other', exact=False)
+        ]),
+        'darwin-non-interventional-study': FieldsetExtractor([
+            # NOTE: This was changed from the old scopes and there is no 'primary_scope' field!
+            # NOTE: There is a new field: Clinical trial regulatory scope
+            FieldRule('scope of the study', 'non_interventional_scopes', sorted_values),
+            FieldRule('further details on the scope of the study', 'non_interventional_scopes_other', exact=False),
+            # NOTE: This was changed from study_design?
+            FieldRule('non-interventional study design', 'non_interventional_study_design', sorted_values),
+            FieldRule('non-interventional study design, other', 'non_interventional_study_design_other')
+        ]),
+        'darwin-study-drug-and-medical-condition': FieldsetExtractor([
+            FieldRule('name of medicine', 'substance_brand_name', sorted_labeled_values),
+            FieldRule('name of medicine, other', 'substance_brand_name_other'),
+            FieldRule('international non-proprietary name', 'substance_inn', sorted_labeled_values, exact=False),
+            FieldRule('anatomical therapeutic chemical', 'substance_atc', sorted_labeled_values, exact=False),
+            FieldRule('medical condition to be studied', 'medical_conditions', sorted_labeled_values),
+            FieldRule('additional medical condition', 'additional_medical_conditions', exact=False)
+        ]),
+        'darwin-population-studied': FieldsetExtractor([
+            # NOTE: This was changed!
+            FieldRule('age groups', 'age_population', sorted_values, exact=False),
+            FieldRule('number of subjects', 'number_of_subjects', int_value, exact=False),
+            # NOTE: This was changed from other_population!
+            FieldRule('special population of interest', 'special_population', sorted_values),
+            FieldRule('special population of interest, other', 'special_population_other')
+        ]),
+        # NOTE: Outcomes instead of primary_outcomes or secondary_outcomes
+        'darwin-study-design-details': FieldsetExtractor([
+            FieldRule('outcomes', 'outcomes')
+        ]),
+        'darwin-data-sources': FieldsetExtractor([
+            # NOTE: There is a space in the website right now
+            FieldRule('data source(s)', 'data_sources_registered_with_encepp', sorted_values),
+            FieldRule('data sources, if not available in the list above', 'data_sources_not_registered_with_encepp'),
+            FieldRule('data sources (types)', 'data_source_types', sorted_values),
+            FieldRule('data sources (types), other', 'data_source_types_other')
+        ])
+    }
+    # The rows of the study timelines only use the field prefix of these rules
+    timeline_extractor = FieldsetExtractor([
+        FieldRule('funding contract', 'funding_contract_date', None, exact=False),
+        FieldRule('data collection', 'data_collection_date', None, exact=False),
+        FieldRule('data analysis', 'data_analysis_date', None, exact=False),
+        FieldRule('interim report', 'iterim_report_date', None, exact=False),
+        FieldRule('final study report', 'final_report_date', None, exact=False)
+    ])
+
     def clean(self, s: str):
         return s.strip()
 
-    def __init__(self, progress_logging=False, filter_studies=False, filter_rmp_category=None, save_pdf=False, save_protocols_and_results=False, *args, **kwargs):
+    def __init__(self, progress_logging=False, filter_studies=False, filter_rmp_category=None, save_pdf=False, save_protocols_and_results=False, incremental=False, parallel_details=False, resumable=False, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.custom_settings.update({
             'PROGRESS_LOGGING': progress_logging,
             'FILTER_STUDIES': filter_studies,
             'SAVE_PDF': save_pdf,
-            'SAVE_PROTOCOLS_AND_RESULTS': save_protocols_and_results
+            'SAVE_PROTOCOLS_AND_RESULTS': save_protocols_and_results,
+            'INCREMENTAL': incremental,
+            'PARALLEL_DETAILS': parallel_details,
+            'RESUMABLE': resumable
         })
         self.rmp_query_val = filter_rmp_category.value if filter_rmp_category else ''
+        self.assembler = StudyAssembler()
 
     @classmethod
     def from_crawler(cls, crawler, *args, **kwargs):
         spider = super().from_crawler(crawler, *args, **kwargs)
         crawler.signals.connect(spider.idle, signals.spider_idle)
+        if spider.custom_settings.get('INCREMENTAL'):
+            spider.state_store = StudyStateStore(
+                crawler.settings.get('INCREMENTAL_STATE_PATH')).load()
+        if spider.custom_settings.get('RESUMABLE'):
+            spider.checkpoint_store = CheckpointStore(
+                crawler.settings.get('RESUMABLE_CHECKPOINT_PATH')).load()
         return spider
 
     def start_requests(self) -> List[http.Request]:
@@ -112,9 +306,10 @@ class EMA_RWD_Spider(spiders.Spider):
             )]
 
     def parse_search(self, response: http.TextResponse, first_page=False) -> Generator[http.Request, None, None]:
+        page = CompiledSelector.from_response(response)
 
         if first_page:
-            self.n_studies = int(response.css(
+            self.n_studies = int(page.css(
                 '.source-summary-count').xpath('./text()').get('(0)')[1:-1])
             self.crawler.stats.set_value('item_expected_count', self.n_studies)
 
@@ -136,20 +331,17 @@ class EMA_RWD_Spider(spiders.Spider):
             if self.n_studies == 0:
                 return
 
-            if last_page_url := response.css('.darwin-list-pages nav li:last-child').xpath('./a/@href').get():
+            if last_page_url := page.css('.darwin-list-pages nav li:last-child').xpath('./a/@href').get():
                 last_page_number = int(
                     self.page_regex.search(last_page_url).group(1)) + 1
                 yield from (http.Request(f'{response.url}&page={i}', callback=self.parse_search) for i in range(1, last_page_number))
 
-        entry_urls = response.css(
+        entry_urls = page.css(
             '.bcl-listing article').xpath('.//a/@href').getall()
         yield from (http.Request(f'{self.base_url}{url}', callback=self.parse) for url in entry_urls)
 
-    def parse_sitemap(self, response: http.XmlResponse, home_page=False) -> Generator[http.Request, None, None]:
-        urls = [
-            entry['loc']
-            for entry in Sitemap(response.body)
-        ]
+    def parse_sitemap(self, response: http.XmlResponse, home_page=False) -> Generator[Union[EMA_RWD_Study, http.Request], None, None]:
+        entries = list(Sitemap(response.body))
         if home_page:
             if self.custom_settings.get('PROGRESS_LOGGING'):
                 self.pbar = tqdm(
@@ -159,12 +351,12 @@ class EMA_RWD_Spider(spiders.Spider):
                     unit='studies',
                     colour='green',
                 )
-            yield from (http.Request(url, callback=self.parse_sitemap) for url in urls)
+            yield from (http.Request(entry['loc'], callback=self.parse_sitemap) for entry in entries)
         else:
-            filtered_urls = [
-                url for url in urls if self.sitemap_regex.search(url)
+            filtered_entries = [
+                entry for entry in entries if self.sitemap_regex.search(entry['loc'])
             ]
-            self.n_studies += len(filtered_urls)
+            self.n_studies += len(filtered_entries)
             self.crawler.stats.set_value('item_expected_count', self.n_studies)
 
             if self.n_studies == 0:
@@ -176,15 +368,102 @@ class EMA_RWD_Spider(spiders.Spider):
             if self.custom_settings.get('PROGRESS_LOGGING'):
                 self.pbar.total = self.n_studies
                 self.pbar.refresh()
-            yield from (http.Request(url, callback=self.parse) for url in filtered_urls)
+
+            for entry in filtered_entries:
+                lastmod = entry.get('lastmod')
+                # NOTE: Unchanged studies are reemitted from the state store of the last run
+                if self.custom_settings.get('INCREMENTAL'):
+                    if stored_item := self.state_store.get_unchanged(entry['loc'], lastmod):
+                        self.crawler.stats.inc_value(
+                            'incremental/reused_item_count')
+                        if self.custom_settings.get('PROGRESS_LOGGING') and isinstance(self.pbar, tqdm):
+                            self.pbar.update()
+                        yield self.item_class(**stored_item)
+                        continue
+                    self.crawler.stats.inc_value(
+                        'incremental/requested_item_count')
+
+                meta = dict(sitemap_loc=entry['loc'], sitemap_lastmod=lastmod)
+                # NOTE: Studies of an interrupted run are resumed from their checkpoints
+                if self.custom_settings.get('RESUMABLE') and (checkpoint := self.checkpoint_store.get(entry['loc'])):
+                    yield from self.resume_study(checkpoint, meta)
+                    continue
+
+                yield http.Request(entry['loc'], callback=self.parse, meta=meta)
+
+    def _follow_meta(self, response: http.Response) -> dict:
+        '''
+        Returns the sitemap meta of a study, which has to be passed on to the requests of the following tabs.
+        '''
+        return {
+            key: response.meta[key]
+            for key in ['sitemap_loc', 'sitemap_lastmod', 'study_key']
+            if key in response.meta
+        }
+
+    def detail_requests(self, study_url: str, pages: Iterable[str], meta: dict) -> Generator[http.Request, None, None]:
+        '''
+        Requests the given detail pages of a study at once. Every page gets its own partial item, which will be merged by the assembler.
+        '''
+        callbacks = dict(zip(self.detail_pages, [
+                         self.parse_method_details, self.parse_data_details]))
+        yield from (
+            http.Request(
+                url=f'{study_url}/{page}',
+                callback=callbacks[page],
+                errback=self.detail_page_failed,
+                cb_kwargs=dict(study=self.item_class(url=study_url)),
+                meta={
+                    **meta,
+                    'detail_page': page,
+                    'download_timeout': self.settings.getint('PARALLEL_DETAILS_DOWNLOAD_TIMEOUT')
+                }
+            )
+            for page in pages
+        )
+
+    def save_checkpoint(self, meta: dict, item: EMA_RWD_Study, page: Optional[str] = None, finished: bool = False) -> None:
+        if self.custom_settings.get('RESUMABLE') and (loc := meta.get('sitemap_loc')) and (key := meta.get('study_key')):
+            self.checkpoint_store.add(loc, key, item, page=page, finished=finished)
+
+    def resume_study(self, checkpoint: dict, meta: dict) -> Generator[Union[EMA_RWD_Study, http.Request], None, None]:
+        '''
+        Reemits a finished study or requests the missing detail pages of a partial study.
+        '''
+        study = self.item_class(**checkpoint['item'])
+        meta = {**meta, 'study_key': checkpoint['key']}
+        if checkpoint['finished']:
+            self.crawler.stats.inc_value('resumable/reused_item_count')
+            if self.custom_settings.get('PROGRESS_LOGGING') and isinstance(self.pbar, tqdm):
+                self.pbar.update()
+            if self.custom_settings.get('INCREMENTAL'):
+                self.state_store.update(
+                    meta['sitemap_loc'], meta.get('sitemap_lastmod'), study)
+            yield study
+            return
+
+        self.crawler.stats.inc_value('resumable/resumed_item_count')
+        missing_pages = [
+            page for page in self.detail_pages if page not in checkpoint['pages']
+        ]
+        if not missing_pages:
+            yield from self.finish_study(study, meta)
+        elif self.custom_settings.get('PARALLEL_DETAILS'):
+            self.assembler.start(study['url'], study, missing_pages)
+            yield from self.detail_requests(study['url'], missing_pages, meta)
+        elif missing_pages[0] == 'methodological-aspects':
+            yield http.Request(url=f'{study["url"]}/methodological-aspects', callback=self.parse_method_details, cb_kwargs=dict(study=study), meta=meta)
+        else:
+            yield http.Request(url=f'{study["url"]}/data-management', callback=self.parse_data_details, cb_kwargs=dict(study=study), meta=meta)
 
     def parse(self, response: http.TextResponse) -> Generator[http.Request, None, None]:
 
+        page = CompiledSelector.from_response(response)
         study = EMA_RWD_Study()
         # NOTE: Can contain <br>; Maybe better to extract from study identification
-        study['title'] = ''.join(response.xpath('.//h1//text()').getall())
+        study['title'] = ''.join(page.xpath('.//h1//text()').getall())
 
-        content = response.css('.content-banner-content-wrapper')
+        content = page.css('.content-banner-content-wrapper')
         dates = content.css('.dates')
         study['registration_date'] = self.clean(
             dates.xpath('./div[1]//span/text()').get())
@@ -192,28 +471,44 @@ class EMA_RWD_Spider(spiders.Spider):
             dates.xpath('./div[2]//span/text()').get())
 
         study['url'] = '/'.join(response.url.split('/')[:-1])
-        study['pdf_url'] = f'{self.base_url}{response.css(".bcl-card-link-set").xpath("./a/@href").get()}'
-        if self.custom_settings.get('SAVE_PDF'):
-            yield http.Request(url=study['pdf_url'], callback=self.save_pdf, cb_kwargs=dict(study=study), meta=dict(download_timeout=180))
+        # NOTE: The DocumentDownloadPipeline saves the PDF and the documents of the study
+        study['pdf_url'] = f'{self.base_url}{page.css(".bcl-card-link-set").xpath("./a/@href").get()}'
 
         self.parse_admin_details(response=response, study=study)
-        yield http.Request(url=f'{study["url"]}/methodological-aspects', callback=self.parse_method_details, cb_kwargs=dict(study=study))
 
-    def save_pdf(self, response: http.Response, study: EMA_RWD_Study, suffix='') -> None:
-        file_path = Path(f"{self.settings.get('OUTPUT_DIRECTORY')}/PDFs/")
-        file_path.mkdir(parents=True, exist_ok=True)
-        pdf_file = file_path / f"{study['eu_pas_register_number']}{suffix}.pdf"
-        pdf_file.write_bytes(response.body)
+        meta = {**self._follow_meta(response),
+                'study_key': study.get('eu_pas_register_number')}
+        self.save_checkpoint(meta, study, page='administrative-details')
+
+        if self.custom_settings.get('PARALLEL_DETAILS'):
+            self.assembler.start(study['url'], study, self.detail_pages)
+            yield from self.detail_requests(study['url'], self.detail_pages, meta)
+        else:
+            yield http.Request(url=f'{study["url"]}/methodological-aspects', callback=self.parse_method_details, cb_kwargs=dict(study=study), meta=meta)
+
+    def get_fieldsets(self, response: http.TextResponse) -> Dict[str, SelectorList]:
+        '''
+        Returns the content of all fieldsets of a detail page by their ids.
+        '''
+        return {
+            fieldset.attrib.get('id'): fieldset.css('.fieldset-wrapper')
+            for fieldset in CompiledSelector.from_response(response).css('fieldset')
+        }
+
+    def extract_fieldsets(self, fieldsets: Dict[str, SelectorList], study: EMA_RWD_Study, *fieldset_ids: str) -> None:
+        for fieldset_id in fieldset_ids:
+            if fieldset := fieldsets.get(fieldset_id):
+                self.fieldset_extractors[fieldset_id].extract(fieldset, study)
 
     def parse_admin_details(self, response: http.TextResponse, study: EMA_RWD_Study) -> None:
         '''
         Parses the details of the first tab: "Administrative Details"
         '''
 
-        fieldsets = response.css('fieldset')
+        fieldsets = self.get_fieldsets(response)
 
         # Study identification
-        if study_identification := fieldsets.css('#darwin-study-identification .fieldset-wrapper'):
+        if study_identification := fieldsets.get('darwin-study-identification'):
             study['puri'] = study_identification.xpath(
                 './/dd')[0].xpath('.//text()').get()
             study['eu_pas_register_number'] = study_identification.xpath(
@@ -223,19 +518,12 @@ class EMA_RWD_Spider(spiders.Spider):
                 './/dd')[3].xpath('.//text()').get()
             study['countries'] = sorted(study_identification.xpath(
                 './/dd')[5].xpath('.//text()').getall())
-            table = zip(study_identification.xpath('.//dt//text()').getall()[6:],
-                        study_identification.xpath('.//dd//text()').getall()[6:])
-            table = zip(study_identification.xpath('.//dt//text()').getall()[6:],
-                        [entry.xpath('.//text()').get() for entry in study_identification.xpath('.//dd')[6:]])
-            for [name, value] in table:
-                if 'description' in name.lower():
-                    study['description'] = value
-                if 'status' in name.lower():
-                    study['state'] = value
+            self.fieldset_extractors['darwin-study-identification'].extract(
+                study_identification, study, start=6)
 
         # Research institution and networks
         # NOTE: Centres got major changes on the new website
-        if institutions_and_networks := fieldsets.css('#darwin-research-institution-and-networks .fieldset-wrapper'):
+        if institutions_and_networks := fieldsets.get('darwin-research-institution-and-networks'):
 
             if lead_org := institutions_and_networks.css('*[class$="lead-organisation"]'):
                 study['lead_institution_encepp'] = \
@@ -263,7 +551,7 @@ class EMA_RWD_Spider(spiders.Spider):
                     additional_networks.xpath('./text()').get()
 
         # Study timelines
-        if study_timelines := fieldsets.css('#darwin-study-timelines .fieldset-wrapper'):
+        if study_timelines := fieldsets.get('darwin-study-timelines'):
             date_table_rows = [
                 [
                     [
@@ -283,17 +571,9 @@ class EMA_RWD_Spider(spiders.Spider):
                     elif 'actual' in date_label.lower():
                         actual = date
 
-                field_name = None
-                if 'funding contract' in name.lower():
-                    field_name = 'funding_contract_date'
-                elif 'data collection' in name.lower():
-                    field_name = 'data_collection_date'
-                elif 'data analysis' in name.lower():
-                    field_name = 'data_analysis_date'
-                elif 'interim report' in name.lower():
-                    field_name = 'iterim_report_date'
-                elif 'final study report' in name.lower():
-                    field_name = 'final_report_date'
+                if (rule := self.timeline_extractor.lookup(name)) is None:
+                    continue
+                field_name = rule.field
 
                 if planned:
                     study[f'{field_name}_planed'] = planned
@@ -303,7 +583,7 @@ class EMA_RWD_Spider(spiders.Spider):
 
         # Sources of funding
         # NOTE: Funding got major changes on the new website; No percentages
-        if funding := fieldsets.css('#darwin-sources-of-funding .fieldset-wrapper'):
+        if funding := fieldsets.get('darwin-sources-of-funding'):
 
             if sources := funding.xpath('./div[1]'):
                 study['funding_sources'] = sorted(
@@ -313,22 +593,17 @@ class EMA_RWD_Spider(spiders.Spider):
                 study['funding_details'] = details.xpath('./div/text()').get()
 
         # Study protocol
-        if study_protocol := fieldsets.css('#darwin-study-protocol .fieldset-wrapper'):
+        if study_protocol := fieldsets.get('darwin-study-protocol'):
             # NOTE: Merged latest and normal protocol? No option to hide protocol?
             study['protocol_document_url'] = \
                 study_protocol.xpath('.//a/@href').get()
 
         # Regulatory
-        if regulatory := fieldsets.css('#darwin-regulatory .fieldset-wrapper'):
-            values = regulatory.xpath('.//dd//text()').getall()
-            study['requested_by_regulator'] = values[0]
-            table = zip(regulatory.xpath('.//dt//text()')[1:].getall(),
-                        values[1:])
-            for [name, value] in table:
-                if 'risk management plan' in name.lower():
-                    study['risk_management_plan'] = value
-                elif name.lower() == 'regulatory procedure number':
-                    study['regulatory_procedure_number'] = value
+        if regulatory := fieldsets.get('darwin-regulatory'):
+            study['requested_by_regulator'] = regulatory.xpath(
+                './/dd//text()').get()
+            self.fieldset_extractors['darwin-regulatory'].extract(
+                regulatory, study, start=1)
 
         # NOTE: acronym merged with title
         # NOTE: country_type was removed
@@ -339,89 +614,21 @@ class EMA_RWD_Spider(spiders.Spider):
         Parses the details of the second tab: "Methodological Aspects"
         '''
 
-        fieldsets = response.css('fieldset')
-
-        # Study type
-        # NOTE: This was changed from the old type!
-        if study_type := fieldsets.css('#darwin-study-type .fieldset-wrapper'):
-            table = zip(study_type.xpath('.//dt//text()').getall(),
-                        [entry.xpath('.//text()').getall() for entry in study_type.xpath('.//dd')])
-            for [name, values] in table:
-                first_value = values[0]
-                if name.lower() == 'study topic':
-                    study['study_topic'] = sorted(values)
-                elif name.lower() == 'study topic, other':
-                    study['study_topic_other'] = first_value
-                elif name.lower() == 'study type':
-                    study['study_type'] = first_value
-                elif 'further details on the study type' in name.lower():
-                    study['study_type_other'] = first_value
-
-        # Non-interventional study
-        if non_interventional_study := fieldsets.css('#darwin-non-interventional-study .fieldset-wrapper'):
-            table = zip(non_interventional_study.xpath('.//dt//text()').getall(),
-                        [entry.xpath('.//text()').getall() for entry in non_interventional_study.xpath('.//dd')])
-            for [name, values] in table:
-                first_value = values[0]
-                if name.lower() == 'scope of the study':
-                    # NOTE: This was changed from the old scopes and there is no 'primary_scope' field!
-                    # NOTE: There is a new field: Clinical trial regulatory scope
-                    study['non_interventional_scopes'] = sorted(values)
-                elif 'further details on the scope of the study' in name.lower():
-                    study['non_interventional_scopes_other'] = first_value
-                elif name.lower() == 'non-interventional study design':
-                    # NOTE: This was changed from study_design?
-                    study['non_interventional_study_design'] = sorted(values)
-                elif name.lower() == 'non-interventional study design, other':
-                    study['non_interventional_study_design_other'] = first_value
-
-        # Study drug and medical condition
-        if drugs_and_conditions := fieldsets.css('#darwin-study-drug-and-medical-condition .fieldset-wrapper'):
-            table = zip(drugs_and_conditions.xpath('.//dt//text()').getall(),
-                        [entry.xpath('.//text()').getall() for entry in drugs_and_conditions.xpath('.//dd')])
-            for [name, values] in table:
-                first_value = values[0]
-                if name.lower() == 'name of medicine':
-                    study['substance_brand_name'] = sorted(list(values[1::2]))
-                elif name.lower() == 'name of medicine, other':
-                    study['substance_brand_name_other'] = first_value
-                elif 'international non-proprietary name' in name.lower():
-                    study['substance_inn'] = sorted(list(values[1::2]))
-                elif 'anatomical therapeutic chemical' in name.lower():
-                    study['substance_atc'] = sorted(list(values[1::2]))
-                elif name.lower() == 'medical condition to be studied':
-                    study['medical_conditions'] = sorted(list(values[1::2]))
-                elif 'additional medical condition' in name.lower():
-                    study['additional_medical_conditions'] = first_value
-
-        # Population studied
-        if population_studied := fieldsets.css('#darwin-population-studied .fieldset-wrapper'):
-            table = zip(population_studied.xpath('.//dt//text()').getall(),
-                        [entry.xpath('.//text()').getall() for entry in population_studied.xpath('.//dd')])
-            for [name, values] in table:
-                first_value = values[0]
-                if 'age groups' in name.lower():
-                    # NOTE: This was changed!
-                    study['age_population'] = sorted(values)
-                elif 'number of subjects' in name.lower():
-                    study['number_of_subjects'] = int(first_value)
-                elif name.lower() == 'special population of interest':
-                    # NOTE: This was changed from other_population!
-                    study['special_population'] = sorted(values)
-                elif name.lower() == 'special population of interest, other':
-                    study['special_population_other'] = first_value
-
-        # Study design details
-        # NOTE: Outcomes instead of primary_outcomes or secondary_outcomes
-        if study_design_details := fieldsets.css('#darwin-study-design-details .fieldset-wrapper'):
-            table = zip(study_design_details.xpath('.//dt//text()').getall(),
-                        study_design_details.xpath('.//dd//text()').getall())
-            for [name, value] in table:
-                if name.lower() == 'outcomes':
-                    study['outcomes'] = value
+        fieldsets = self.get_fieldsets(response)
+
+        # Study type, Non-interventional study, Study drug and medical condition, Population studied and Study design details
+        self.extract_fieldsets(
+            fieldsets,
+            study,
+            'darwin-study-type',
+            'darwin-non-interventional-study',
+            'darwin-study-drug-and-medical-condition',
+            'darwin-population-studied',
+            'darwin-study-design-details'
+        )
 
         # Documents
-        if documents := fieldsets.css('#darwin-documents .fieldset-wrapper'):
+        if documents := fieldsets.get('darwin-documents'):
             if result_tables := documents.css('*[class$="result-tables"]'):
                 study['result_tables_url'] = \
                     result_tables.xpath('./div[2]//a/@href').get()
@@ -441,56 +648,89 @@ class EMA_RWD_Spider(spiders.Spider):
         # NOTE: follow_up was removed
         # NOTE: sex_population was removed
         # NOTE: uses_established_data_source was removed
-        yield http.Request(url=f'{study["url"]}/data-management', callback=self.parse_data_details, cb_kwargs=dict(study=study))
+        if self.custom_settings.get('PARALLEL_DETAILS'):
+            yield from self.assemble(study['url'], response.meta, study)
+        else:
+            self.save_checkpoint(response.meta, study,
+                                 page='methodological-aspects')
+            yield http.Request(url=f'{study["url"]}/data-management', callback=self.parse_data_details, cb_kwargs=dict(study=study), meta=self._follow_meta(response))
 
     def parse_data_details(self, response: http.TextResponse, study: EMA_RWD_Study) -> Generator[Union[EMA_RWD_Study, http.Request], None, None]:
         '''
         Parses the details of the third tab: "Data managment"
         '''
 
-        if self.custom_settings.get('PROGRESS_LOGGING') and isinstance(self.pbar, tqdm):
-            self.pbar.update()
-
-        fieldsets = response.css('fieldset')
+        fieldsets = self.get_fieldsets(response)
 
         # Data sources
-        if data_sources := fieldsets.css('#darwin-data-sources .fieldset-wrapper'):
-            table = zip(data_sources.xpath('.//dt//text()').getall(),
-                        [entry.xpath('.//text()').getall() for entry in data_sources.xpath('.//dd')])
-            for [name, values] in table:
-                first_value = values[0]
-                # NOTE: There is a space in the website right now
-                if name.lower().strip() == 'data source(s)':
-                    study['data_sources_registered_with_encepp'] = sorted(
-                        values)
-                elif name.lower() == 'data sources, if not available in the list above':
-                    study['data_sources_not_registered_with_encepp'] = first_value
-                elif name.lower() == 'data sources (types)':
-                    study['data_source_types'] = sorted(values)
-                elif name.lower() == 'data sources (types), other':
-                    study['data_source_types_other'] = first_value
+        self.extract_fieldsets(fieldsets, study, 'darwin-data-sources')
 
         # Data quality specifications
-        if data_sources := fieldsets.css('#darwin-data-quality-specifications .fieldset-wrapper'):
+        if data_sources := fieldsets.get('darwin-data-quality-specifications'):
             study['check_conformance'], study['check_completeness'], study['check_stability'], study['check_logical_consistency'] = \
                 data_sources.xpath('.//dd//text()').getall()
 
         # Data characterisation
-        if data_characterisation := fieldsets.css('#darwin-data-characterisation .fieldset-wrapper'):
+        if data_characterisation := fieldsets.get('darwin-data-characterisation'):
             study['conducted_data_characterisation'] = \
                 data_characterisation.xpath('.//dd//text()').get()
 
-        if self.custom_settings.get('SAVE_PROTOCOLS_AND_RESULTS'):
-            if protocol_url := study.get('protocol_document_url'):
-                yield http.Request(url=protocol_url, callback=self.save_pdf, cb_kwargs=dict(study=study, suffix='_latest_protocols'), meta=dict(download_timeout=60))
-            if result_tables := study.get('result_tables_url'):
-                yield http.Request(url=result_tables, callback=self.save_pdf, cb_kwargs=dict(study=study, suffix='_latest_result_tables'), meta=dict(download_timeout=60))
-            if result_url := study.get('result_document_url'):
-                yield http.Request(url=result_url, callback=self.save_pdf, cb_kwargs=dict(study=study, suffix='_latest_results'), meta=dict(download_timeout=60))
+        if self.custom_settings.get('PARALLEL_DETAILS'):
+            yield from self.assemble(study['url'], response.meta, study)
+        else:
+            yield from self.finish_study(study, response.meta)
+
+    def assemble(self, key: str, meta: dict, partial: Optional[EMA_RWD_Study] = None) -> Generator[Union[EMA_RWD_Study, http.Request], None, None]:
+        '''
+        Passes the partial item of a detail page to the assembler and finishes the study after its last page.
+        The partial item is None, if the request of the detail page failed.
+        '''
+        if partial is not None:
+            self.save_checkpoint(meta, partial, page=meta['detail_page'])
+
+        if (result := self.assembler.resolve(key, meta['detail_page'], partial)) is None:
+            return
+
+        assembled_study, failed_pages = result
+        if failed_pages:
+            self.crawler.stats.inc_value('assembler/dropped_study_count')
+            self.logger.error(
+                'Dropped study %s, because the following pages failed: %s', assembled_study['url'], ', '.join(failed_pages))
+            return
+
+        yield from self.finish_study(assembled_study, meta)
+
+    def detail_page_failed(self, failure: Failure) -> Generator[Union[EMA_RWD_Study, http.Request], None, None]:
+        '''
+        Handles timeouts and other failures of the detail pages requested in parallel.
+        '''
+        request = failure.request
+        self.crawler.stats.inc_value('assembler/failed_page_count')
+        self.logger.warning('Failed to request %s: %r',
+                            request.url, failure.value)
+        yield from self.assemble(request.cb_kwargs['study']['url'], request.meta)
+
+    def finish_study(self, study: EMA_RWD_Study, meta: dict) -> Generator[Union[EMA_RWD_Study, http.Request], None, None]:
+        '''
+        Emits a completely parsed study.
+        '''
+        if self.custom_settings.get('PROGRESS_LOGGING') and isinstance(self.pbar, tqdm):
+            self.pbar.update()
 
+        if self.custom_settings.get('INCREMENTAL') and (sitemap_loc := meta.get('sitemap_loc')):
+            self.state_store.update(
+                sitemap_loc, meta.get('sitemap_lastmod'), study)
+
+        self.save_checkpoint(meta, study, finished=True)
         yield study
 
     def idle(self):
+        # NOTE: Studies can't be finished anymore, if requests of their detail pages were filtered
+        for study, pending_pages in self.assembler.flush():
+            self.crawler.stats.inc_value('assembler/unfinished_study_count')
+            self.logger.error(
+                'Dropped unfinished study %s with the following pending pages: %s', study['url'], ', '.join(pending_pages))
+
         if self.custom_settings.get('PROGRESS_LOGGING') and isinstance(self.pbar, tqdm):
             self.pbar.close()
 
@@ -502,5 +742,16 @@ class EMA_RWD_Spider(spiders.Spider):
         else:
             self.logger.info(f'Scraping finished with reason: {reason}')
 
+        if self.custom_settings.get('INCREMENTAL'):
+            # NOTE: Only a finished run has seen all studies of the sitemap
+            self.state_store.save(prune=reason == 'finished')
+
+        if self.custom_settings.get('RESUMABLE'):
+            # NOTE: The checkpoints are kept to resume an interrupted run
+            if reason == 'finished':
+                self.checkpoint_store.clear()
+            else:
+                self.checkpoint_store.close()
+
         self.logger.info(
             f'Extraction finished in {self.crawler.stats.get_value("elapsed_time_seconds")} seconds.')
@@ -8,11 +8,11 @@ from scrapy import spiders, http, selector, signals
 from tqdm import tqdm
 
 from enum import Enum
-from pathlib import Path
 import re
 from typing import List, Generator, Union, Tuple
 
 from eupas.items import EU_PAS_Study
+from eupas.selectors import CompiledSelector
 
 
 class RMP(Enum):
@@ -40,7 +40,6 @@ class EU_PAS_Spider(spiders.Spider):
     custom_settings = {
         'PROGRESS_LOGGING': False,
         'FILTER_STUDIES': False,
-        'SAVE_PDF': False,
         'SAVE_PROTOCOLS_AND_RESULTS': False
     }
     # These are the allowed domains. This spider should only follow urls in these domains
@@ -49,7 +48,6 @@ class EU_PAS_Spider(spiders.Spider):
     # URLS and headers
     base_url = 'https://www.encepp.eu'
     query_url = f'{base_url}/encepp/studySearch.htm'
-    pdf_base_url = f'{base_url}//encepp/enceppPrint.pdf?screen=search'
 
     # NOTE: Only the Content-Type is important for the POST request
     query_headers = {
@@ -71,12 +69,11 @@ class EU_PAS_Spider(spiders.Spider):
     session_regex = re.compile(r'jsessionid=.+\?')
     item_class = EU_PAS_Study
 
-    def __init__(self, progress_logging=False, filter_studies=False, filter_rmp_category=None, filter_eupas_id=None, save_pdf=False, save_protocols_and_results=False, *args, **kwargs):
+    def __init__(self, progress_logging=False, filter_studies=False, filter_rmp_category=None, filter_eupas_id=None, save_protocols_and_results=False, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.custom_settings.update({
             'PROGRESS_LOGGING': progress_logging,
             'FILTER_STUDIES': filter_studies,
-            'SAVE_PDF': save_pdf,
             'SAVE_PROTOCOLS_AND_RESULTS': save_protocols_and_results
         })
         self.rmp_query_val = filter_rmp_category.value if filter_rmp_category else ''
@@ -121,7 +118,8 @@ class EU_PAS_Spider(spiders.Spider):
         @returns items 0 0
         '''
 
-        main_content = response.css('div.insidecentre')[0]
+        main_content = CompiledSelector.from_response(
+            response).css('div.insidecentre')[0]
         n_studies = int(main_content.xpath(
             './/h5/text()').get('0 Studies').split()[0])
         self.crawler.stats.set_value('item_expected_count', n_studies)
@@ -166,9 +164,8 @@ class EU_PAS_Spider(spiders.Spider):
             url=url,
             callback=self.parse_details,
             meta={
-                'dont_merge_cookies': not self.custom_settings.get('SAVE_PDF'),
-                'eupas_id': eupas_id,
-                'cookiejar': eupas_id
+                'dont_merge_cookies': True,
+                'eupas_id': eupas_id
             },
             cb_kwargs=dict(study=study)
         )
@@ -184,36 +181,22 @@ class EU_PAS_Spider(spiders.Spider):
         if self.custom_settings.get('PROGRESS_LOGGING') and isinstance(self.pbar, tqdm):
             self.pbar.update()
 
-        study['registration_date'] = response.css(
+        page = CompiledSelector.from_response(response)
+        study['registration_date'] = page.css(
             'div.insidecentre')[0].xpath('./div[2]/span[3]/text()[normalize-space()]').get().strip()
 
-        if self.custom_settings.get('SAVE_PDF'):
-            pdf_url = f"{self.pdf_base_url}&&lastU={study['update_date']}&createdOn={study['registration_date']}"
-            yield http.Request(url=pdf_url, callback=self.save_pdf, dont_filter=True, cb_kwargs=dict(study=study), meta={'cookiejar': response.meta['cookiejar']})
-
-        self.parse_admin_details(details=response.xpath(
-            './/*[@id="1"]')[0], study=study)
-        self.parse_target_details(details=response.xpath(
-            './/*[@id="2"]')[0], study=study)
-        self.parse_method_details(details=response.xpath(
-            './/*[@id="3"]')[0], study=study)
-        protocol_url, result_url = self.parse_document_details(
-            details=response.xpath('.//*[@id="4"]')[0], study=study)
-
-        if self.custom_settings.get('SAVE_PROTOCOLS_AND_RESULTS'):
-            if protocol_url:
-                yield http.Request(url=f'{self.base_url}{protocol_url}', callback=self.save_pdf, cb_kwargs=dict(study=study, suffix='_latest_protocols'))
-            if result_url:
-                yield http.Request(url=f'{self.base_url}{result_url}', callback=self.save_pdf, cb_kwargs=dict(study=study, suffix='_latest_results'))
+        self.parse_admin_details(details=page.xpath(
+            './/*[@id=$id]', id='1')[0], study=study)
+        self.parse_target_details(details=page.xpath(
+            './/*[@id=$id]', id='2')[0], study=study)
+        self.parse_method_details(details=page.xpath(
+            './/*[@id=$id]', id='3')[0], study=study)
+        # NOTE: The latest protocols and results are downloaded by the DocumentDownloadPipeline
+        self.parse_document_details(
+            details=page.xpath('.//*[@id=$id]', id='4')[0], study=study)
 
         yield study
 
-    def save_pdf(self, response: http.Response, study: EU_PAS_Study, suffix='') -> None:
-        file_path = Path(f"{self.settings.get('OUTPUT_DIRECTORY')}/PDFs/")
-        file_path.mkdir(parents=True, exist_ok=True)
-        pdf_file = file_path / f"{study['eu_pas_register_number']}{suffix}.pdf"
-        pdf_file.write_bytes(response.body)
-
     def _get_block_from_details(
         self,
         details: selector.Selector,
@@ -224,7 +207,9 @@ class EU_PAS_Spider(spiders.Spider):
         '''
         Returns a SelectorList only containing block_elements, by finding blocks of block_elements following a single seperator_element.
         '''
-        return details.xpath(f'./{block_element}[count(preceding-sibling::{seperator_element}/following-sibling::{block_element}[1]) = {index}]')
+        # NOTE: The index is passed as XPath variable, so the expression is only compiled once per element combination
+        return details.xpath(
+            f'./{block_element}[count(preceding-sibling::{seperator_element}/following-sibling::{block_element}[1]) = $index]', index=index)
 
     def _get_multiblock_from_details(
         self,
@@ -241,9 +226,9 @@ class EU_PAS_Spider(spiders.Spider):
         Then it generates smaller blocks by cutting it in chunks using filter_element and python slices.
         '''
         block = details.xpath(
-            f'./*[self::{block_element} or self::{filter_element}][count(preceding-sibling::{seperator_element}/following-sibling::*[not(self::{seperator_element})][1]) = {index}]')
+            f'./*[self::{block_element} or self::{filter_element}][count(preceding-sibling::{seperator_element}/following-sibling::*[not(self::{seperator_element})][1]) = $index]', index=index)
         boundary = [i for i, element in enumerate(
-            block) if element.xpath(f'./self::{filter_element}')] + [len(block)]
+            block) if element.root.tag == filter_element] + [len(block)]
 
         start = offset if offset == 0 else boundary[offset - 1] + 1
         for end in boundary[offset::every_nth]:
@@ -0,0 +1,527 @@
+# NOT DEFAULT
+# Define your persistent stores here
+#
+# Stores keep the state of the spiders and extensions between runs.
+
+import codecs
+from functools import cached_property
+import hashlib
+import json
+import os
+from pathlib import Path
+import re
+import shutil
+import sqlite3
+import sys
+from typing import Dict, NamedTuple
+
+from scrapy.utils.serialize import ScrapyJSONEncoder
+
+# NOTE: Separators between the objects of a JSON array or JSON lines file
+JSON_SEPARATOR_REGEX = re.compile(r'[\s,\[\]]*')
+
+CANONICAL_ENCODER = ScrapyJSONEncoder(
+    sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+
+
+def canonical_json(value):
+    '''
+    Returns the JSON of a value with sorted keys and without whitespace, so equal values always have the same JSON.
+    '''
+    return CANONICAL_ENCODER.encode(value)
+
+
+def field_digests(record):
+    return {
+        sys.intern(name): hashlib.blake2b(canonical_json(value).encode('utf-8'), digest_size=8).digest()
+        for name, value in record.items()
+    }
+
+
+def record_digest(digests):
+    '''
+    Returns the digest of a whole record from the digests of its fields, which doesn't depend on the order of the fields.
+    '''
+    record_hash = hashlib.blake2b(digest_size=16)
+    for name in sorted(digests):
+        record_hash.update(name.encode('utf-8'))
+        record_hash.update(digests[name])
+    return record_hash.digest()
+
+
+def iter_json_records(path, chunk_size=1 << 20):
+    '''
+    Streams the objects of a JSON array or JSON lines file.
+    '''
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    position = 0
+    eof = False
+    with open(path, 'rb') as f:
+        while True:
+            position = JSON_SEPARATOR_REGEX.match(buffer, position).end()
+            try:
+                if position == len(buffer):
+                    raise json.JSONDecodeError('Empty buffer', buffer, position)
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    if position == len(buffer):
+                        return
+                    raise
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[position:] + utf8.decode(chunk, final=eof)
+                position = 0
+                continue
+            yield record
+            position = end
+
+
+class StudyStateStore:
+    '''
+    A JSON store of the last seen sitemap lastmod and the raw item of every study keyed by the sitemap url.
+    '''
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.states = {}
+        self.seen = set()
+
+    def load(self):
+        if self.path.is_file():
+            with self.path.open('r', encoding='UTF-8') as f:
+                self.states = json.load(f)
+        return self
+
+    def get_unchanged(self, url, lastmod):
+        '''
+        Returns the stored raw item of a study, if the lastmod of the study didn't change since the last run.
+        '''
+        self.seen.add(url)
+        state = self.states.get(url)
+        if lastmod and state and state['lastmod'] == lastmod:
+            return state['item']
+        return None
+
+    def update(self, url, lastmod, item):
+        self.seen.add(url)
+        self.states[url] = {
+            'lastmod': lastmod,
+            'item': dict(item)
+        }
+
+    def save(self, prune=False):
+        '''
+        Saves all states. Studies which weren't seen in this run will be removed, if prune is True.
+        '''
+        if prune:
+            self.states = {
+                url: state for url, state in self.states.items() if url in self.seen
+            }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open('w', encoding='UTF-8') as f:
+            json.dump(self.states, f, sort_keys=True)
+
+
+class CheckpointStore:
+    '''
+    An append-only JSON lines store of the partially assembled and finished studies of a crawl keyed by the EU PAS register number.
+    Every record is flushed immediately, so a killed crawl only loses the pages of its requests in progress.
+    '''
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.studies = {}
+        self.keys = {}
+        self.file = None
+
+    def load(self):
+        if self.path.is_file():
+            size = 0
+            with self.path.open('rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        # NOTE: The last line is incomplete, if the crawl was killed while writing it
+                        break
+                    size += len(line)
+                    try:
+                        record = json.loads(line)
+                    except (json.JSONDecodeError, UnicodeDecodeError):
+                        # NOTE: A corrupted line only loses its own record
+                        continue
+                    self._apply(record)
+            if size < self.path.stat().st_size:
+                # NOTE: The incomplete line is cut off, so the next record isn't appended to it
+                with self.path.open('r+b') as f:
+                    f.truncate(size)
+        return self
+
+    def _apply(self, record):
+        checkpoint = self.studies.setdefault(record['key'], {
+            'key': record['key'],
+            'loc': record['loc'],
+            'pages': [],
+            'item': {},
+            'finished': False
+        })
+        checkpoint['item'].update(record['item'])
+        if record['page'] and record['page'] not in checkpoint['pages']:
+            checkpoint['pages'].append(record['page'])
+        checkpoint['finished'] = checkpoint['finished'] or record['finished']
+        self.keys[record['loc']] = record['key']
+
+    def get(self, loc):
+        '''
+        Returns the checkpoint of the study with the given sitemap url or None, if the study wasn't started yet.
+        '''
+        if (key := self.keys.get(loc)) is None:
+            return None
+        return self.studies[key]
+
+    def add(self, loc, key, item, page=None, finished=False):
+        '''
+        Appends the (partial) item of a parsed page or the finished item of a study.
+        '''
+        record = {
+            'key': key,
+            'loc': loc,
+            'page': page,
+            'finished': finished,
+            'item': dict(item)
+        }
+        if self.file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.file = self.path.open('a', encoding='UTF-8')
+        self.file.write(json.dumps(record, sort_keys=True) + '\n')
+        self.file.flush()
+        self._apply(record)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def clear(self):
+        '''
+        Removes all checkpoints after a finished crawl.
+        '''
+        self.close()
+        self.path.unlink(missing_ok=True)
+        self.studies.clear()
+        self.keys.clear()
+
+
+class DocumentStore:
+    '''
+    A content-addressed store of downloaded documents shared between runs.
+    The blobs are stored once by their sha256 and a manifest keeps the url, sha256, size, ETag and Last-Modified of the documents of every study.
+    The folders of the runs only contain hardlinks to the blobs.
+    '''
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.manifest_path = self.path / 'manifest.json'
+        self.blobs_path = self.path / 'blobs'
+        self.temp_path = self.path / 'tmp'
+        self.manifests = {}
+
+    def load(self):
+        if self.manifest_path.is_file():
+            with self.manifest_path.open('r', encoding='UTF-8') as f:
+                self.manifests = json.load(f)
+        self.temp_path.mkdir(parents=True, exist_ok=True)
+        return self
+
+    def get(self, key, name, url):
+        '''
+        Returns the manifest entry of a document of a study or None, if the document wasn't stored with this url yet.
+        '''
+        entry = self.manifests.get(key, {}).get(name)
+        if entry and entry['url'] == url and self.blob_path(entry['sha256']).is_file():
+            return entry
+        return None
+
+    def blob_path(self, digest):
+        return self.blobs_path / digest[:2] / digest
+
+    def add(self, path, digest):
+        '''
+        Moves a downloaded file into the store. Returns False, if the store already contained the same content.
+        '''
+        blob_path = self.blob_path(digest)
+        if blob_path.is_file():
+            path.unlink()
+            return False
+        blob_path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(path, blob_path)
+        return True
+
+    def update(self, key, name, entry):
+        self.manifests.setdefault(key, {})[name] = entry
+
+    def link(self, digest, path):
+        '''
+        Links a blob to the given path. The blob is copied, if the path is on another file system.
+        '''
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.unlink(missing_ok=True)
+        try:
+            os.link(self.blob_path(digest), path)
+        except OSError:
+            shutil.copyfile(self.blob_path(digest), path)
+
+    def save(self):
+        # NOTE: The manifest is replaced at once, so an interrupted run keeps the old manifest
+        self.path.mkdir(parents=True, exist_ok=True)
+        temp_manifest_path = self.manifest_path.with_suffix('.json.part')
+        with temp_manifest_path.open('w', encoding='UTF-8') as f:
+            json.dump(self.manifests, f, sort_keys=True, indent=1)
+        os.replace(temp_manifest_path, self.manifest_path)
+
+
+class SnapshotEntry(NamedTuple):
+    '''
+    The digest of a record in a snapshot file and the digests of its fields.
+    '''
+    digest: bytes
+    field_digests: Dict[str, bytes]
+
+
+class SnapshotIndex:
+    '''
+    A compact index of a JSON array or JSON lines snapshot of studies keyed by the register number.
+    Every study only keeps the digests of its fields instead of the full record.
+    '''
+
+    def __init__(self, path, key='eu_pas_register_number'):
+        self.path = Path(path) if path else None
+        self.key = key
+        self.entries = {}
+
+    def load(self):
+        if self.path and self.path.is_file():
+            for record in iter_json_records(self.path):
+                digests = field_digests(record)
+                self.entries.setdefault(record.get(self.key), []).append(
+                    SnapshotEntry(record_digest(digests), digests))
+        return self
+
+    def get(self, key):
+        '''
+        Returns the entries of all studies with the given key.
+        '''
+        return self.entries.get(key, [])
+
+
+class UpdateJournal:
+    '''
+    An append-only JSON lines journal of change records, which are written as they occur.
+    The journal is compacted into a sorted JSON array at the given path at the end of a crawl.
+    '''
+
+    def __init__(self, path, sort_key=None):
+        self.path = Path(path)
+        self.journal_path = self.path.with_suffix('.jsonl')
+        self.sort_key = sort_key
+        self.file = None
+        self.count = 0
+
+    def append(self, record):
+        if self.file is None:
+            self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            self.file = self.journal_path.open('w', encoding='UTF-8')
+        self.file.write(json.dumps(record, sort_keys=True) + '\n')
+        self.file.flush()
+        self.count += 1
+
+    def read(self):
+        '''
+        Returns the records in the order of the sort key.
+        '''
+        if not self.journal_path.is_file():
+            return []
+        return sorted(iter_json_records(self.journal_path), key=self.sort_key)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def compact(self):
+        '''
+        Writes the sorted records to the path and removes the journal. Nothing is written without records.
+        '''
+        self.close()
+        if not self.count:
+            return
+        records = self.read()
+        with self.path.open('w', encoding='UTF-8') as f:
+            json.dump(records, f, indent='\t', sort_keys=True)
+        self.journal_path.unlink()
+
+
+class HistoryEntry:
+    '''
+    A version of a study in the HistoryStore. The field digests are only computed, if the record digest differs.
+    '''
+
+    def __init__(self, version, digest, record):
+        self.version = version
+        self.digest = digest
+        self.record = record
+
+    @cached_property
+    def field_digests(self):
+        return field_digests(json.loads(self.record))
+
+
+class HistoryStore:
+    '''
+    A SQLite store of all versions of the studies keyed by the EU PAS register number.
+    A version is valid from the crawl which found it until the crawl which found the next version or missed the study.
+    The timestamps are ISO 8601 strings in UTC and the changed fields of a version are stored as a bitmask.
+    '''
+
+    schema = '''
+        CREATE TABLE IF NOT EXISTS field (
+            name TEXT PRIMARY KEY,
+            bit INTEGER NOT NULL UNIQUE
+        );
+        CREATE TABLE IF NOT EXISTS study_version (
+            eu_pas_register_number TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            valid_from TEXT NOT NULL,
+            valid_to TEXT,
+            digest BLOB NOT NULL,
+            changed_fields BLOB NOT NULL,
+            record TEXT NOT NULL,
+            PRIMARY KEY (eu_pas_register_number, version)
+        );
+        CREATE INDEX IF NOT EXISTS study_version_validity ON study_version (valid_from, valid_to);
+        CREATE UNIQUE INDEX IF NOT EXISTS study_version_latest ON study_version (eu_pas_register_number) WHERE valid_to IS NULL;
+    '''
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.connection = None
+        self.bits = {}
+        self.seen = set()
+
+    def open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path)
+        self.connection.executescript(self.schema)
+        self.bits = dict(self.connection.execute('SELECT name, bit FROM field'))
+        self.seen = set()
+        return self
+
+    def bitmask(self, names):
+        mask = 0
+        for name in names:
+            if name not in self.bits:
+                self.bits[name] = len(self.bits)
+                self.connection.execute(
+                    'INSERT INTO field (name, bit) VALUES (?, ?)', (name, self.bits[name]))
+            mask |= 1 << self.bits[name]
+        return mask.to_bytes((mask.bit_length() + 7) // 8, 'little')
+
+    def field_names(self, bitmask):
+        mask = int.from_bytes(bitmask, 'little')
+        return sorted(name for name, bit in self.bits.items() if mask >> bit & 1)
+
+    def latest(self, register_number):
+        '''
+        Returns the latest version of a study with one indexed lookup or None, if the study isn't valid anymore.
+        '''
+        row = self.connection.execute(
+            'SELECT version, digest, record FROM study_version WHERE eu_pas_register_number = ? AND valid_to IS NULL',
+            (register_number,)
+        ).fetchone()
+        return HistoryEntry(*row) if row else None
+
+    def get(self, register_number):
+        '''
+        Returns the latest version of a study as a list like the SnapshotIndex.
+        '''
+        return [entry] if (entry := self.latest(register_number)) else []
+
+    def add(self, record, timestamp):
+        '''
+        Adds a new version of a study, if the record changed since the latest version. Returns True for a new version.
+        '''
+        register_number = record['eu_pas_register_number']
+        self.seen.add(register_number)
+        digests = field_digests(record)
+        digest = record_digest(digests)
+
+        latest = self.latest(register_number)
+        if latest and latest.digest == digest:
+            return False
+
+        if latest:
+            changed_fields = {
+                name for name, field_digest in digests.items() if latest.field_digests.get(name) != field_digest
+            } | (latest.field_digests.keys() - digests.keys())
+            self.connection.execute(
+                'UPDATE study_version SET valid_to = ? WHERE eu_pas_register_number = ? AND version = ?',
+                (timestamp, register_number, latest.version)
+            )
+        else:
+            changed_fields = digests.keys()
+
+        self.connection.execute(
+            'INSERT INTO study_version VALUES (?, ?, ?, NULL, ?, ?, ?)',
+            (register_number, latest.version + 1 if latest else 1, timestamp,
+             digest, self.bitmask(changed_fields), canonical_json(record))
+        )
+        return True
+
+    def retire(self, timestamp):
+        '''
+        Ends the validity of all studies, which weren't added since the store was opened.
+        '''
+        self.connection.execute(
+            'CREATE TEMP TABLE IF NOT EXISTS seen (eu_pas_register_number TEXT PRIMARY KEY)')
+        self.connection.execute('DELETE FROM seen')
+        self.connection.executemany(
+            'INSERT INTO seen VALUES (?)', ((number,) for number in self.seen))
+        self.connection.execute(
+            'UPDATE study_version SET valid_to = ? WHERE valid_to IS NULL AND eu_pas_register_number NOT IN seen',
+            (timestamp,)
+        )
+
+    def as_of(self, timestamp):
+        '''
+        Returns the records of all studies, which were valid at the given timestamp.
+        '''
+        for (record,) in self.connection.execute(
+            'SELECT record FROM study_version WHERE valid_from <= ? AND (valid_to IS NULL OR valid_to > ?) ORDER BY eu_pas_register_number',
+            (timestamp, timestamp)
+        ):
+            yield json.loads(record)
+
+    def changes(self, register_number):
+        '''
+        Returns all versions of a study with their validity and changed fields.
+        '''
+        return [
+            {
+                'version': version,
+                'valid_from': valid_from,
+                'valid_to': valid_to,
+                'changed_fields': self.field_names(changed_fields),
+                'record': json.loads(record)
+            }
+            for version, valid_from, valid_to, changed_fields, record in self.connection.execute(
+                'SELECT version, valid_from, valid_to, changed_fields, record FROM study_version WHERE eu_pas_register_number = ? ORDER BY version',
+                (register_number,)
+            )
+        ]
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
@@ -0,0 +1,100 @@
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+import pytest
+
+BASELINES_PATH = Path(__file__).parent / 'baselines.json'
+
+
+class ParseBenchmark:
+    '''
+    Times a parse callback against fresh responses and compares the result with the stored baselines.
+    '''
+
+    def __init__(self, config):
+        self.rounds = config.getoption('--benchmark-rounds')
+        self.tolerance = config.getoption('--benchmark-tolerance')
+        self.update = config.getoption('--benchmark-update')
+        self.baselines = {}
+        if BASELINES_PATH.is_file():
+            self.baselines = json.loads(BASELINES_PATH.read_text(encoding='utf-8'))
+        self.results = {}
+
+    def __call__(self, name, callback, build_response):
+        '''
+        Runs the callback once per round with a new response, so the caches of the selectors can't be reused.
+        '''
+        # NOTE: The first call warms up lazy imports and the caches of lxml
+        callback(build_response())
+        timings = []
+        for _ in range(self.rounds):
+            response = build_response()
+            start = time.perf_counter()
+            callback(response)
+            timings.append(time.perf_counter() - start)
+
+        tracemalloc.start()
+        callback(build_response())
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        timings.sort()
+        median = timings[len(timings) // 2]
+        self.results[name] = {
+            'min_ms': round(timings[0] * 1000, 4),
+            'median_ms': round(median * 1000, 4),
+            'pages_per_sec': round(1 / median, 1),
+            'peak_kib': round(peak / 1024, 1)
+        }
+
+        if self.update:
+            return self.results[name]
+
+        baseline = self.baselines.get(name)
+        if baseline is None:
+            pytest.fail(f'No baseline for {name}, run with --benchmark-update')
+        # NOTE: The fastest round is less affected by other processes than the median
+        ratio = self.results[name]['min_ms'] / baseline['min_ms']
+        assert ratio <= self.tolerance, \
+            f'{name} took {ratio:.2f}x the baseline of {baseline["min_ms"]} ms'
+        return self.results[name]
+
+    def save(self):
+        BASELINES_PATH.write_text(json.dumps(
+            {**self.baselines, **self.results}, indent=4, sort_keys=True) + '\n', encoding='utf-8')
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('--benchmark') or config.getoption('--benchmark-update'):
+        return
+    skip = pytest.mark.skip(reason='needs --benchmark option to run')
+    for item in items:
+        if 'benchmarks' in item.path.parts:
+            item.add_marker(skip)
+
+
+@pytest.fixture(scope='session')
+def parse_benchmark(request):
+    # NOTE: Tracing by coverage slows down the callbacks and distorts the timings
+    if sys.gettrace() is not None:
+        pytest.skip('benchmarks need to run without tracing, use --no-cov')
+    benchmark = ParseBenchmark(request.config)
+    request.config.stash[results_key] = benchmark.results
+    yield benchmark
+    if benchmark.update:
+        benchmark.save()
+
+
+results_key = pytest.StashKey[dict]()
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    if not (results := config.stash.get(results_key, None)):
+        return
+    terminalreporter.section('parse benchmarks')
+    for name, result in sorted(results.items()):
+        terminalreporter.write_line(
+            f"{name:<40} {result['min_ms']:>9.3f} ms {result['median_ms']:>9.3f} ms {result['pages_per_sec']:>9.1f} pages/s {result['peak_kib']:>9.1f} KiB")
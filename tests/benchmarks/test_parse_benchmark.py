@@ -0,0 +1,50 @@
+import pytest
+
+from eupas.items import EMA_RWD_Study, EU_PAS_Study
+from eupas.spiders.ema_rwd_spider import EMA_RWD_Spider
+from eupas.spiders.eupas_spider import EU_PAS_Spider
+
+STUDY_URL = 'https://catalogues.ema.europa.eu/node/1906'
+EUPAS_URL = 'https://www.encepp.eu/encepp/viewResource.htm?id=1234'
+
+
+@pytest.mark.parametrize('callback, page', [
+    ('parse_admin_details', 'administrative-details'),
+    ('parse_method_details', 'methodological-aspects'),
+    ('parse_data_details', 'data-management'),
+])
+def test_ema_rwd_parse_benchmark(parse_benchmark, fixture_response, callback, page):
+    spider = EMA_RWD_Spider()
+
+    def parse(response):
+        result = getattr(spider, callback)(response, study=EMA_RWD_Study(url=STUDY_URL))
+        return list(result or [])
+
+    parse_benchmark(
+        f'ema_rwd.{callback}',
+        parse,
+        lambda: fixture_response(f'ema_rwd/{page}.html', f'{STUDY_URL}/{page}')
+    )
+
+
+def test_eupas_parse_benchmark(parse_benchmark, fixture_response):
+    spider = EU_PAS_Spider()
+
+    def parse(response):
+        return list(spider.parse_details(response, study=EU_PAS_Study(url=EUPAS_URL)))
+
+    parse_benchmark('eupas.parse_details', parse,
+                    lambda: fixture_response('eupas/viewResource.html', EUPAS_URL))
+
+
+def test_eupas_block_benchmark(parse_benchmark, fixture_response):
+    spider = EU_PAS_Spider()
+
+    def parse(response):
+        details = response.xpath('.//*[@id="1"]')[0]
+        spider._get_block_from_details(details, index=8)
+        spider._get_multiblock_from_details(
+            response.xpath('.//*[@id="2"]')[0], index=3, offset=1, every_nth=2)
+
+    parse_benchmark('eupas._get_block_from_details', parse,
+                    lambda: fixture_response('eupas/viewResource.html', EUPAS_URL))
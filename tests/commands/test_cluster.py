@@ -0,0 +1,61 @@
+from argparse import ArgumentParser
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from scrapy.settings import Settings
+
+from eupas.commands.cluster import Command
+
+pytest.importorskip('cleanco')
+pytest.importorskip('sklearn')
+
+
+@pytest.fixture()
+def cluster_paths(tmp_path: Path):
+    paths = {
+        'input': tmp_path / 'pytest_sponsors.csv',
+        'assignments': tmp_path / 'pytest_sponsors_manual.xlsx',
+        'output': tmp_path / 'clusters_new.xlsx'
+    }
+    for path in paths.values():
+        path.unlink(missing_ok=True)
+
+    pd.DataFrame({'funding_details': [
+        'Bayer AG', 'Bayer Pharma AG', 'Novartis', 'Novartis Pharma GmbH', 'Acme Research', 'Acme Research Ltd', 'Zeta'
+    ]}).to_csv(paths['input'], index=False)
+    with pd.ExcelWriter(paths['assignments'], engine='openpyxl') as writer:
+        pd.DataFrame({
+            'manual': ['Bayer', 'Novartis'],
+            'original': ['Bayer AG', 'Novartis']
+        }).to_excel(writer, sheet_name='funding_details', index=False)
+    return paths
+
+
+def run_cluster(paths, *args):
+    command = Command()
+    command.settings = Settings()
+    parser = ArgumentParser()
+    command.add_options(parser)
+    opts = parser.parse_args(
+        ['-i', str(paths['input']), '-o', str(paths['output'].parent), *args])
+    command.process_options(['funding_details'], opts)
+    command.run(['funding_details'], opts)
+
+
+def test_cluster_assigns_only_new_names(cluster_paths):
+    run_cluster(cluster_paths, '-a', str(cluster_paths['assignments']), '--backend', 'agglomerative')
+
+    clusters = pd.read_excel(cluster_paths['output']).set_index('original')
+    assert sorted(clusters.index) == [
+        'Acme Research', 'Acme Research Ltd', 'Bayer Pharma AG', 'Novartis Pharma GmbH', 'Zeta']
+    assert clusters.loc['Bayer Pharma AG', 'manual'] == 'Bayer'
+    assert clusters.loc['Bayer Pharma AG', 'matched_original'] == 'Bayer AG'
+    assert clusters.loc['Novartis Pharma GmbH', 'manual'] == 'Novartis'
+    assert clusters.loc['Bayer Pharma AG', 'clusters'] != clusters.loc['Novartis Pharma GmbH', 'clusters']
+
+    # NOTE: Unknown names are clustered among themselves
+    assert clusters.loc['Acme Research', 'clusters'] == clusters.loc['Acme Research Ltd', 'clusters']
+    assert clusters.loc['Zeta', 'clusters'] != clusters.loc['Acme Research', 'clusters']
+    assert clusters.loc[['Acme Research', 'Zeta'], 'clusters'].min() >= 2
+    assert pd.isna(clusters.loc['Zeta', 'matched_original'])
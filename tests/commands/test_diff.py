@@ -0,0 +1,149 @@
+from argparse import ArgumentParser
+import json
+from pathlib import Path
+import sqlite3
+
+import pandas as pd
+import pytest
+from scrapy.settings import Settings
+
+from eupas.commands.diff import Command
+from eupas.extensions import ItemHistoryComparer
+from eupas.items import EMA_RWD_Study
+
+
+@pytest.fixture()
+def diff_command():
+    command = Command()
+    command.settings = Settings({
+        'ITEMHISTORYCOMPARER_EXCEPTED_FIELDS': {
+            EMA_RWD_Study: {'other_documents_url'}
+        }
+    })
+    command.item_type = EMA_RWD_Study
+    return command
+
+
+@pytest.fixture()
+def old_data():
+    return pd.DataFrame([
+        {'eu_pas_register_number': '1', 'url': 'https://example.com/1', 'title': 'Old',
+         'update_date': '2024-01-01', 'medical_conditions': ['A', 'B']},
+        {'eu_pas_register_number': '2', 'url': 'https://example.com/2', 'title': 'Same',
+         'update_date': '2024-01-01', 'other_documents_url': 'https://example.com/2/old'},
+        {'eu_pas_register_number': '3', 'url': 'https://example.com/3', 'title': 'Removed'}
+    ])
+
+
+@pytest.fixture()
+def new_data():
+    return pd.DataFrame([
+        {'eu_pas_register_number': '1', 'url': 'https://example.com/1', 'title': 'New',
+         'update_date': '2024-02-01', 'medical_conditions': ['A', 'B']},
+        {'eu_pas_register_number': '2', 'url': 'https://example.com/2', 'title': 'Same',
+         'update_date': '2024-01-01', 'other_documents_url': None},
+        {'eu_pas_register_number': '4', 'url': 'https://example.com/4', 'title': 'Added'}
+    ])
+
+
+def test_diff_finds_changed_added_and_removed_studies(diff_command, old_data, new_data):
+    updates, added, removed = diff_command.diff(old_data, new_data)
+
+    assert added['eu_pas_register_number'].tolist() == ['4']
+    assert removed['eu_pas_register_number'].tolist() == ['3']
+
+    updates = {update[ItemHistoryComparer.changed_eupas_key]: update for update in updates}
+    assert set(updates) == {'1', '2'}
+    assert updates['1'] == {
+        'title': 'New',
+        'update_date': '2024-02-01',
+        ItemHistoryComparer.changed_date_key: True,
+        ItemHistoryComparer.only_excepted_fields_key: False,
+        ItemHistoryComparer.duplicate_fields_key: False,
+        ItemHistoryComparer.changed_eupas_key: '1',
+        ItemHistoryComparer.changed_url_key: 'https://example.com/1',
+        ItemHistoryComparer.deleted_fields_key: None
+    }
+    assert updates['2'][ItemHistoryComparer.changed_date_key] is False
+    assert updates['2'][ItemHistoryComparer.only_excepted_fields_key] is True
+    assert updates['2'][ItemHistoryComparer.deleted_fields_key] == [
+        'other_documents_url']
+
+
+def test_diff_compares_snapshots_of_different_formats(diff_command, tmp_path: Path, old_data, new_data):
+    csv_path = tmp_path / 'pytest_old.csv'
+    old_data.assign(medical_conditions=old_data['medical_conditions'].map(
+        lambda x: '; '.join(x) if isinstance(x, list) else x)).to_csv(csv_path, index=False)
+
+    db_path = tmp_path / 'pytest_new.db'
+    db_path.unlink(missing_ok=True)
+    with sqlite3.connect(db_path) as connection:
+        new_data.assign(medical_conditions=new_data['medical_conditions'].map(
+            lambda x: '; '.join(x) if isinstance(x, list) else x)).to_sql('study', connection, index=False)
+
+    json_path = tmp_path / 'pytest_old.json'
+    old_data.to_json(json_path, orient='records')
+
+    assert diff_command.diff(diff_command.read_input(csv_path), diff_command.read_input(db_path))[0] == \
+        diff_command.diff(diff_command.read_input(json_path), new_data)[0]
+
+
+def test_diff_compares_excel_dates_with_json_dates(diff_command, tmp_path: Path, old_data):
+    diff_command.input_path = tmp_path / 'pytest_old.json'
+    diff_command.output_folder = tmp_path
+    excel_path = tmp_path / 'pytest_old_pandas.xlsx'
+    excel_path.unlink(missing_ok=True)
+    old_data = old_data.assign(number_of_subjects=[1500, None, None])
+    diff_command.write_output(old_data.assign(
+        update_date=pd.to_datetime(old_data['update_date'])), file_extension='.xlsx')
+    old_data.to_json(diff_command.input_path, orient='records')
+
+    excel_data = diff_command.read_input(excel_path)
+    assert isinstance(excel_data['update_date'].iloc[0], pd.Timestamp)
+    updates, added, removed = diff_command.diff(
+        excel_data, diff_command.read_input(diff_command.input_path))
+    assert updates == []
+    assert added.empty and removed.empty
+
+    new_data = old_data.copy()
+    new_data.at[0, 'number_of_subjects'] = 2000
+    new_data.at[0, 'medical_conditions'] = ['A', 'C']
+    new_data.to_json(diff_command.input_path, orient='records')
+    updates, _, _ = diff_command.diff(
+        excel_data, diff_command.read_input(diff_command.input_path))
+    assert len(updates) == 1
+    # NOTE: The records contain the values of the new snapshot like the ones of the ItemHistoryComparer
+    assert updates[0]['number_of_subjects'] == 2000
+    assert type(updates[0]['number_of_subjects']) is int
+    assert updates[0]['medical_conditions'] == ['A', 'C']
+    assert 'update_date' not in updates[0]
+    json.dumps(updates)
+
+
+def test_diff_reads_parquet_snapshots(diff_command, tmp_path: Path, old_data, new_data):
+    pytest.importorskip('pyarrow')
+
+    parquet_path = tmp_path / 'pytest_new.parquet'
+    new_data.to_parquet(parquet_path, index=False)
+
+    assert diff_command.diff(old_data, diff_command.read_input(parquet_path))[0] == \
+        diff_command.diff(old_data, new_data)[0]
+
+
+def test_diff_writes_update_records(diff_command, tmp_path: Path, old_data, new_data):
+    old_path = tmp_path / 'pytest_old.json'
+    new_path = tmp_path / 'pytest_new.json'
+    old_data.to_json(old_path, orient='records')
+    new_data.to_json(new_path, orient='records')
+
+    parser = ArgumentParser()
+    diff_command.add_options(parser)
+    opts = parser.parse_args(
+        ['-i', str(old_path), '-n', str(new_path), '-o', str(tmp_path)])
+    diff_command.process_options([], opts)
+    diff_command.run([], opts)
+
+    with (tmp_path / 'pytest_old_updates.json').open('r', encoding='UTF-8') as f:
+        updates = json.load(f)
+    assert [update[ItemHistoryComparer.changed_eupas_key] for update in updates] == ['2', '1']
+    assert pd.read_json(tmp_path / 'pytest_old_added.json')['title'].tolist() == ['Added']
@@ -0,0 +1,25 @@
+from argparse import ArgumentParser
+
+import pytest
+from scrapy.settings import Settings
+
+from eupas.commands.ema_rwd import Command
+
+
+@pytest.mark.parametrize('args, enabled, concurrency', [
+    ([], False, 16),
+    (['--adaptive-concurrency'], True, 32)
+])
+def test_adaptive_concurrency_option(args, enabled, concurrency):
+    command = Command()
+    command.settings = Settings({
+        'ADAPTIVECONCURRENCY_ENABLED': False,
+        'ADAPTIVECONCURRENCY_MAX_CONCURRENCY': 32,
+        'CONCURRENT_REQUESTS': 16
+    })
+    parser = ArgumentParser()
+    command.add_options(parser)
+    command.process_options([], parser.parse_args(args))
+
+    assert command.settings.getbool('ADAPTIVECONCURRENCY_ENABLED') == enabled
+    assert command.settings.getint('CONCURRENT_REQUESTS') == concurrency
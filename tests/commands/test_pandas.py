@@ -0,0 +1,86 @@
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from eupas.commands import PandasCommand
+from eupas.exporters import ParquetItemExporter
+from eupas.items import EMA_RWD_Study
+
+
+@pytest.fixture()
+def pandas_command(tmp_path: Path):
+    command = PandasCommand()
+    command.input_path = tmp_path / 'pytest_data.parquet'
+    command.output_folder = tmp_path
+    return command
+
+
+@pytest.fixture()
+def data():
+    return pd.DataFrame({
+        'eu_pas_register_number': [1, 2, 3],
+        'countries': [['Austria', 'Germany'], None, ['France']],
+        'update_date': pd.to_datetime(['2024-01-01', None, '2024-03-01']),
+        '$CANCELLED_REGEX': [True, pd.NA, False],
+        '$UPDATED_state_eq_state': pd.array([True, None, False], dtype='boolean'),
+        'funding_details': ['Company', 1.5, None]
+    })
+
+
+@pytest.mark.parametrize('suffix', ['.parquet', '.feather'])
+def test_columnar_outputs_keep_dtypes(pandas_command, tmp_path: Path, data, suffix):
+    pytest.importorskip('pyarrow')
+
+    output_path = tmp_path / f'pytest_data_pandas{suffix}'
+    output_path.unlink(missing_ok=True)
+    pandas_command.write_output(data, file_extension=suffix)
+    result = pandas_command.read_input(output_path)
+
+    assert result['countries'].tolist() == [['Austria', 'Germany'], None, ['France']]
+    assert result['update_date'].dtype.kind == 'M'
+    assert result['$CANCELLED_REGEX'].tolist() == [True, None, False]
+    assert result['$UPDATED_state_eq_state'].dtype == 'boolean'
+    # NOTE: Columns with values of mixed types are stored as strings
+    assert result['funding_details'].tolist()[:2] == ['Company', '1.5']
+
+
+def test_read_input_projects_columns(pandas_command, tmp_path: Path):
+    pytest.importorskip('pyarrow')
+
+    input_path = tmp_path / 'pytest_data.parquet'
+    input_path.unlink(missing_ok=True)
+    with input_path.open('wb') as f:
+        exporter = ParquetItemExporter(f)
+        exporter.start_exporting()
+        exporter.export_item(EMA_RWD_Study(
+            eu_pas_register_number='EUPAS1', title='Study', update_date='01/02/2024', countries=['Austria', 'Germany']))
+        exporter.finish_exporting()
+
+    result = pandas_command.read_input(
+        columns=['countries', 'update_date', 'missing'])
+    assert result.columns.tolist() == ['countries', 'update_date']
+    assert result['countries'].tolist() == [['Austria', 'Germany']]
+    assert result['update_date'].dt.date.tolist() == [date(2024, 2, 1)]
+
+    pandas_command.multivalue_separator = '; '
+    assert pandas_command.read_input(columns=['countries'])['countries'].tolist() == [
+        'Austria; Germany']
+
+
+def test_text_outputs_join_multivalued_fields(pandas_command, tmp_path: Path, data):
+    output_path = tmp_path / 'pytest_data_pandas.csv'
+    output_path.unlink(missing_ok=True)
+    pandas_command.write_output(data, file_extension='.csv')
+
+    result = pandas_command.read_input(output_path, columns=['countries'])
+    assert result['countries'].tolist()[0] == 'Austria; Germany'
+
+
+def test_text_outputs_only_join_multivalued_fields(pandas_command, data):
+    result = pandas_command.join_multivalued(
+        data.assign(other=[['A'], None, ['B']]))
+
+    assert result['countries'].dropna().tolist() == ['Austria; Germany', 'France']
+    assert result['other'].tolist() == [['A'], None, ['B']]
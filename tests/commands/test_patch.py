@@ -0,0 +1,55 @@
+import logging
+
+import pandas as pd
+import pytest
+
+from eupas.commands.patch import Command
+
+
+@pytest.fixture()
+def patch_command():
+    command = Command()
+    command.logger = logging.getLogger()
+    return command
+
+
+def test_match_normalised_matches_unmatched_names(patch_command):
+    pytest.importorskip('cleanco')
+    pytest.importorskip('sklearn')
+
+    merge_data = pd.DataFrame({
+        'manual': ['Bayer', 'Novartis', 'Roche', 'Genentech'],
+        'original': ['Bayer AG', 'Novartis Pharma AG', 'Roche Ltd', 'Roche Ltd.'],
+        'multiple_funding_sources_override': [pd.NA, True, pd.NA, pd.NA]
+    })
+    data = pd.DataFrame({
+        'funding_details': ['Bayer AG', 'BAYER GmbH', 'Novartis', 'Roche', 'Pfizer', pd.NA],
+        '$MATCHED_funding_details': ['Bayer', pd.NA, pd.NA, pd.NA, pd.NA, pd.NA],
+        'multiple_funding_sources_override': [pd.NA] * 6
+    })
+
+    data = patch_command.match_normalised(data, merge_data, 'funding_details')
+
+    assert data['$MATCHED_funding_details'].tolist()[:3] == ['Bayer', 'Bayer', 'Novartis']
+    assert data['multiple_funding_sources_override'].tolist()[2] is True
+    # NOTE: Roche is ambiguous and Pfizer is unknown
+    assert data['$MATCHED_funding_details'].iloc[3:].isna().all()
+
+
+def test_match_normalised_ignores_empty_names(patch_command):
+    pytest.importorskip('cleanco')
+    pytest.importorskip('sklearn')
+
+    merge_data = pd.DataFrame({
+        'manual': ['Generic CRO', 'Bayer'],
+        'original': ['CRO', 'Bayer AG']
+    })
+    data = pd.DataFrame({
+        'funding_details': ['Pharma Ltd', 'The International Group', 'GmbH', 'Bayer GmbH'],
+        '$MATCHED_funding_details': [pd.NA] * 4
+    })
+    assert [patch_command.normaliser(name) for name in data['funding_details'].iloc[:3]] == ['', '', '']
+
+    data = patch_command.match_normalised(data, merge_data, 'funding_details')
+    assert data['$MATCHED_funding_details'].iloc[:3].isna().all()
+    assert data['$MATCHED_funding_details'].iloc[3] == 'Bayer'
@@ -0,0 +1,17 @@
+import pytest
+
+from eupas.commands import ema_rwd_statistic, eupas_statistic
+from eupas.items import EMA_RWD_Study, EU_PAS_Study
+
+
+@pytest.mark.parametrize('command_module, item_type', [
+    (ema_rwd_statistic, EMA_RWD_Study),
+    (eupas_statistic, EU_PAS_Study)
+])
+def test_statistic_input_fields_are_item_fields(command_module, item_type):
+    # NOTE: Missing columns are silently skipped by the projection of read_input
+    command = command_module.Command()
+    assert not [
+        name for name in command.input_fields
+        if not name.startswith('$') and name not in {'has_protocol', 'has_result'} and name not in item_type.fields
+    ]
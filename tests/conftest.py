@@ -2,12 +2,27 @@ from pathlib import Path
 
 import pytest
 from scrapy import spiders
+from scrapy.http import HtmlResponse, Request
 from scrapy.settings import Settings
 from scrapy.crawler import Crawler
 
 from eupas.spiders.eupas_spider import EU_PAS_Spider
 import eupas.settings as settings_module
 
+FIXTURES_PATH = Path(__file__).parent / 'fixtures'
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('benchmark', 'parse benchmarks')
+    group.addoption('--benchmark', action='store_true',
+                    help='run the parse benchmarks against the stored baselines')
+    group.addoption('--benchmark-update', action='store_true',
+                    help='store the results of the parse benchmarks as new baselines')
+    group.addoption('--benchmark-rounds', type=int, default=50,
+                    help='number of rounds per benchmarked callback (default: 50)')
+    group.addoption('--benchmark-tolerance', type=float, default=2.0,
+                    help='maximal allowed ratio between result and baseline (default: 2.0)')
+
 
 @pytest.fixture()
 def tmp_path(tmp_path):
@@ -39,3 +54,18 @@ def project_settings():
 @pytest.fixture()
 def crawler(project_settings):
     return Crawler(EU_PAS_Spider, project_settings)
+
+
+@pytest.fixture()
+def fixture_response():
+    '''
+    Returns a function building a response from a stored html page in the fixtures folder.
+    '''
+    def build(name, url, request=None):
+        return HtmlResponse(
+            url=url,
+            body=(FIXTURES_PATH / name).read_bytes(),
+            encoding='utf-8',
+            request=request or Request(url)
+        )
+    return build
@@ -0,0 +1,200 @@
+import pytest
+from scrapy.http import Request
+from scrapy.utils.test import get_crawler
+from twisted.internet.error import TimeoutError
+from twisted.python.failure import Failure
+
+from eupas.items import EMA_RWD_Study
+from eupas.spiders.ema_rwd_spider import EMA_RWD_Spider, FieldRule, FieldsetExtractor, StudyAssembler, int_value, sorted_labeled_values
+
+STUDY_URL = 'https://catalogues.ema.europa.eu/node/1906'
+
+
+@pytest.fixture(params=[False, True], ids=['serial', 'parallel'])
+def ema_rwd_spider(request):
+    crawler = get_crawler(EMA_RWD_Spider, {
+        'PARALLEL_DETAILS_DOWNLOAD_TIMEOUT': 60
+    })
+    crawler.stats.open_spider(None)
+    return EMA_RWD_Spider.from_crawler(crawler, parallel_details=request.param)
+
+
+def replay(spider, fixture_response, fail_page=None, output=None):
+    '''
+    Replays the stored detail pages of a study through the callbacks of the spider.
+    '''
+    if output is None:
+        output = list(spider.parse(fixture_response(
+            'ema_rwd/administrative-details.html', f'{STUDY_URL}/administrative-details')))
+    items = []
+    while output:
+        result = output.pop(0)
+        if isinstance(result, EMA_RWD_Study):
+            items.append(result)
+        elif fail_page and result.meta.get('detail_page') == fail_page:
+            failure = Failure(TimeoutError())
+            failure.request = result
+            output.extend(result.errback(failure))
+        elif page := result.url.rsplit('/', 1)[1]:
+            output.extend(result.callback(fixture_response(
+                f'ema_rwd/{page}.html', result.url, result), **result.cb_kwargs))
+    return items
+
+
+def test_ema_rwd_spider_parses_fixture_study(ema_rwd_spider, fixture_response):
+    [study] = replay(ema_rwd_spider, fixture_response)
+
+    assert study['url'] == STUDY_URL
+    assert study['eu_pas_register_number'] == 'EUPAS1234'
+    assert study['title'] == 'Pytest Study of a Medicine'
+    assert study['update_date'] == '15/01/2024'
+    assert study['countries'] == ['Austria', 'France', 'Germany']
+    assert study['state'] == 'Ongoing'
+    assert study['funding_contract_date_actual'] == '15/01/2020'
+    assert study['risk_management_plan'] == 'EU RMP category 3 (required)'
+    assert study['substance_inn'] == ['IBUPROFEN', 'PARACETAMOL']
+    assert study['number_of_subjects'] == 1500
+    assert study['outcomes'] == 'Incidence of liver injury'
+    assert study['data_sources_registered_with_encepp'] == [
+        'Source A', 'Source B']
+    assert study['check_stability'] == 'No'
+    assert study['conducted_data_characterisation'] == 'No'
+
+
+def test_ema_rwd_spider_drops_study_with_failed_page(fixture_response):
+    crawler = get_crawler(EMA_RWD_Spider, {
+        'PARALLEL_DETAILS_DOWNLOAD_TIMEOUT': 60
+    })
+    crawler.stats.open_spider(None)
+    spider = EMA_RWD_Spider.from_crawler(crawler, parallel_details=True)
+
+    assert replay(spider, fixture_response, fail_page='data-management') == []
+    assert crawler.stats.get_value('assembler/failed_page_count') == 1
+    assert crawler.stats.get_value('assembler/dropped_study_count') == 1
+
+
+@pytest.fixture()
+def assembler():
+    assembler = StudyAssembler()
+    assembler.start('pytest', EMA_RWD_Study(url='pytest', title='Title'), [
+                    'methodological-aspects', 'data-management'])
+    return assembler
+
+
+def test_assembler_merges_partial_items_after_last_page(assembler: StudyAssembler):
+    assert assembler.resolve('pytest', 'data-management',
+                             EMA_RWD_Study(url='pytest', outcomes='Outcome')) is None
+
+    study, failed_pages = assembler.resolve(
+        'pytest', 'methodological-aspects', EMA_RWD_Study(url='pytest', study_type='Type'))
+    assert failed_pages == []
+    assert dict(study) == {
+        'url': 'pytest',
+        'title': 'Title',
+        'outcomes': 'Outcome',
+        'study_type': 'Type'
+    }
+    assert assembler.flush() == []
+
+
+def test_assembler_reports_failed_pages(assembler: StudyAssembler):
+    assembler.resolve('pytest', 'data-management')
+    _, failed_pages = assembler.resolve(
+        'pytest', 'methodological-aspects', EMA_RWD_Study(url='pytest'))
+    assert failed_pages == ['data-management']
+
+
+def test_assembler_flushes_unfinished_studies(assembler: StudyAssembler):
+    assembler.resolve('pytest', 'data-management', EMA_RWD_Study(url='pytest'))
+    [(study, pending_pages)] = assembler.flush()
+    assert study['url'] == 'pytest'
+    assert pending_pages == ['methodological-aspects']
+
+
+@pytest.fixture()
+def extractor():
+    return FieldsetExtractor([
+        FieldRule('name of medicine', 'substance_brand_name', sorted_labeled_values),
+        FieldRule('name of medicine, other', 'substance_brand_name_other'),
+        FieldRule('number of subjects', 'number_of_subjects', int_value, exact=False)
+    ])
+
+
+def test_fieldset_extractor_looks_up_first_matching_rule(extractor):
+    assert extractor.lookup(' Name of medicine ').field == 'substance_brand_name'
+    assert extractor.lookup('Name of medicine, other').field == 'substance_brand_name_other'
+    assert extractor.lookup('Estimated number of subjects').field == 'number_of_subjects'
+    assert extractor.lookup('Unknown label') is None
+    assert 'Unknown label' in extractor.labels
+
+
+def test_fieldset_extractor_extracts_pairs(extractor, fixture_response):
+    response = fixture_response('ema_rwd/methodological-aspects.html', f'{STUDY_URL}/methodological-aspects')
+    fieldsets = EMA_RWD_Spider().get_fieldsets(response)
+    study = EMA_RWD_Study()
+
+    extractor.extract(fieldsets['darwin-study-drug-and-medical-condition'], study)
+    extractor.extract(fieldsets['darwin-population-studied'], study)
+
+    assert study == EMA_RWD_Study(
+        substance_brand_name=['ALPHA', 'ZETA'],
+        substance_brand_name_other='Other medicine',
+        number_of_subjects=1500
+    )
+
+
+def test_fieldset_extractor_skips_first_pairs(extractor, fixture_response):
+    response = fixture_response('ema_rwd/methodological-aspects.html', f'{STUDY_URL}/methodological-aspects')
+    fieldsets = EMA_RWD_Spider().get_fieldsets(response)
+    study = EMA_RWD_Study()
+
+    extractor.extract(fieldsets['darwin-study-drug-and-medical-condition'], study, start=1)
+
+    assert study == EMA_RWD_Study(substance_brand_name_other='Other medicine')
+
+
+@pytest.fixture(params=[False, True], ids=['serial', 'parallel'])
+def resumable_spider(request, tmp_path):
+    path = tmp_path / 'pytest_checkpoint.jsonl'
+    path.unlink(missing_ok=True)
+    crawler = get_crawler(EMA_RWD_Spider, {
+        'PARALLEL_DETAILS_DOWNLOAD_TIMEOUT': 60,
+        'RESUMABLE_CHECKPOINT_PATH': str(path)
+    })
+    crawler.stats.open_spider(None)
+    spider = EMA_RWD_Spider.from_crawler(
+        crawler, parallel_details=request.param, resumable=True)
+    yield spider
+    spider.checkpoint_store.close()
+
+
+def test_ema_rwd_spider_resumes_partial_study(resumable_spider, fixture_response):
+    # NOTE: Studies without sitemap url aren't checkpointed
+    [expected] = replay(resumable_spider, fixture_response)
+    loc = 'https://catalogues.ema.europa.eu/study/1906'
+    url = f'{STUDY_URL}/administrative-details'
+    # NOTE: The interrupted run only parsed the first page
+    list(resumable_spider.parse(fixture_response(
+        'ema_rwd/administrative-details.html', url, Request(url, meta={'sitemap_loc': loc}))))
+    resumable_spider.checkpoint_store.close()
+    resumable_spider.checkpoint_store.load()
+
+    output = list(resumable_spider.resume_study(
+        resumable_spider.checkpoint_store.get(loc), {'sitemap_loc': loc}))
+    [study] = replay(resumable_spider, fixture_response, output=output)
+
+    assert study == expected
+    assert resumable_spider.checkpoint_store.get(loc)['finished']
+    assert resumable_spider.crawler.stats.get_value('resumable/resumed_item_count') == 1
+
+
+def test_ema_rwd_spider_reemits_finished_study(resumable_spider):
+    loc = 'https://catalogues.ema.europa.eu/study/1906'
+    resumable_spider.checkpoint_store.add(
+        loc, 'EUPAS1234', EMA_RWD_Study(url=STUDY_URL, eu_pas_register_number='EUPAS1234'), finished=True)
+
+    [study] = resumable_spider.resume_study(
+        resumable_spider.checkpoint_store.get(loc), {'sitemap_loc': loc})
+
+    assert study == EMA_RWD_Study(url=STUDY_URL, eu_pas_register_number='EUPAS1234')
+    assert resumable_spider.crawler.stats.get_value('resumable/reused_item_count') == 1
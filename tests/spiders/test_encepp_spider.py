@@ -0,0 +1,59 @@
+import pytest
+
+from eupas.items import EU_PAS_Study
+from eupas.spiders.eupas_spider import EU_PAS_Spider
+
+
+@pytest.fixture()
+def eupas_response(fixture_response):
+    return fixture_response('eupas/viewResource.html', 'https://www.encepp.eu/encepp/viewResource.htm?id=1234')
+
+
+@pytest.fixture()
+def search_study():
+    return EU_PAS_Study(
+        url='https://www.encepp.eu/encepp/viewResource.htm?id=1234',
+        eu_pas_register_number='EUPAS1234',
+        state='Ongoing',
+        title='Pytest Study',
+        update_date='15/01/2024'
+    )
+
+
+def test_eupas_spider_parses_fixture_study(eupas_response, search_study):
+    [study] = EU_PAS_Spider().parse_details(eupas_response, study=search_study)
+
+    assert study['registration_date'] == '01/02/2020'
+    assert study['acronym'] == 'PYTEST'
+    assert study['centre_name'] == 'Pytest Institute'
+    assert study['countries'] == ['Germany', 'France']
+    assert study['funding_companies_percentage'] == 60
+    assert study['funding_other_names'] == ['Pytest Foundation']
+    assert study['substance_inn'] == ['IBUPROFEN', 'PARACETAMOL']
+    assert study['medical_conditions'] == ['Pain', 'Fever']
+    assert study['additional_medical_conditions'] == 'Headache'
+    assert study['sex_population'] == ['Male', 'Female']
+    assert study['number_of_subjects'] == 1500
+    assert study['data_sources_registered_with_encepp'] == [
+        'Source B', 'Source A']
+    assert study['primary_scope'] == 'Primary scope : Drug utilisation'
+    assert study['secondary_outcomes'] == [
+        'Mortality', ' Measured after two years ']
+    assert study['study_design'] == ['Cohort', 'Case-control']
+    assert study['references'] == ['https://doi.org/10.1000/1']
+    assert study['other_documents_url'] == ['/encepp/document/other.pdf']
+
+
+@pytest.mark.parametrize('index, expected', [
+    (2, 2), (6, 3), (7, 6), (8, 7)
+])
+def test_eupas_spider_finds_blocks(eupas_response, index, expected):
+    details = eupas_response.xpath('.//*[@id="1"]')[0]
+    assert len(EU_PAS_Spider()._get_block_from_details(details, index=index)) == expected
+
+
+def test_eupas_spider_finds_multiblocks(eupas_response):
+    details = eupas_response.xpath('.//*[@id="2"]')[0]
+    blocks = EU_PAS_Spider()._get_multiblock_from_details(
+        details, index=3, offset=1, every_nth=2)
+    assert [len(block) for block in blocks] == [2, 4, 3]
@@ -0,0 +1,109 @@
+import pytest
+
+from eupas.clustering import NameNormaliser, balanced_row_blocks, candidate_pairs, cluster_labels, sequence_ratio, similarity_matrix
+
+pytest.importorskip('sklearn')
+
+
+@pytest.fixture()
+def names():
+    return ['bayer', 'bayer ag', 'novartis', 'novartis pharma', 'pfizer', 'roche']
+
+
+def test_unblocked_similarity_matches_all_pairs(names):
+    similarity = similarity_matrix(names, blocking_cutoff=0).toarray()
+
+    assert similarity.diagonal().tolist() == [1.0] * len(names)
+    assert (similarity == similarity.T).all()
+    for i, a in enumerate(names):
+        for j, b in enumerate(names[:i]):
+            assert similarity[i, j] == sequence_ratio(a, b)
+
+
+def test_blocking_only_scores_candidate_pairs(names):
+    candidates = candidate_pairs(names, cutoff=0.3)
+    pairs = {(names[i], names[j]) for i, j in zip(*candidates.nonzero())}
+
+    assert ('bayer ag', 'bayer') in pairs
+    assert ('novartis pharma', 'novartis') in pairs
+    assert ('roche', 'bayer') not in pairs
+    assert all(i > j for i, j in zip(*candidates.nonzero()))
+
+    similarity = similarity_matrix(names, blocking_cutoff=0.3)
+    assert similarity[1, 0] == similarity[0, 1] == sequence_ratio('bayer', 'bayer ag')
+    assert similarity[5, 0] == 0
+
+
+def test_blocking_without_ngrams():
+    assert candidate_pairs(['', ''], cutoff=0.3).nnz == 0
+    assert similarity_matrix(['', ''], blocking_cutoff=0.3).toarray().tolist() == [
+        [1.0, 0.0], [0.0, 1.0]]
+
+
+def test_balanced_row_blocks():
+    # NOTE: The rows of a lower triangle have 0, 1, 2, ... pairs
+    indptr = [0, 0, 1, 3, 6, 10, 15, 21]
+    blocks = balanced_row_blocks(indptr, 3)
+
+    assert blocks[0][0] == 0 and blocks[-1][1] == 7
+    assert all(a[1] == b[0] for a, b in zip(blocks, blocks[1:]))
+    assert max(indptr[end] - indptr[start] for start, end in blocks) <= 11
+
+
+@pytest.mark.parametrize('blocking_cutoff', [0, 0.3])
+def test_parallel_scores_match_serial_scores(names, blocking_cutoff):
+    serial = similarity_matrix(names * 3, blocking_cutoff=blocking_cutoff)
+    parallel = similarity_matrix(names * 3, blocking_cutoff=blocking_cutoff, jobs=2)
+
+    assert (serial != parallel).nnz == 0
+    assert serial.toarray().tobytes() == parallel.toarray().tobytes()
+
+
+def test_name_normaliser_cleans_and_caches_names():
+    pytest.importorskip('cleanco')
+
+    normaliser = NameNormaliser()
+    assert normaliser('Novartis Pharma AG') == 'novartis'
+    assert normaliser('Université  de Liège, Ltd.') == 'universite liege'
+    assert normaliser('Bayer Group') == normaliser('BAYER') == 'bayer'
+
+    normaliser('Novartis Pharma AG')
+    assert normaliser.normalise.cache_info().hits >= 1
+
+
+def reference_average_linkage(similarity, cutoff):
+    # NOTE: Merges the pair of clusters with the highest average similarity of all their names
+    clusters = [[i] for i in range(len(similarity))]
+    while True:
+        best = max(
+            ((similarity[a][:, b].mean(), i, j) for j, b in enumerate(clusters) for i, a in enumerate(clusters[:j])),
+            default=None)
+        if best is None or best[0] < cutoff:
+            return sorted(sorted(cluster) for cluster in clusters)
+        _, i, j = best
+        clusters[i] = clusters[i] + clusters.pop(j)
+
+
+def as_groups(labels):
+    groups = {}
+    for i, label in enumerate(labels):
+        groups.setdefault(label, []).append(i)
+    return sorted(groups.values())
+
+
+@pytest.mark.parametrize('backend', ['affinity', 'agglomerative', 'components'])
+def test_backends_cluster_similar_names(names, backend):
+    similarity = similarity_matrix(names, blocking_cutoff=0.3)
+    labels = cluster_labels(similarity, 0.6, backend)
+
+    assert len(labels) == len(names)
+    if backend != 'affinity':
+        assert as_groups(labels) == [[0, 1], [2, 3], [4], [5]]
+
+
+def test_average_linkage_matches_reference(names):
+    similarity = similarity_matrix(names * 2 + ['bay', 'pfizer inc'], blocking_cutoff=0)
+
+    for cutoff in [0.3, 0.5, 0.7]:
+        assert as_groups(cluster_labels(similarity, cutoff, 'agglomerative')) == \
+            reference_average_linkage(similarity.toarray(), cutoff)
@@ -0,0 +1,166 @@
+from datetime import date
+from pathlib import Path
+import sqlite3
+
+import pytest
+
+from eupas.exporters import ParquetItemExporter, SQLiteItemExporter
+from eupas.items import EMA_RWD_Study
+
+
+@pytest.fixture()
+def sqlite_path(tmp_path: Path):
+    path = tmp_path / 'pytest_data.db'
+    path.unlink(missing_ok=True)
+    return path
+
+
+@pytest.fixture()
+def parquet_path(tmp_path: Path):
+    path = tmp_path / 'pytest_data.parquet'
+    path.unlink(missing_ok=True)
+    return path
+
+
+def export_items(path, items, mode='wb', exporter_class=SQLiteItemExporter, **kwargs):
+    with path.open(mode) as f:
+        exporter = exporter_class(f, **kwargs)
+        exporter.start_exporting()
+        for item in items:
+            exporter.export_item(item)
+        exporter.finish_exporting()
+
+
+@pytest.mark.parametrize('batch_size', [1, 2, 500])
+def test_sqlite_exporter_inserts_batches(sqlite_path: Path, batch_size):
+    items = [
+        EMA_RWD_Study(eu_pas_register_number=f'EUPAS{number}',
+                      title=f'Study {number}', medical_conditions=['A', 'B'])
+        for number in range(5)
+    ]
+    export_items(sqlite_path, items, default_value='', batch_size=batch_size,
+                 journal_mode='wal', synchronous='normal')
+    assert not sqlite_path.with_name(f'{sqlite_path.name}-wal').exists()
+
+    with sqlite3.connect(sqlite_path) as connection:
+        rows = connection.execute(
+            'SELECT eu_pas_register_number, title, medical_conditions, description FROM study ORDER BY 1').fetchall()
+    assert rows == [(number, f'Study {number}', 'A; B', '') for number in range(5)]
+
+
+def test_sqlite_exporter_rejects_invalid_pragmas(sqlite_path: Path):
+    with pytest.raises(ValueError):
+        export_items(sqlite_path, [], default_value='', journal_mode='wal; DROP TABLE study')
+
+
+def test_sqlite_exporter_normalizes_multivalued_fields(sqlite_path: Path):
+    export_items(sqlite_path, [
+        EMA_RWD_Study(eu_pas_register_number='EUPAS1',
+                      title='Old', countries=['Austria', 'Germany']),
+        EMA_RWD_Study(eu_pas_register_number='EUPAS2',
+                      title='Study', countries=['Germany'])
+    ], default_value='', normalize_multivalued=True)
+    # NOTE: The second export upserts the first study
+    export_items(sqlite_path, [
+        EMA_RWD_Study(eu_pas_register_number='EUPAS1',
+                      title='New', countries=['France'])
+    ], mode='ab', default_value='', normalize_multivalued=True)
+
+    with sqlite3.connect(sqlite_path) as connection:
+        columns = [row[1] for row in connection.execute(
+            'PRAGMA table_info(study)')]
+        titles = connection.execute(
+            'SELECT eu_pas_register_number, title FROM study ORDER BY 1').fetchall()
+        countries = connection.execute(
+            'SELECT study_id, value FROM study_countries ORDER BY 1, 2').fetchall()
+        indexes = [row[1] for row in connection.execute(
+            'PRAGMA index_list(study_countries)')]
+    assert 'countries' not in columns
+    assert titles == [(1, 'New'), (2, 'Study')]
+    assert countries == [(1, 'France'), (2, 'Germany')]
+    assert set(indexes) == {'study_countries_study_id', 'study_countries_value'}
+
+
+def test_sqlite_exporter_upserts_repeated_keys_within_a_batch(sqlite_path: Path):
+    export_items(sqlite_path, [
+        EMA_RWD_Study(eu_pas_register_number='EUPAS1',
+                      title='Old', countries=['Austria', 'Germany']),
+        EMA_RWD_Study(eu_pas_register_number='EUPAS1',
+                      title='New', countries=['Austria', 'France'])
+    ], default_value='', normalize_multivalued=True)
+
+    with sqlite3.connect(sqlite_path) as connection:
+        titles = connection.execute(
+            'SELECT eu_pas_register_number, title FROM study').fetchall()
+        countries = connection.execute(
+            'SELECT study_id, value FROM study_countries ORDER BY 1, 2').fetchall()
+    assert titles == [(1, 'New')]
+    assert countries == [(1, 'Austria'), (1, 'France')]
+
+
+def test_sqlite_exporter_flushes_before_repeated_keys(sqlite_path: Path):
+    with sqlite_path.open('wb') as f:
+        exporter = SQLiteItemExporter(f, default_value='')
+        exporter.start_exporting()
+        for number in [1, 2, 1]:
+            exporter.export_item(EMA_RWD_Study(
+                eu_pas_register_number=f'EUPAS{number}', title=f'Study {number}'))
+        # NOTE: The repeated key starts a new batch, so the previous rows are written together
+        assert len(exporter.batch) == 1
+        exporter.export_item(EMA_RWD_Study(eu_pas_register_number='EUPAS3', title='Study 3'))
+        exporter.finish_exporting()
+
+    with sqlite3.connect(sqlite_path) as connection:
+        titles = connection.execute(
+            'SELECT eu_pas_register_number, title FROM study ORDER BY 1').fetchall()
+    assert titles == [(1, 'Study 1'), (2, 'Study 2'), (3, 'Study 3')]
+
+
+@pytest.mark.parametrize('batch_size', [1, 500])
+def test_sqlite_exporter_drops_invalid_rows(sqlite_path: Path, batch_size):
+    export_items(sqlite_path, [
+        EMA_RWD_Study(eu_pas_register_number='EUPAS1', title='First'),
+        EMA_RWD_Study(eu_pas_register_number='EUPAS2', title='Study'),
+        EMA_RWD_Study(eu_pas_register_number='EUPAS1', title='Duplicate'),
+        EMA_RWD_Study(eu_pas_register_number='EUPAS3', title='Study')
+    ], default_value='', batch_size=batch_size)
+    export_items(sqlite_path, [
+        EMA_RWD_Study(eu_pas_register_number='EUPAS2', title='Duplicate'),
+        EMA_RWD_Study(eu_pas_register_number='EUPAS4', title='Study')
+    ], mode='ab', default_value='', batch_size=batch_size)
+
+    with sqlite3.connect(sqlite_path) as connection:
+        titles = connection.execute(
+            'SELECT eu_pas_register_number, title FROM study ORDER BY 1').fetchall()
+    assert titles == [(1, 'First'), (2, 'Study'), (3, 'Study'), (4, 'Study')]
+
+
+def test_parquet_exporter_writes_typed_row_groups(parquet_path: Path):
+    pq = pytest.importorskip('pyarrow.parquet')
+
+    export_items(parquet_path, [
+        EMA_RWD_Study(eu_pas_register_number=f'EUPAS{number}', title=f'Study {number}',
+                      update_date='01/02/2024', countries=['Austria', 'Germany'])
+        for number in range(5)
+    ], exporter_class=ParquetItemExporter, row_group_size=2)
+
+    parquet_file = pq.ParquetFile(parquet_path)
+    schema = parquet_file.schema_arrow
+    assert parquet_file.num_row_groups == 3
+    assert str(schema.field('eu_pas_register_number').type) == 'int64'
+    assert str(schema.field('update_date').type) == 'date32[day]'
+    assert str(schema.field('countries').type) == 'list<element: string>'
+    assert str(schema.field('title').type) == 'string'
+
+    table = parquet_file.read().to_pylist()
+    assert table[1]['eu_pas_register_number'] == 1
+    assert table[1]['update_date'] == date(2024, 2, 1)
+    assert table[1]['countries'] == ['Austria', 'Germany']
+    assert table[1]['description'] is None
+
+
+def test_parquet_exporter_writes_empty_feeds(parquet_path: Path):
+    pq = pytest.importorskip('pyarrow.parquet')
+
+    export_items(parquet_path, [], exporter_class=ParquetItemExporter)
+    assert pq.read_table(parquet_path).num_rows == 0
@@ -1,10 +1,17 @@
 import json
 from pathlib import Path
+from types import SimpleNamespace
 
 import pytest
+from scrapy import Spider
+from scrapy.exceptions import NotSupported
+from scrapy.core.downloader import Slot
+from scrapy.http import Request, Response
+from scrapy.utils.test import get_crawler
 
-from eupas.extensions import SingleJsonItemStringExporter, ItemHistoryComparer
+from eupas.extensions import AdaptiveConcurrency, SingleJsonItemStringExporter, ItemHistoryComparer
 from eupas.items import EMA_RWD_Study
+from eupas.stores import HistoryStore
 
 
 @pytest.fixture(params=[1234, 999, 'Hello'])
@@ -52,3 +59,202 @@ def history_comparer(json_file: Path, crawler, request):
 @pytest.mark.skip("Not implemented")
 def test_history_comparer(history_comparer, simple_item, simple_spider):
     history_comparer.item_scraped(simple_item, simple_spider)
+
+
+@pytest.fixture()
+def indexed_history_comparer(json_file: Path):
+    studies = [
+        {'eu_pas_register_number': '1', 'url': 'https://example.com/1', 'title': 'Old'},
+        {'eu_pas_register_number': '2', 'url': 'https://example.com/2'},
+        {'eu_pas_register_number': '2', 'url': 'https://example.com/2'}
+    ]
+    with json_file.open('w', encoding='UTF-8') as f:
+        json.dump(studies, f)
+    crawler = get_crawler(Spider, {
+        'ITEMHISTORYCOMPARER_ENABLED': True,
+        'ITEMHISTORYCOMPARER_JSON_INPUT_PATH': {EMA_RWD_Study: str(json_file)},
+        'ITEMHISTORYCOMPARER_JSON_OUTPUT_PATH': str(json_file.with_name('pytest_updates.json')),
+        'ITEMHISTORYCOMPARER_EXCEPTED_FIELDS': {},
+        'ITEMHISTORYCOMPARER_DUPLICATE_EXCEPTED_FIELDS': {}
+    })
+    crawler.stats.open_spider(None)
+    history_comparer = ItemHistoryComparer.from_crawler(crawler)
+    history_comparer.spider_opened(SimpleNamespace(item_class=EMA_RWD_Study))
+    return history_comparer
+
+
+def test_history_comparer_indexes_studies(indexed_history_comparer):
+    assert set(indexed_history_comparer.studies.entries) == {'1', '2'}
+
+    indexed_history_comparer.item_scraped(EMA_RWD_Study(
+        eu_pas_register_number='EUPAS1', url='https://example.com/1', title='New'), None)
+    assert indexed_history_comparer.updates.read()[0]['title'] == 'New'
+
+    indexed_history_comparer.item_scraped(EMA_RWD_Study(
+        eu_pas_register_number='EUPAS1', url='https://example.com/1', title='Old'), None)
+    assert indexed_history_comparer.updates.count == 1
+
+    indexed_history_comparer.item_scraped(EMA_RWD_Study(
+        eu_pas_register_number='EUPAS1', url='https://example.com/1'), None)
+    assert indexed_history_comparer.updates.read()[1][ItemHistoryComparer.deleted_fields_key] == [
+        'title']
+
+    indexed_history_comparer.item_scraped(EMA_RWD_Study(
+        eu_pas_register_number='EUPAS3', url='https://example.com/3'), None)
+    assert indexed_history_comparer.crawler.stats.get_value(
+        'item_history_comparer/item_with_new_register_number_count') == 1
+
+    with pytest.raises(NotSupported):
+        indexed_history_comparer.item_scraped(EMA_RWD_Study(
+            eu_pas_register_number='EUPAS2', url='https://example.com/2'), None)
+
+    indexed_history_comparer.spider_closed(None)
+    with indexed_history_comparer.updates.path.open('r', encoding='UTF-8') as f:
+        assert len(json.load(f)) == 2
+
+
+def test_history_comparer_uses_history_store(tmp_path: Path):
+    history_path = tmp_path / 'pytest_history.db'
+    history_path.unlink(missing_ok=True)
+    crawler = get_crawler(Spider, {
+        'ITEMHISTORYCOMPARER_ENABLED': True,
+        'ITEMHISTORYCOMPARER_JSON_INPUT_PATH': {},
+        'ITEMHISTORYCOMPARER_JSON_OUTPUT_PATH': str(tmp_path / 'pytest_history_updates.json'),
+        'ITEMHISTORYCOMPARER_HISTORY_PATH': {EMA_RWD_Study: str(history_path)},
+        'ITEMHISTORYCOMPARER_EXCEPTED_FIELDS': {},
+        'ITEMHISTORYCOMPARER_DUPLICATE_EXCEPTED_FIELDS': {}
+    })
+    crawler.stats.open_spider(None)
+    spider = SimpleNamespace(item_class=EMA_RWD_Study, custom_settings={'FILTER_STUDIES': False})
+
+    for title in ['Old', 'New']:
+        history_comparer = ItemHistoryComparer.from_crawler(crawler)
+        history_comparer.spider_opened(spider)
+        history_comparer.item_scraped(EMA_RWD_Study(
+            eu_pas_register_number='EUPAS1', url='https://example.com/1', title=title), spider)
+        history_comparer.spider_closed(spider, 'finished')
+
+    assert crawler.stats.get_value(
+        'item_history_comparer/item_with_new_register_number_count') == 1
+    with history_comparer.updates.path.open('r', encoding='UTF-8') as f:
+        assert [update['title'] for update in json.load(f)] == ['New']
+    history_store = HistoryStore(history_path).open()
+    assert len(history_store.changes('1')) == 2
+    history_store.close()
+
+    # NOTE: A filtered crawl doesn't retire the studies it didn't scrape
+    spider.custom_settings['FILTER_STUDIES'] = True
+    history_comparer = ItemHistoryComparer.from_crawler(crawler)
+    history_comparer.spider_opened(spider)
+    history_comparer.item_scraped(EMA_RWD_Study(
+        eu_pas_register_number='EUPAS2', url='https://example.com/2', title='Filtered'), spider)
+    history_comparer.spider_closed(spider, 'finished')
+
+    history_store = HistoryStore(history_path).open()
+    assert json.loads(history_store.latest('1').record)['title'] == 'New'
+    assert history_store.latest('2') is not None
+    history_store.close()
+
+
+@pytest.fixture()
+def slot():
+    return Slot(concurrency=4, delay=0.2, randomize_delay=False)
+
+
+@pytest.fixture()
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr('eupas.extensions.time', lambda: clock.now)
+    return clock
+
+
+@pytest.fixture()
+def adaptive_concurrency(slot, clock):
+    crawler = get_crawler(Spider, {
+        'ADAPTIVECONCURRENCY_ENABLED': True,
+        'ADAPTIVECONCURRENCY_MIN_CONCURRENCY': 1,
+        'ADAPTIVECONCURRENCY_MAX_CONCURRENCY': 6,
+        'ADAPTIVECONCURRENCY_WINDOW': 2,
+        'ADAPTIVECONCURRENCY_LATENCY_TOLERANCE': 1.5,
+        'ADAPTIVECONCURRENCY_BACKOFF_FACTOR': 0.5,
+        'ADAPTIVECONCURRENCY_BACKOFF_HTTP_CODES': [429, 503],
+        'ADAPTIVECONCURRENCY_MAX_DELAY': 30.0,
+        'DOWNLOAD_DELAY': 0.2
+    })
+    crawler.stats.open_spider(None)
+    crawler.engine = SimpleNamespace(
+        downloader=SimpleNamespace(slots={'example.com': slot}))
+    return AdaptiveConcurrency.from_crawler(crawler)
+
+
+def download(extension, status=200, latency=0.1, headers=None):
+    request = Request('https://example.com', meta={
+        'download_slot': 'example.com',
+        'download_latency': latency
+    })
+    response = Response('https://example.com', status=status, headers=headers)
+    extension.response_downloaded(response, request, Spider(name='pytest'))
+
+
+def test_adaptive_concurrency_increases_after_clean_windows(adaptive_concurrency, slot):
+    for _ in range(10):
+        download(adaptive_concurrency)
+
+    assert slot.concurrency == 6
+    stats = adaptive_concurrency.crawler.stats
+    assert stats.get_value('adaptive_concurrency/increase_count') == 2
+    assert stats.get_value('adaptive_concurrency/max_concurrency') == 6
+
+
+def test_adaptive_concurrency_holds_on_growing_latency(adaptive_concurrency, slot):
+    for latency in [0.1, 0.1, 0.5, 0.5]:
+        download(adaptive_concurrency, latency=latency)
+
+    assert slot.concurrency == 5
+    assert adaptive_concurrency.crawler.stats.get_value(
+        'adaptive_concurrency/hold_count') == 1
+
+
+@pytest.mark.parametrize('headers, delay', [
+    ({}, 0.2),
+    ({'Retry-After': '10'}, 10),
+    ({'Retry-After': '120'}, 30),
+])
+def test_adaptive_concurrency_backs_off(adaptive_concurrency, slot, headers, delay):
+    download(adaptive_concurrency, status=429, headers=headers)
+
+    assert slot.concurrency == 2
+    assert slot.delay == delay
+    assert adaptive_concurrency.crawler.stats.get_value(
+        'adaptive_concurrency/decrease_count/429') == 1
+
+
+def test_adaptive_concurrency_reduces_delay_before_increasing(adaptive_concurrency, slot, clock):
+    download(adaptive_concurrency, status=503, headers={'Retry-After': '1'})
+    clock.now += 1
+    for _ in range(4):
+        download(adaptive_concurrency)
+
+    assert slot.concurrency == 2
+    assert slot.delay == 0.25
+    stats = adaptive_concurrency.crawler.stats
+    assert stats.get_value('adaptive_concurrency/delay_reduction_count') == 2
+    assert stats.get_value('adaptive_concurrency/increase_count') is None
+
+
+def test_adaptive_concurrency_decreases_once_per_burst(adaptive_concurrency, slot, clock):
+    for _ in range(5):
+        download(adaptive_concurrency, status=429)
+    download(adaptive_concurrency, status=429, headers={'Retry-After': '5'})
+
+    # NOTE: All requests of the burst were sent before the first decrease
+    assert slot.concurrency == 2
+    assert slot.delay == 5
+    stats = adaptive_concurrency.crawler.stats
+    assert stats.get_value('adaptive_concurrency/decrease_count') == 1
+    assert stats.get_value('adaptive_concurrency/outdated_count') == 5
+
+    clock.now += 1
+    download(adaptive_concurrency, status=429)
+    assert slot.concurrency == 1
+    assert stats.get_value('adaptive_concurrency/decrease_count') == 2
@@ -0,0 +1,124 @@
+from email.utils import formatdate
+from time import time
+
+import pytest
+from scrapy import Spider
+from scrapy.http import HtmlResponse, Request, Response
+from scrapy.utils.test import get_crawler
+
+from eupas.httpcache import RevalidatingCachePolicy, RevalidatingHttpCacheMiddleware, SharedFilesystemCacheStorage
+
+
+@pytest.fixture()
+def cache_settings(tmp_path):
+    return {
+        'HTTPCACHE_DIR': str(tmp_path / 'HttpCache'),
+        'HTTPCACHE_EXPIRATION_SECS': 60,
+        'HTTPCACHE_GZIP': True,
+        'HTTPCACHE_IGNORE_HTTP_CODES': [503]
+    }
+
+
+@pytest.fixture()
+def storage(cache_settings):
+    crawler = get_crawler(Spider, cache_settings)
+    storage = SharedFilesystemCacheStorage(crawler.settings)
+    spider = Spider.from_crawler(crawler, name='ema_rwd')
+    storage.open_spider(spider)
+    yield storage
+    storage.close_spider(spider)
+
+
+@pytest.fixture()
+def policy(cache_settings):
+    return RevalidatingCachePolicy(get_crawler(Spider, cache_settings).settings)
+
+
+def cached_response(age, **headers):
+    return HtmlResponse(
+        url='https://example.com',
+        body=b'<html></html>',
+        headers={'Date': formatdate(time() - age, usegmt=True), **headers}
+    )
+
+
+def test_shared_storage_shares_entries_between_spiders(storage):
+    request = Request('https://example.com')
+    storage.store_response(Spider(name='ema_rwd'), request, cached_response(0))
+
+    response = storage.retrieve_response(Spider(name='atc'), request)
+    assert response.body == b'<html></html>'
+
+
+def test_shared_storage_keeps_expired_entries(storage):
+    request = Request('https://example.com')
+    storage.expiration_secs = 1
+    storage.store_response(Spider(name='ema_rwd'), request, cached_response(0))
+    storage.expiration_secs = -1
+
+    assert storage.retrieve_response(Spider(name='kegg'), request) is not None
+
+
+def test_policy_treats_young_responses_as_fresh(policy):
+    request = Request('https://example.com', headers={'Cache-Control': 'max-age=0'})
+    assert policy.is_cached_response_fresh(cached_response(10), request)
+    assert b'If-Modified-Since' not in request.headers
+
+
+def test_policy_revalidates_old_responses(policy):
+    request = Request('https://example.com')
+    response = cached_response(
+        120, **{'Last-Modified': 'Mon, 15 Jan 2024 10:00:00 GMT', 'ETag': '"1906"'})
+
+    assert not policy.is_cached_response_fresh(response, request)
+    assert request.headers[b'If-Modified-Since'] == b'Mon, 15 Jan 2024 10:00:00 GMT'
+    assert request.headers[b'If-None-Match'] == b'"1906"'
+
+
+def test_policy_uses_cached_response_if_not_modified(policy):
+    request = Request('https://example.com')
+    assert policy.is_cached_response_valid(
+        cached_response(120), Response('https://example.com', status=304), request)
+    assert not policy.is_cached_response_valid(
+        cached_response(120), Response('https://example.com', status=200), request)
+
+
+def test_middleware_refreshes_revalidated_responses(cache_settings):
+    crawler = get_crawler(Spider, {
+        **cache_settings,
+        'HTTPCACHE_ENABLED': True,
+        'HTTPCACHE_STORAGE': 'eupas.httpcache.SharedFilesystemCacheStorage',
+        'HTTPCACHE_POLICY': 'eupas.httpcache.RevalidatingCachePolicy'
+    })
+    spider = Spider.from_crawler(crawler, name='ema_rwd')
+    middleware = RevalidatingHttpCacheMiddleware.from_crawler(crawler)
+    middleware.spider_opened(spider)
+    middleware.storage.store_response(
+        spider, Request('https://example.com/refresh'), cached_response(120, ETag='"1906"'))
+
+    request = Request('https://example.com/refresh')
+    assert middleware.process_request(request, spider) is None
+    assert request.headers[b'If-None-Match'] == b'"1906"'
+    not_modified = Response('https://example.com/refresh', status=304,
+                            headers={'Date': formatdate(usegmt=True), 'ETag': '"1907"'})
+    response = middleware.process_response(request, not_modified, spider)
+    assert response.body == b'<html></html>'
+
+    # NOTE: The next run uses the cached response without revalidating it
+    request = Request('https://example.com/refresh')
+    response = middleware.process_request(request, spider)
+    middleware.spider_closed(spider)
+    assert response is not None and response.body == b'<html></html>'
+    assert response.headers[b'ETag'] == b'"1907"'
+    assert b'If-None-Match' not in request.headers
+
+
+@pytest.mark.parametrize('status, headers, expected', [
+    (200, {}, True),
+    (200, {'Cache-Control': 'no-store'}, False),
+    (304, {}, False),
+    (503, {}, False)
+])
+def test_policy_stores_responses(policy, status, headers, expected):
+    response = Response('https://example.com', status=status, headers=headers)
+    assert policy.should_cache_response(response, Request('https://example.com')) == expected
@@ -1,7 +1,19 @@
+import hashlib
+import shutil
+from types import SimpleNamespace
+
 import pytest
 from scrapy import exceptions
+from scrapy.utils.test import get_crawler
+from twisted.internet import defer, error, task
+from twisted.python.failure import Failure
+from twisted.web import error as web_error
+from twisted.web.http_headers import Headers
 
-from eupas.pipelines import DuplicatesPipeline
+from eupas.items import EMA_RWD_Study, EU_PAS_Study
+from eupas.pipelines import DocumentDownloadPipeline, DocumentFile, DuplicatesPipeline
+from eupas.spiders.ema_rwd_spider import EMA_RWD_Spider
+from eupas.spiders.eupas_spider import EU_PAS_Spider
 
 
 @pytest.fixture()
@@ -15,3 +27,220 @@ def test_duplicate_pipeline(d_pipeline, simple_item, simple_spider):
     d_pipeline.process_item(simple_item, simple_spider)
     with pytest.raises(exceptions.DropItem):
         d_pipeline.process_item(simple_item, simple_spider)
+
+
+@pytest.fixture()
+def document_pipeline(tmp_path):
+    crawler = get_crawler(EMA_RWD_Spider, {
+        'DOCUMENTS_DIRECTORY': str(tmp_path / 'PDFs'),
+        'DOCUMENTS_STORE_PATH': str(tmp_path / 'documents'),
+        'DOCUMENTS_CONCURRENT_REQUESTS': 1,
+        'DOCUMENTS_TIMEOUT': 10,
+        'DOWNLOAD_DELAY': 1,
+        'USER_AGENT': 'eupas-test',
+        'DOCUMENTS_FIELDS': {
+            EMA_RWD_Study: {
+                'SAVE_PDF': {'pdf_url': ''},
+                'SAVE_PROTOCOLS_AND_RESULTS': {'protocol_document_url': '_latest_protocols'}
+            },
+            EU_PAS_Study: {
+                'SAVE_PROTOCOLS_AND_RESULTS': {
+                    'latest_protocol_document_url': '_latest_protocols',
+                    'protocol_document_url': '_latest_protocols',
+                    'latest_result_document_url': '_latest_results',
+                    'result_document_url': '_latest_results'
+                }
+            }
+        }
+    })
+    crawler.stats.open_spider(None)
+    document_pipeline = DocumentDownloadPipeline.from_crawler(crawler)
+    shutil.rmtree(document_pipeline.store.path, ignore_errors=True)
+    document_pipeline.store.load()
+    return document_pipeline
+
+
+def write_document(path, chunks):
+    document = DocumentFile(path)
+    for chunk in chunks:
+        document.write(chunk)
+    return document, document.finish()
+
+
+def test_document_file(tmp_path):
+    document, digest = write_document(
+        tmp_path / 'EUPAS1.pdf', [b'%PDF-', b'1.7'])
+    assert digest == hashlib.sha256(b'%PDF-1.7').hexdigest()
+    assert document.size == 8
+    assert document.part_path.read_bytes() == b'%PDF-1.7'
+    assert not document.path.exists()
+
+    document.discard()
+    assert not document.part_path.exists()
+
+
+def test_document_pipeline_documents(document_pipeline):
+    study = EMA_RWD_Study(eu_pas_register_number='EUPAS1',
+                          pdf_url='https://example.com/pdf',
+                          protocol_document_url='https://example.com/protocol')
+    spider = EMA_RWD_Spider(save_pdf=True)
+    assert list(document_pipeline.get_documents(study, spider)) == [
+        ('EUPAS1', 'https://example.com/pdf', 'EUPAS1.pdf')
+    ]
+
+    spider = EMA_RWD_Spider(save_protocols_and_results=True)
+    assert list(document_pipeline.get_documents(study, spider)) == [
+        ('EUPAS1', 'https://example.com/protocol', 'EUPAS1_latest_protocols.pdf')
+    ]
+    assert not list(document_pipeline.get_documents(
+        EU_PAS_Study(eu_pas_register_number='EUPAS1'), spider))
+
+
+def test_document_pipeline_eu_pas_documents(document_pipeline):
+    study = EU_PAS_Study(eu_pas_register_number='EUPAS1',
+                         url='https://www.encepp.eu/encepp/viewResource.htm?id=1',
+                         protocol_document_url='/encepp/openAttachment/fullProtocol/1;jsessionid=A',
+                         latest_protocol_document_url='/encepp/openAttachment/fullProtocolLatest/2',
+                         result_document_url='Not public until study ends')
+    spider = EU_PAS_Spider(save_protocols_and_results=True)
+    assert list(document_pipeline.get_documents(study, spider)) == [
+        ('EUPAS1', 'https://www.encepp.eu/encepp/openAttachment/fullProtocolLatest/2', 'EUPAS1_latest_protocols.pdf')
+    ]
+
+    del study['latest_protocol_document_url']
+    assert list(document_pipeline.get_documents(study, spider)) == [
+        ('EUPAS1', 'https://www.encepp.eu/encepp/openAttachment/fullProtocol/1', 'EUPAS1_latest_protocols.pdf')
+    ]
+
+
+def store_document(document_pipeline, key, url, chunks, validators=None):
+    path = document_pipeline.folder / f'{key}.pdf'
+    document, digest = write_document(
+        document_pipeline.store.temp_path / path.name, chunks)
+    added = document_pipeline.add_document(digest, document, path)
+    document_pipeline.store_document(added, digest, document, key, url, path, validators or {
+        'etag': None,
+        'last_modified': None
+    })
+    return path
+
+
+def test_document_pipeline_deduplication(document_pipeline):
+    first = store_document(document_pipeline, 'EUPAS1',
+                           'https://example.com/1', [b'%PDF-1.7'])
+    second = store_document(document_pipeline, 'EUPAS2',
+                            'https://example.com/2', [b'%PDF-', b'1.7'])
+
+    assert second.read_bytes() == b'%PDF-1.7'
+    assert first.stat().st_ino == second.stat().st_ino
+    assert not list(document_pipeline.store.temp_path.glob('*.part'))
+    stats = document_pipeline.crawler.stats
+    assert stats.get_value('documents/downloaded_count') == 2
+    assert stats.get_value('documents/deduplicated_count') == 1
+
+
+def test_document_pipeline_validators(document_pipeline):
+    store_document(document_pipeline, 'EUPAS1', 'https://example.com/1', [b'%PDF-1.7'], {
+        'etag': '"1"',
+        'last_modified': 'Mon, 01 Jan 2024 00:00:00 GMT'
+    })
+    entry = document_pipeline.store.get('EUPAS1', 'EUPAS1.pdf',
+                                        'https://example.com/1')
+    assert entry['size'] == 8
+
+    headers = document_pipeline.get_request_headers(entry)
+    assert headers.getRawHeaders('If-None-Match') == ['"1"']
+    assert headers.getRawHeaders('If-Modified-Since') == [
+        'Mon, 01 Jan 2024 00:00:00 GMT']
+
+    assert document_pipeline.is_unchanged(entry, {
+        'etag': '"1"', 'last_modified': None, 'content_length': None})
+    assert not document_pipeline.is_unchanged(entry, {
+        'etag': '"2"', 'last_modified': 'Mon, 01 Jan 2024 00:00:00 GMT', 'content_length': '8'})
+    assert document_pipeline.is_unchanged(entry, {
+        'etag': None, 'last_modified': 'Mon, 01 Jan 2024 00:00:00 GMT', 'content_length': '8'})
+    assert not document_pipeline.is_unchanged(entry, {
+        'etag': None, 'last_modified': None, 'content_length': '8'})
+
+
+class StalledResponse:
+    '''
+    A response, which sends its headers and the first chunk of its body and stalls afterwards.
+    '''
+    code = 200
+    headers = Headers()
+
+    def deliverBody(self, protocol):
+        self.protocol = protocol
+        protocol.makeConnection(self)
+        protocol.dataReceived(b'%PDF-')
+
+    def stopProducing(self):
+        self.protocol.connectionLost(Failure(error.ConnectionLost()))
+
+
+def test_document_pipeline_times_out_stalled_bodies(document_pipeline, monkeypatch):
+    clock = task.Clock()
+    monkeypatch.setattr('twisted.internet.reactor', clock, raising=False)
+    document_pipeline.agent = SimpleNamespace(
+        request=lambda *args: defer.succeed(StalledResponse()))
+    document_pipeline.writer.start()
+
+    results = []
+    try:
+        d = document_pipeline.download(
+            'EUPAS1', 'https://example.com/1', document_pipeline.folder / 'EUPAS1.pdf')
+        d.addBoth(results.append)
+        clock.advance(9)
+        assert not results
+
+        clock.advance(2)
+    finally:
+        document_pipeline.writer.stop()
+    assert results[0].check(defer.TimeoutError)
+    assert not list(document_pipeline.store.temp_path.glob('*.part'))
+
+
+class StatusResponse:
+    '''
+    A response with an empty body.
+    '''
+    headers = Headers()
+
+    def __init__(self, code):
+        self.code = code
+
+    def deliverBody(self, protocol):
+        protocol.makeConnection(self)
+
+    def stopProducing(self):
+        pass
+
+
+@pytest.mark.parametrize('responses, requests, retries, expected', [
+    ([error.ConnectionRefusedError(), 503, 503, 503], 3, 2, web_error.Error),
+    ([error.ConnectionRefusedError(), error.DNSLookupError(), error.ConnectionRefusedError()], 3, 2, error.ConnectionRefusedError),
+    ([404, 503], 1, None, web_error.Error)
+])
+def test_document_pipeline_retries_failed_downloads(document_pipeline, monkeypatch, responses, requests, retries, expected):
+    clock = task.Clock()
+    monkeypatch.setattr('twisted.internet.reactor', clock, raising=False)
+    headers = []
+
+    def request(method, url, request_headers):
+        headers.append(request_headers)
+        response = responses.pop(0)
+        return defer.fail(response) if isinstance(response, Exception) else defer.succeed(StatusResponse(response))
+    document_pipeline.agent = SimpleNamespace(request=request)
+
+    results = []
+    d = document_pipeline.download(
+        'EUPAS1', 'https://example.com/1', document_pipeline.folder / 'EUPAS1.pdf')
+    d.addBoth(results.append)
+    clock.advance(1)
+    clock.advance(1)
+
+    assert len(headers) == requests
+    assert all(h.getRawHeaders(b'User-Agent') == [b'eupas-test'] for h in headers)
+    assert document_pipeline.crawler.stats.get_value('documents/retry_count') == retries
+    assert results[0].check(expected)
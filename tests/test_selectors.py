@@ -0,0 +1,45 @@
+import pytest
+from scrapy.http import HtmlResponse
+
+from eupas.selectors import CompiledSelector, CompiledSelectorList, compile_xpath
+
+
+@pytest.fixture()
+def page():
+    response = HtmlResponse(
+        url='https://example.com',
+        body=b'<html><body><div id="a"><a href="/1">first</a></div><div>second</div></body></html>',
+        encoding='utf-8'
+    )
+    return CompiledSelector.from_response(response)
+
+
+def test_compiled_selector_matches_selector(page):
+    assert page.css('#a').xpath('./a/@href').get() == '/1'
+    assert page.xpath('//div//text()').getall() == ['first', 'second']
+    assert page.xpath('count(//div)').get() == '2.0'
+    assert isinstance(page.css('div'), CompiledSelectorList)
+    assert isinstance(page.css('div')[0], CompiledSelector)
+
+
+def test_compiled_selector_passes_variables(page):
+    assert page.xpath('//div[$index]//text()', index=2).get() == 'second'
+    assert page.xpath('//*[@id=$id]//text()', id='a').get() == 'first'
+
+
+def test_compiled_selector_reuses_compiled_expressions(page):
+    compile_xpath.cache_clear()
+    for index in (1, 2):
+        page.xpath('//div[$index]', index=index)
+    assert compile_xpath.cache_info().misses == 1
+    assert compile_xpath.cache_info().hits == 1
+
+
+def test_compiled_selector_falls_back_for_namespaces(page):
+    assert compile_xpath('//div[re:test(., "sec")]') is None
+    assert page.xpath('//div[re:test(., "sec")]/text()').get() == 'second'
+
+
+def test_compiled_selector_raises_on_invalid_xpath(page):
+    with pytest.raises(ValueError):
+        page.xpath('//div[')
@@ -0,0 +1,239 @@
+import json
+from pathlib import Path
+import shutil
+
+import pytest
+
+from eupas.items import EMA_RWD_Study
+from eupas.stores import CheckpointStore, DocumentStore, HistoryStore, SnapshotIndex, StudyStateStore, UpdateJournal, field_digests, iter_json_records, record_digest
+
+
+@pytest.fixture()
+def state_store(tmp_path: Path):
+    path = tmp_path / 'pytest_state.json'
+    path.unlink(missing_ok=True)
+    return StudyStateStore(path)
+
+
+def test_state_store_returns_unchanged_items(state_store: StudyStateStore):
+    study = EMA_RWD_Study(eu_pas_register_number='EUPAS1234')
+    state_store.update('https://example.com/study/1', '2024-01-01', study)
+    state_store.save()
+
+    loaded = StudyStateStore(state_store.path).load()
+    assert loaded.get_unchanged('https://example.com/study/1', '2024-01-01') == {
+        'eu_pas_register_number': 'EUPAS1234'
+    }
+
+
+@pytest.mark.parametrize('url, lastmod', [
+    ('https://example.com/study/1', '2024-02-01'),
+    ('https://example.com/study/1', None),
+    ('https://example.com/study/2', '2024-01-01'),
+])
+def test_state_store_ignores_changed_items(state_store: StudyStateStore, url, lastmod):
+    state_store.update('https://example.com/study/1', '2024-01-01', {})
+    assert state_store.get_unchanged(url, lastmod) is None
+
+
+def test_state_store_prunes_unseen_items(state_store: StudyStateStore):
+    state_store.update('https://example.com/study/1', '2024-01-01', {})
+    state_store.save()
+
+    loaded = StudyStateStore(state_store.path).load()
+    loaded.save(prune=True)
+    assert StudyStateStore(state_store.path).load().states == {}
+
+
+@pytest.fixture()
+def checkpoint_store(tmp_path: Path):
+    path = tmp_path / 'pytest_checkpoint.jsonl'
+    path.unlink(missing_ok=True)
+    return CheckpointStore(path)
+
+
+def test_checkpoint_store_merges_pages(checkpoint_store: CheckpointStore):
+    loc = 'https://example.com/study/1'
+    checkpoint_store.add(loc, 'EUPAS1234', {'url': 'a', 'title': 'Study'}, page='administrative-details')
+    checkpoint_store.add(loc, 'EUPAS1234', {'url': 'a', 'outcomes': 'Death'}, page='methodological-aspects')
+    checkpoint_store.close()
+
+    checkpoint = CheckpointStore(checkpoint_store.path).load().get(loc)
+    assert checkpoint['key'] == 'EUPAS1234'
+    assert checkpoint['pages'] == ['administrative-details', 'methodological-aspects']
+    assert checkpoint['item'] == {'url': 'a', 'title': 'Study', 'outcomes': 'Death'}
+    assert not checkpoint['finished']
+
+
+def test_checkpoint_store_ignores_incomplete_lines(checkpoint_store: CheckpointStore):
+    checkpoint_store.add('https://example.com/study/1', 'EUPAS1', {}, finished=True)
+    checkpoint_store.close()
+    with checkpoint_store.path.open('a', encoding='UTF-8') as f:
+        f.write('{"key": "EUPAS2", "loc": "https://exa')
+
+    loaded = CheckpointStore(checkpoint_store.path).load()
+    assert loaded.get('https://example.com/study/1')['finished']
+    assert list(loaded.studies) == ['EUPAS1']
+
+
+def test_checkpoint_store_appends_after_incomplete_lines(checkpoint_store: CheckpointStore):
+    checkpoint_store.add('https://example.com/study/1', 'EUPAS1', {}, finished=True)
+    checkpoint_store.close()
+    with checkpoint_store.path.open('a', encoding='UTF-8') as f:
+        f.write('{"key": "EUPAS2", "loc": "https://exa')
+
+    # NOTE: The crawl is killed again after resuming
+    resumed = CheckpointStore(checkpoint_store.path).load()
+    resumed.add('https://example.com/study/2', 'EUPAS2', {}, finished=True)
+    resumed.close()
+    with checkpoint_store.path.open('a', encoding='UTF-8') as f:
+        f.write('{"key": "EUPAS3"')
+    resumed = CheckpointStore(checkpoint_store.path).load()
+    resumed.add('https://example.com/study/3', 'EUPAS3', {}, finished=True)
+    resumed.close()
+
+    loaded = CheckpointStore(checkpoint_store.path).load()
+    assert list(loaded.studies) == ['EUPAS1', 'EUPAS2', 'EUPAS3']
+
+
+def test_checkpoint_store_skips_corrupted_lines(checkpoint_store: CheckpointStore):
+    checkpoint_store.path.write_text(
+        '{"key": "EUPAS1", "loc": "https://exa{"key": "EUPAS2"\n'
+        '{"finished": true, "item": {}, "key": "EUPAS3", "loc": "https://example.com/study/3", "page": null}\n',
+        encoding='UTF-8')
+
+    loaded = CheckpointStore(checkpoint_store.path).load()
+    assert list(loaded.studies) == ['EUPAS3']
+
+
+def test_checkpoint_store_clears_checkpoints(checkpoint_store: CheckpointStore):
+    checkpoint_store.add('https://example.com/study/1', 'EUPAS1', {}, finished=True)
+    checkpoint_store.clear()
+
+    assert not checkpoint_store.path.exists()
+    assert checkpoint_store.get('https://example.com/study/1') is None
+
+
+@pytest.fixture()
+def document_store(tmp_path: Path):
+    path = tmp_path / 'pytest_documents'
+    shutil.rmtree(path, ignore_errors=True)
+    return DocumentStore(path).load()
+
+
+def test_document_store_keeps_documents_between_runs(document_store: DocumentStore):
+    part_path = document_store.temp_path / 'EUPAS1.pdf.part'
+    part_path.write_bytes(b'%PDF-1.7')
+    assert document_store.add(part_path, 'abcd')
+    document_store.update('EUPAS1', 'EUPAS1.pdf', {
+        'url': 'https://example.com/1',
+        'sha256': 'abcd'
+    })
+    document_store.save()
+
+    loaded = DocumentStore(document_store.path).load()
+    assert loaded.get('EUPAS1', 'EUPAS1.pdf', 'https://example.com/1')
+    assert loaded.get('EUPAS1', 'EUPAS1.pdf', 'https://example.com/2') is None
+
+    run_path = document_store.path / 'run' / 'EUPAS1.pdf'
+    loaded.link('abcd', run_path)
+    assert run_path.read_bytes() == b'%PDF-1.7'
+    assert run_path.stat().st_ino == loaded.blob_path('abcd').stat().st_ino
+
+
+def test_document_store_deduplicates_blobs(document_store: DocumentStore):
+    for name in ['EUPAS1.pdf.part', 'EUPAS2.pdf.part']:
+        (document_store.temp_path / name).write_bytes(b'%PDF-1.7')
+    assert document_store.add(document_store.temp_path / 'EUPAS1.pdf.part', 'abcd')
+    assert not document_store.add(document_store.temp_path / 'EUPAS2.pdf.part', 'abcd')
+    assert not list(document_store.temp_path.iterdir())
+
+
+@pytest.mark.parametrize('file_name, separator', [
+    ('pytest_snapshot.json', None),
+    ('pytest_snapshot.jsonl', '\n')
+])
+def test_snapshot_index_streams_records(tmp_path: Path, file_name, separator):
+    studies = [
+        {'eu_pas_register_number': str(number), 'title': 'Études ' * number}
+        for number in range(100)
+    ]
+    path = tmp_path / file_name
+    if separator:
+        path.write_text(separator.join(json.dumps(study, ensure_ascii=False)
+                        for study in studies), encoding='UTF-8')
+    else:
+        path.write_text(json.dumps(studies, indent='\t',
+                        ensure_ascii=False), encoding='UTF-8')
+
+    assert list(iter_json_records(path, chunk_size=64)) == studies
+
+    index = SnapshotIndex(path).load()
+    [entry] = index.get('42')
+    assert entry.field_digests == field_digests(studies[42])
+    assert entry.digest == record_digest(field_digests(studies[42]))
+    assert index.get('100') == []
+
+
+def test_record_digest_ignores_field_order():
+    study = {'eu_pas_register_number': '1', 'medical_conditions': ['A', 'B'], 'title': 'Study'}
+    reordered = {'title': 'Study', 'medical_conditions': ('A', 'B'), 'eu_pas_register_number': '1'}
+    assert record_digest(field_digests(study)) == record_digest(field_digests(reordered))
+    assert record_digest(field_digests(study)) != record_digest(
+        field_digests({**study, 'medical_conditions': ['B', 'A']}))
+
+
+def test_update_journal_compacts_sorted_records(tmp_path: Path):
+    path = tmp_path / 'pytest_updates.json'
+    path.unlink(missing_ok=True)
+    journal = UpdateJournal(path, sort_key=lambda x: x['order'])
+    journal.compact()
+    assert not path.exists()
+
+    for order in [2, 0, 1]:
+        journal.append({'order': order})
+    assert journal.journal_path.read_text(encoding='UTF-8').count('\n') == 3
+    assert journal.read() == [{'order': 0}, {'order': 1}, {'order': 2}]
+
+    journal.compact()
+    assert not journal.journal_path.exists()
+    assert json.loads(path.read_text(encoding='UTF-8')) == [
+        {'order': 0}, {'order': 1}, {'order': 2}
+    ]
+
+
+@pytest.fixture()
+def history_store(tmp_path: Path):
+    path = tmp_path / 'pytest_history.db'
+    path.unlink(missing_ok=True)
+    history_store = HistoryStore(path).open()
+    yield history_store
+    history_store.close()
+
+
+def test_history_store_versions_changed_studies(history_store: HistoryStore):
+    assert history_store.add({'eu_pas_register_number': '1', 'title': 'Old'}, '2024-01-01T00:00:00+00:00')
+    assert history_store.add({'eu_pas_register_number': '2', 'title': 'Removed'}, '2024-01-01T00:00:00+00:00')
+    history_store.close()
+
+    history_store.open()
+    assert not history_store.add({'eu_pas_register_number': '1', 'title': 'Old'}, '2024-02-01T00:00:00+00:00')
+    assert history_store.add({'eu_pas_register_number': '1', 'description': 'New'}, '2024-03-01T00:00:00+00:00')
+    history_store.retire('2024-03-01T00:00:00+00:00')
+
+    assert [version['changed_fields'] for version in history_store.changes('1')] == [
+        ['eu_pas_register_number', 'title'],
+        ['description', 'title']
+    ]
+    assert history_store.changes('1')[0]['valid_to'] == '2024-03-01T00:00:00+00:00'
+    assert history_store.latest('1').field_digests == field_digests(
+        {'eu_pas_register_number': '1', 'description': 'New'})
+    assert history_store.get('2') == []
+
+    assert list(history_store.as_of('2024-02-01')) == [
+        {'eu_pas_register_number': '1', 'title': 'Old'},
+        {'eu_pas_register_number': '2', 'title': 'Removed'}
+    ]
+    assert list(history_store.as_of('2024-04-01')) == [
+        {'description': 'New', 'eu_pas_register_number': '1'}
+    ]